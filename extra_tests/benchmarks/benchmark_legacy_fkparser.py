@@ -0,0 +1,87 @@
+#!/usr/bin/env python
+"""
+Benchmark of the parser of legacy (text) FKTables, :py:func:`validphys.fkparser.parse_fktable`,
+for the largest FKTables in a legacy theory.
+
+For each table the time needed by the current parser is compared with a reference
+implementation of the previous algorithm, in which the FastKernel section is read into
+a dataframe with all the flavour combinations by ``pandas.read_csv``, and with the time needed
+to read the same table back from the binary cache of :py:func:`validphys.fkparser.load_fktable`.
+The results of the parser and the reference are checked to be equal.
+
+    ./benchmark_legacy_fkparser.py 162 --ntables 10
+"""
+
+import argparse
+import pathlib
+import tempfile
+import time
+
+import pandas as pd
+
+from validphys.fkparser import open_fkpath, parse_fktable, read_fktable_cache, write_fktable_cache
+from validphys.loader import FallbackLoader
+
+
+def reference_sigma(path, hadronic, flavour_map):
+    """Reference implementation of the parsing of the FastKernel section"""
+    with open_fkpath(path) as f:
+        for line in f:
+            if line[1:].startswith(b"FastKernel"):
+                break
+        if hadronic:
+            df = pd.read_csv(f, sep=r"\s+", header=None, index_col=(0, 1, 2))
+            df.columns = list(range(14 * 14))
+            df.index.names = ["data", "x1", "x2"]
+        else:
+            df = pd.read_csv(f, sep=r"\s+", header=None, index_col=(0, 1))
+            df.columns = list(range(14))
+            df.index.names = ["data", "x"]
+    return df.loc[:, flavour_map.ravel()]
+
+
+def parse_path(path):
+    with open_fkpath(path) as f:
+        return parse_fktable(f)
+
+
+def timeit(func, *args, repeat=3):
+    """Return the best time out of ``repeat`` calls of ``func(*args)`` and the result"""
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        res = func(*args)
+        times.append(time.perf_counter() - start)
+    return min(times), res
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("theoryid", type=int, help="ID of the (legacy) theory")
+    parser.add_argument("--ntables", type=int, default=10, help="Number of tables to benchmark")
+    parser.add_argument("--repeat", type=int, default=3, help="Number of repetitions")
+    args = parser.parse_args()
+
+    theory = FallbackLoader().check_theoryID(args.theoryid)
+    paths = sorted(
+        (theory.path / "fastkernel").glob("FK_*"), key=lambda p: p.stat().st_size, reverse=True
+    )
+
+    print(f"{'table':<50} {'parser':>10} {'reference':>10} {'cache':>10} {'speedup':>8}")
+    with tempfile.TemporaryDirectory() as cache_folder:
+        for path in paths[: args.ntables]:
+            t_new, fktable = timeit(parse_path, path, repeat=args.repeat)
+            flavour_map = fktable.metadata["FlavourMap"]
+            t_ref, sigma = timeit(
+                reference_sigma, path, fktable.hadronic, flavour_map, repeat=args.repeat
+            )
+            pd.testing.assert_frame_equal(fktable.sigma, sigma, check_dtype=False)
+
+            entry = pathlib.Path(cache_folder) / path.name
+            write_fktable_cache(fktable, entry)
+            t_cache, _ = timeit(read_fktable_cache, entry, repeat=args.repeat)
+            print(f"{path.name:<50} {t_new:10.3f} {t_ref:10.3f} {t_cache:10.3f} {t_ref/t_new:8.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,169 @@
+#!/usr/bin/env python
+"""
+Benchmark of the multi-replica convolutions of the observable layers of n3fit,
+:py:mod:`n3fit.layers.DIS` and :py:mod:`n3fit.layers.DY`, for representative shapes
+of DIS and hadronic datasets (number of datapoints, size of the xgrid and number of active
+flavours or luminosity channels).
+
+For each dataset the time per (forward) evaluation of the implementation with the
+fk table padded with zeroes to all flavours is compared with the time of the implementation
+which takes from the PDFs only the flavours entering the active channels.
+The latter is the one used by the DY layer while the DIS layer uses the former
+(a single matrix product in which the gather of the active flavours does not pay off).
+The results of both are checked to be equal.
+
+In addition, for each dataset a number of copies (with the same active flavours but different
+fk tables) are computed by a single :py:class:`n3fit.layers.StackedObservable` and the time
+is compared with the time needed to compute them separately.
+
+    ./benchmark_observables.py --replicas 1 10 100 --stacked 20
+"""
+
+import argparse
+import time
+
+import numpy as np
+import tensorflow as tf
+
+from n3fit.backends import operations as op
+import n3fit.layers as layers
+from n3fit.layers.DIS import compute_dis_observable_many_replica
+from n3fit.layers.DY import (
+    compute_dy_observable_active_flavours,
+    compute_dy_observable_many_replica,
+)
+
+NFL = 14
+
+# (name, ndata, xgrid, active flavours, luminosity channels (DY))
+DIS_DATASETS = [
+    ("HERA_NC_318GEV_EP-SIGMARED", 159, 50, 9, None),
+    ("NMC_NC_NOTFIXED_P_EM-SIGMARED", 204, 40, 5, None),
+]
+DY_DATASETS = [
+    ("ATLAS_Z0_7TEV_49FB_HIMASS", 6, 30, 10, 64),
+    ("CMS_Z0J_8TEV_PT-Y", 28, 40, 10, 90),
+    ("CMS_1JET_8TEV_PTY", 185, 40, 10, 100),
+]
+
+
+class _FKTableData:
+    """Minimal stand-in of :py:class:`validphys.coredata.FKTableData`"""
+
+    def __init__(self, luminosity_mapping, xgrid, hadronic):
+        self.luminosity_mapping = luminosity_mapping
+        self.xgrid = xgrid
+        self.convolution_types = ("UnpolPDF", "UnpolPDF") if hadronic else ("UnpolPDF",)
+
+
+def generate_dataset(ndata, xgrid, nflavours, nchannels, rng):
+    """Generate a random fk table with the given shape,
+    DIS if ``nchannels`` is None and hadronic otherwise"""
+    flavours = np.sort(rng.choice(NFL, size=nflavours, replace=False))
+    if nchannels is None:
+        fkdata = _FKTableData(flavours, np.geomspace(1e-5, 1.0, xgrid), hadronic=False)
+        return fkdata, rng.random((ndata, nflavours, xgrid))
+
+    channels = np.sort(rng.choice(nflavours * nflavours, size=nchannels, replace=False))
+    lumi = flavours[np.stack(np.divmod(channels, nflavours), axis=-1)].ravel()
+    fkdata = _FKTableData(lumi, np.geomspace(1e-5, 1.0, xgrid), hadronic=True)
+    return fkdata, rng.random((ndata, nchannels, xgrid, xgrid))
+
+
+def padded_observable(layer, hadronic):
+    """Implementation with the fk table padded to all flavours"""
+    mask = layer.masks[0]
+    fk = op.numpy_to_tensor(layer.fktables[0])
+    if hadronic:
+        padded_fk = op.einsum('fgF, nFxy -> nxfyg', mask, fk)
+        return lambda pdf: compute_dy_observable_many_replica([pdf, pdf], padded_fk)
+    padded_fk = op.einsum('fF, nFx -> nxf', mask, fk)
+    return lambda pdf: compute_dis_observable_many_replica([pdf], padded_fk)
+
+
+def active_flavours_observable(layer, hadronic):
+    """Implementation taking only the active flavours from the PDFs"""
+    if hadronic:
+        fk_and_flavours = layer.pad_fk(op.numpy_to_tensor(layer.fktables[0]), layer.masks[0])
+        return lambda pdf: compute_dy_observable_active_flavours([pdf, pdf], fk_and_flavours)
+    flavours = np.argmax(layer.masks[0], axis=0)
+    fk = op.einsum('nFx -> xFn', op.numpy_to_tensor(layer.fktables[0]))
+    return lambda pdf: op.tensor_product(
+        op.gather(pdf, flavours, axis=-1), fk, axes=[(2, 3), (0, 1)]
+    )
+
+
+def stacked_observables(layer_type, fkdata, fk, copies, replicas, rng):
+    """Functions computing ``copies`` observables separately and stacked"""
+    observables = []
+    for i in range(copies):
+        obs = layer_type(
+            [fkdata], [rng.random(fk.shape)], f"copy_{i}", n_replicas=replicas, nfl=NFL
+        )
+        observables.append(obs)
+    stacked = layers.StackedObservable(observables)
+    # Build the layers outside of the tf.function
+    pdf = op.numpy_to_tensor(np.ones((1, replicas, fk.shape[-1], NFL)))
+    stacked(pdf)
+    for obs in observables:
+        obs(pdf)
+    separate = tf.function(lambda pdf: op.concatenate([obs(pdf) for obs in observables], axis=-1))
+    together = tf.function(lambda pdf: op.concatenate(stacked(pdf), axis=-1))
+    return together, separate
+
+
+def timeit(func, arg, repeat):
+    """Return the best time out of ``repeat`` calls of ``func(arg)`` and the result"""
+    res = func(arg)
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        res = func(arg).numpy()
+        times.append(time.perf_counter() - start)
+    return min(times), res
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--replicas", type=int, nargs="+", default=[10, 100])
+    parser.add_argument("--repeat", type=int, default=20, help="Number of repetitions")
+    parser.add_argument(
+        "--stacked", type=int, default=20, help="Number of copies of each dataset to be stacked"
+    )
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(seed=42)
+
+    print(f"{'dataset':<32} {'replicas':>8} {'active':>10} {'padded':>10} {'speedup':>8}")
+    for name, ndata, xgrid, nflavours, nchannels in DIS_DATASETS + DY_DATASETS:
+        fkdata, fk = generate_dataset(ndata, xgrid, nflavours, nchannels, rng)
+        hadronic = nchannels is not None
+        layer_type = layers.DY if hadronic else layers.DIS
+        # the multi-replica implementations are used with more than one replica
+        layer = layer_type([fkdata], [fk], name, n_replicas=2, nfl=NFL, operation_name="NULL")
+        active = tf.function(active_flavours_observable(layer, hadronic))
+        padded = tf.function(padded_observable(layer, hadronic))
+        for replicas in args.replicas:
+            pdf = op.numpy_to_tensor(rng.random((1, replicas, xgrid, NFL)))
+            t_new, res_new = timeit(active, pdf, args.repeat)
+            t_ref, res_ref = timeit(padded, pdf, args.repeat)
+            np.testing.assert_allclose(res_new, res_ref, rtol=1e-4)
+            print(f"{name:<32} {replicas:>8} {t_new:10.5f} {t_ref:10.5f} {t_ref/t_new:8.2f}")
+
+    print(f"\n{'dataset':<32} {'replicas':>8} {'stacked':>10} {'separate':>10} {'speedup':>8}")
+    for name, ndata, xgrid, nflavours, nchannels in DIS_DATASETS + DY_DATASETS:
+        fkdata, fk = generate_dataset(ndata, xgrid, nflavours, nchannels, rng)
+        layer_type = layers.DY if nchannels is not None else layers.DIS
+        for replicas in args.replicas:
+            together, separate = stacked_observables(
+                layer_type, fkdata, fk, args.stacked, replicas, rng
+            )
+            pdf = op.numpy_to_tensor(rng.random((1, replicas, xgrid, NFL)))
+            t_new, res_new = timeit(together, pdf, args.repeat)
+            t_ref, res_ref = timeit(separate, pdf, args.repeat)
+            np.testing.assert_allclose(res_new, res_ref, rtol=1e-4)
+            print(f"{name:<32} {replicas:>8} {t_new:10.5f} {t_ref:10.5f} {t_ref/t_new:8.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,122 @@
+#!/usr/bin/env python
+"""
+Benchmark of :py:func:`validphys.pineparser.pineappl_reader` for the largest FKTables in a theory
+or for the FKTables of the given datasets (which might be formed by several subgrids).
+
+For each table the time to read the grid with pineappl is compared with the time needed
+to build the :py:class:`validphys.coredata.FKTableData` with the current reader and with
+a reference implementation of the previous algorithm, in which the missing x-points are inserted
+one by one and a dataframe is built for each subgrid and concatenated.
+The results of both are checked to be equal.
+
+    ./benchmark_pineappl_reader.py 700 --ntables 10
+    ./benchmark_pineappl_reader.py 700 --datasets CMS_1JET_13TEV_DIF ATLAS_TTBAR_13TEV_LJ_DIF_YT
+"""
+
+import argparse
+import time
+
+import numpy as np
+import pandas as pd
+
+from validphys.commondataparser import EXT, TheoryMeta
+from validphys.core import FKTableSpec
+from validphys.loader import FallbackLoader
+from validphys.pineparser import _pinelumi_to_columns, pineappl_reader
+
+
+def reference_sigma(fkspec, hadronic):
+    """Reference implementation of the padding and concatenation of the subgrids
+    (without shifts, normalizations or cfactors)"""
+    from pineappl.fk_table import FkTable
+
+    pines = [FkTable.read(i) for i in fkspec.fkpath]
+    xgrid = np.array([])
+    for pine in pines:
+        xgrid = np.union1d(xgrid, pine.x_grid())
+    xi = np.arange(len(xgrid))
+    if hadronic:
+        xdivision = np.prod(np.meshgrid(xgrid, xgrid), axis=0)
+    else:
+        xdivision = xgrid[:, np.newaxis]
+
+    partial_fktables = []
+    ndata = 0
+    for p in pines:
+        raw_fktable = (p.table().T / p.bin_normalizations()).T
+        n = raw_fktable.shape[0]
+        for x_point in np.setdiff1d(xgrid, p.x_grid(), assume_unique=True):
+            miss_index = list(xgrid).index(x_point)
+            raw_fktable = np.insert(raw_fktable, miss_index, 0.0, axis=2)
+            if hadronic:
+                raw_fktable = np.insert(raw_fktable, miss_index, 0.0, axis=3)
+        raw_fktable *= fkspec.metadata.conversion_factor / xdivision
+        lumi_columns = _pinelumi_to_columns(p.channels(), hadronic)
+        data_idx = np.arange(ndata, ndata + n)
+        if hadronic:
+            idx = pd.MultiIndex.from_product([data_idx, xi, xi], names=["data", "x1", "x2"])
+        else:
+            idx = pd.MultiIndex.from_product([data_idx, xi], names=["data", "x"])
+        df_fktable = raw_fktable.swapaxes(0, 1).reshape(len(lumi_columns), -1).T
+        partial_fktables.append(pd.DataFrame(df_fktable, columns=lumi_columns, index=idx))
+        ndata += n
+    return pd.concat(partial_fktables, sort=True, copy=False).fillna(0.0)
+
+
+def timeit(func, *args, repeat=3):
+    """Return the best time out of ``repeat`` calls of ``func(*args)`` and the result"""
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        res = func(*args)
+        times.append(time.perf_counter() - start)
+    return min(times), res
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("theoryid", type=int, help="ID of the (pineappl) theory")
+    parser.add_argument("--ntables", type=int, default=10, help="Number of tables to benchmark")
+    parser.add_argument("--repeat", type=int, default=3, help="Number of repetitions")
+    parser.add_argument("--datasets", nargs="+", help="Benchmark the FKTables of these datasets")
+    args = parser.parse_args()
+
+    from pineappl.fk_table import FkTable
+
+    loader = FallbackLoader()
+    if args.datasets:
+        fkspecs = []
+        for dsname in args.datasets:
+            ds = loader.check_dataset(dsname, theoryid=args.theoryid, cuts=None)
+            # Drop the cfactors and metadata, only the parsing is being benchmarked
+            fkspecs += [
+                FKTableSpec(fk.fkpath, None, TheoryMeta(FK_tables=[[i.name for i in fk.fkpath]]))
+                for fk in ds.fkspecs
+            ]
+    else:
+        theory = loader.check_theoryID(args.theoryid)
+        grids = sorted(
+            (theory.path / "fastkernel").glob(f"*.{EXT}"),
+            key=lambda p: p.stat().st_size,
+            reverse=True,
+        )
+        fkspecs = [
+            FKTableSpec([grid], None, TheoryMeta(FK_tables=[[grid.name]]))
+            for grid in grids[: args.ntables]
+        ]
+
+    def read_grids(fkspec):
+        return [FkTable.read(i) for i in fkspec.fkpath]
+
+    print(f"{'table':<50} {'pineappl':>10} {'reader':>10} {'reference':>10} {'speedup':>8}")
+    for fkspec in fkspecs:
+        name = fkspec.fkpath[0].name.replace(f".{EXT}", "")
+        t_pine, _ = timeit(read_grids, fkspec, repeat=args.repeat)
+        t_new, fktable = timeit(pineappl_reader, fkspec, repeat=args.repeat)
+        t_ref, sigma = timeit(reference_sigma, fkspec, fktable.hadronic, repeat=args.repeat)
+        pd.testing.assert_frame_equal(fktable.sigma, sigma, check_column_type=False)
+        print(f"{name:<50} {t_pine:10.3f} {t_new:10.3f} {t_ref:10.3f} {t_ref/t_new:8.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -30,6 +30,9 @@ class MetaLayer(Layer):
 
     initializers = initializers
     weight_inits = []
+    # Replicas computed during the training, shared by all layers of a multi-replica model
+    # (see ``MetaModel.set_replica_mask``), if None all replicas are computed
+    replica_selection = None
 
     # Building function
     def builder_helper(self, name, kernel_shape, initializer, trainable=True, constraint=None):
@@ -72,6 +75,16 @@ class MetaLayer(Layer):
                 return weight
         return None
 
+    def select_replicas(self, tensor, training=None, axis=1):
+        """
+        Gather from ``tensor`` the replicas in the ``replica_selection`` of the layer.
+        The replicas are only selected during the training and when the tensor has more
+        than one replica along ``axis``, otherwise the tensor is returned unchanged.
+        """
+        if not training or self.replica_selection is None or tensor.shape[axis] == 1:
+            return tensor
+        return self.replica_selection(tensor, axis=axis)
+
     # Implemented initializers
     @staticmethod
     def init_constant(value):
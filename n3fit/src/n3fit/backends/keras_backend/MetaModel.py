@@ -14,6 +14,7 @@ from tensorflow.keras import optimizers as Kopt
 from tensorflow.keras.models import Model
 from tensorflow.python.keras.utils import tf_utils  # pylint: disable=no-name-in-module
 
+from n3fit.backends.keras_backend.MetaLayer import MetaLayer
 import n3fit.backends.keras_backend.operations as op
 
 # We need a function to transform tensors to numpy/python primitives
@@ -120,6 +121,8 @@ class MetaModel(Model):
         self.target_tensors = None
         self.compute_losses_function = None
         self._scaler = scaler
+        self._replica_selection = None
+        self._weights_snapshot = None
 
     @tf.autograph.experimental.do_not_convert
     def _parse_input(self, extra_input=None):
@@ -253,6 +256,7 @@ class MetaModel(Model):
         loss=None,
         target_output=None,
         clipnorm=None,
+        freezable_pdf_model=None,
         **kwargs,
     ):
         """
@@ -279,6 +283,12 @@ class MetaModel(Model):
             target_output: list
                 list of outputs to compare the results to during fitting/evaluation
                 if given further calls to fit/evaluate must be done with y = None.
+            freezable_pdf_model: MetaModel
+                multi-replica PDF model whose replicas can be frozen during the fit
+                with ``set_replica_mask``, only used when no ``loss`` is given
+
+        If no ``loss`` is given the outputs of the model are taken to be the losses per replica
+        and their sum is minimized.
         """
         try:
             opt_tuple = optimizers[optimizer_name]
@@ -289,6 +299,12 @@ class MetaModel(Model):
 
         if loss is None:
             loss = _default_loss
+            if freezable_pdf_model is not None and freezable_pdf_model.num_replicas > 1:
+                # The selection is shared by all layers downstream of the PDF
+                self._replica_selection = ReplicaSelection(freezable_pdf_model.num_replicas)
+                for layer in self.layers:
+                    if isinstance(layer, MetaLayer):
+                        layer.replica_selection = self._replica_selection
 
         opt_function = opt_tuple[0]
         opt_args = opt_tuple[1]
@@ -313,6 +329,29 @@ class MetaModel(Model):
 
         super().compile(optimizer=opt, loss=loss, jit_compile=JIT_COMPILE)
 
+    def set_replica_mask(self, replica_mask):
+        """Freeze the replicas for which the mask is False.
+
+        During the training the layers of the model (observables, masks and losses)
+        only compute the active replicas, which are gathered from the output of the PDF model,
+        so that the cost of the training step decreases with the number of frozen replicas.
+        The frozen replicas don't receive any gradient, but note that their weights can still
+        be slightly modified by optimizers with a state (e.g. momentum).
+        When not training (e.g., ``compute_losses``) the model computes all replicas.
+        Only available for models compiled with the default loss and a ``freezable_pdf_model``.
+
+        Parameters
+        ----------
+            replica_mask: np.ndarray
+                boolean array of shape (replicas,) with the replicas to keep training
+        """
+        if self._replica_selection is None:
+            raise ValueError(
+                "The replica mask is only available for models compiled with loss=None"
+                " and a freezable_pdf_model"
+            )
+        self._replica_selection.assign(replica_mask)
+
     def set_masks_to(self, names, val=0.0):
         """Set all mask value to the selected value
         Masks in MetaModel should be named {name}_mask
@@ -407,6 +446,35 @@ class MetaModel(Model):
             layer = self.get_layer(layer_type)
             set_layer_replica_weights(layer=layer, weights=weights[layer_type], i_replica=i_replica)
 
+    def snapshot_replica_weights(self, replica_mask):
+        """
+        Save a copy of the current weights of the replicas selected by ``replica_mask``.
+        The copy is kept in the backend (see ``ReplicaWeightsSnapshot``) and the weights of all
+        selected replicas are saved at once, so this can be called at every epoch.
+
+        Parameters
+        ----------
+            replica_mask: np.ndarray
+                boolean array of shape (replicas,) with the replicas to save
+        """
+        if self._weights_snapshot is None:
+            self._weights_snapshot = ReplicaWeightsSnapshot(self)
+        self._weights_snapshot.save(np.asarray(replica_mask, dtype=bool))
+
+    def restore_replica_weights(self, replica_mask):
+        """
+        Set the weights of the replicas selected by ``replica_mask`` to the last copy
+        saved with ``snapshot_replica_weights``.
+
+        Parameters
+        ----------
+            replica_mask: np.ndarray
+                boolean array of shape (replicas,) with the replicas to restore
+        """
+        if self._weights_snapshot is None:
+            raise ValueError("No snapshot of the weights has been saved")
+        self._weights_snapshot.restore(np.asarray(replica_mask, dtype=bool))
+
     def split_replicas(self):
         """
         Split the single multi-replica model into a list of separate single replica models,
@@ -516,6 +584,87 @@ def get_layer_replica_weights(layer, i_replica: int):
     return weights
 
 
+class ReplicaWeightsSnapshot:
+    """
+    Copy of the per-replica weights of a multi-replica model
+    (i.e., those of the layers ``NN_LAYER_ALL_REPLICAS`` and ``PREPROCESSING_LAYER_ALL_REPLICAS``)
+    held in non-trainable backend variables.
+
+    The copy can be updated from (or restored into) the model for any subset of the replicas
+    with a single call, without the weights leaving the backend.
+
+    Parameters
+    ----------
+        model: MetaModel
+            the multi-replica PDF model
+    """
+
+    def __init__(self, model):
+        self._variables = []
+        # Replica to which each variable belongs, None if the variable has a replica axis
+        self._replicas = []
+        for layer_type in [NN_LAYER_ALL_REPLICAS, PREPROCESSING_LAYER_ALL_REPLICAS]:
+            layer = model.get_layer(layer_type)
+            if is_stacked_single_replicas(layer):
+                for i_replica in range(model.num_replicas):
+                    replica_weights = layer.get_layer(f"{NN_PREFIX}_{i_replica}").weights
+                    self._variables += replica_weights
+                    self._replicas += [i_replica] * len(replica_weights)
+            else:
+                self._variables += layer.weights
+                self._replicas += [None] * len(layer.weights)
+        self._snapshot = [
+            tf.Variable(tf.convert_to_tensor(w), trainable=False) for w in self._variables
+        ]
+
+    def _masked_assign(self, targets, sources, replica_mask):
+        """Assign ``sources`` to ``targets`` for the replicas selected by ``replica_mask``"""
+        for target, source, i_replica in zip(targets, sources, self._replicas):
+            if i_replica is None:
+                rank = len(target.shape)
+                mask = tf.reshape(replica_mask, (-1,) + (1,) * (rank - 1))
+            else:
+                mask = replica_mask[i_replica]
+            target.assign(tf.where(mask, source, target))
+
+    @tf.function
+    def save(self, replica_mask):
+        """Copy the weights of the model into the snapshot for the selected replicas"""
+        self._masked_assign(self._snapshot, self._variables, replica_mask)
+
+    @tf.function
+    def restore(self, replica_mask):
+        """Copy the snapshot into the weights of the model for the selected replicas"""
+        self._masked_assign(self._variables, self._snapshot, replica_mask)
+
+
+class ReplicaSelection:
+    """
+    Indices of the replicas of a multi-replica model to be computed, held in a backend
+    variable of variable length such that the selection can be changed
+    without the training step being traced again.
+
+    Calling the selection on a tensor gathers the selected replicas along the given axis.
+
+    Parameters
+    ----------
+        num_replicas: int
+            total number of replicas, all of them are selected initially
+    """
+
+    def __init__(self, num_replicas):
+        self._indices = tf.Variable(
+            np.arange(num_replicas, dtype=np.int32), shape=tf.TensorShape([None]), trainable=False
+        )
+
+    def assign(self, replica_mask):
+        """Select the replicas for which ``replica_mask`` is True"""
+        self._indices.assign(np.flatnonzero(replica_mask).astype(np.int32))
+
+    def __call__(self, tensor, axis=1):
+        return op.gather(tensor, self._indices, axis=axis)
+
+
 def set_layer_replica_weights(layer, weights, i_replica: int):
     """
     Set the weights for the given single replica ``i_replica``.
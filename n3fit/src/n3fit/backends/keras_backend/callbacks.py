@@ -106,6 +106,12 @@ class StoppingCallback(CallbackStep):
     and will stop the training model when the conditions given by ``stopping_object``
     are met.
 
+    The validation chi2 requires an extra evaluation of the validation model
+    which can be done only every ``validation_frequency`` epochs.
+    In this case the best and stopping epochs are found within this granularity.
+    With ``adaptive_validation`` the validation is evaluated as well on the epoch in which,
+    barring an improvement, the first of the active replicas would be stopped.
+
     Parameters
     ----------
         stopping_object: Stopping
@@ -113,34 +119,139 @@ class StoppingCallback(CallbackStep):
         log_freq: int
             each how many epochs the ``print_stats`` argument of ``stopping_object``
             will be set to true
+        freeze_stopped_replicas: bool
+            if True, the replicas already stopped by ``stopping_object`` are frozen
+            (see ``MetaModel.set_replica_mask``), the model must have been compiled
+            with a ``freezable_pdf_model``
+        validation_frequency: int
+            each how many epochs the ``stopping_object`` evaluates the validation chi2
+        adaptive_validation: bool
+            whether to evaluate also on the epochs in which a replica could be stopped
     """
 
-    def __init__(self, stopping_object, log_freq=100):
+    def __init__(
+        self,
+        stopping_object,
+        log_freq=100,
+        freeze_stopped_replicas=False,
+        validation_frequency=1,
+        adaptive_validation=False,
+    ):
         super().__init__()
         self.log_freq = log_freq
         self.stopping_object = stopping_object
+        self.freeze_stopped_replicas = freeze_stopped_replicas
+        self.validation_frequency = validation_frequency
+        self.adaptive_validation = adaptive_validation
+        self._n_active = None
+        self._last_monitored = -1
+        self._last_step = (-1, None)
+
+    def _monitor_now(self, epoch):
+        """Decide whether the validation chi2 is to be evaluated in this epoch"""
+        if (epoch + 1) % self.validation_frequency == 0:
+            return True
+        if self.adaptive_validation:
+            epochs_to_stop = self.stopping_object.epochs_to_stop
+            return epochs_to_stop is not None and epoch - self._last_monitored >= epochs_to_stop
+        return False
+
+    def _monitor(self, epoch, logs):
+        """Call the ``monitor_chi2`` method of the ``stopping_object`` and stop if needed"""
+        # Print the stats if a multiple of log_freq has been reached since the last call
+        print_stats = (epoch + 1) // self.log_freq > (self._last_monitored + 1) // self.log_freq
+        self._last_monitored = epoch
+        self.stopping_object.monitor_chi2(logs, epoch, print_stats=print_stats)
+        if self.stopping_object.stop_here():
+            self.model.stop_training = True
+        elif self.freeze_stopped_replicas:
+            self._freeze_replicas()
 
     def on_step_end(self, epoch, logs=None):
         """Function to be called at the end of every epoch
-        Every ``log_freq`` number of epochs, the ``monitor_chi2`` method of the ``stopping_object``
-        will be called and the validation loss (broken down by experiment) will be logged.
+        Every ``validation_frequency`` number of epochs, the ``monitor_chi2`` method of the
+        ``stopping_object`` will be called. Every ``log_freq`` number of epochs the validation
+        loss (broken down by experiment) will be logged.
         For the training model only the total loss is logged during the training.
         """
-        print_stats = ((epoch + 1) % self.log_freq) == 0
         # Note that the input logs correspond to the fit before the weights are updated
         logs = self.correct_logs(logs)
-        self.stopping_object.monitor_chi2(logs, epoch, print_stats=print_stats)
-        if self.stopping_object.stop_here():
-            self.model.stop_training = True
+        self._last_step = (epoch, logs)
+        if self._monitor_now(epoch):
+            self._monitor(epoch, logs)
+
+    def _freeze_replicas(self):
+        """Update the replica mask of the model whenever a new replica has been stopped"""
+        active = self.stopping_object.active_replicas
+        n_active = np.count_nonzero(active)
+        if n_active != self._n_active:
+            if self._n_active is not None:
+                log.info("Freezing stopped replicas, %d replicas still active", n_active)
+            self.model.set_replica_mask(active)
+            self._n_active = n_active
 
     def on_train_end(self, logs=None):
         """The training can be finished by the stopping or by
         Tensorflow when the number of epochs reaches the maximum.
         In this second case the stopping has to be manually set
+        (after evaluating the last epoch if it was skipped)
         """
+        last_epoch, last_logs = self._last_step
+        if last_epoch > self._last_monitored:
+            self._monitor(last_epoch, last_logs)
         self.stopping_object.make_stop()
 
 
+class PruningCallback(CallbackStep):
+    """
+    Reports the validation chi2 (averaged over replicas) monitored by ``stopping_object``
+    to a ``pruner`` (see :py:class:`n3fit.hyper_optimization.pruning.HyperPruner`)
+    at each of its rungs and stops the training if the pruner decides that the trial
+    is not worth continuing.
+    It must be placed after the ``StoppingCallback`` in the list of callbacks.
+
+    When several ``folds`` are trained at once, the replicas are split in as many
+    consecutive groups and the folds are reported in order until one of them is pruned.
+
+    Parameters
+    ----------
+        pruner: HyperPruner
+            object deciding whether the trial is to be pruned
+        stopping_object: Stopping
+            instance of Stopping which monitors the validation chi2
+        folds: list(int)
+            indices of the folds being trained
+        epochs: int
+            total number of epochs of the training
+    """
+
+    def __init__(self, pruner, stopping_object, folds=(0,), epochs=0):
+        super().__init__()
+        self.pruner = pruner
+        self.stopping_object = stopping_object
+        self.folds = folds
+        self._rungs = set(pruner.rungs(epochs))
+        self.pruned_at = None
+        self.pruned_fold = None
+
+    def on_step_end(self, epoch, logs=None):
+        if epoch + 1 not in self._rungs or self.model.stop_training:
+            return
+        vl_chi2 = self.stopping_object.last_vl_chi2
+        if vl_chi2 is None:
+            return
+        for fold, fold_chi2 in zip(self.folds, np.array_split(vl_chi2, len(self.folds))):
+            loss = float(np.mean(fold_chi2))
+            if self.pruner.report(fold, epoch + 1, loss):
+                log.info(
+                    "Trial pruned at epoch %d of fold %d (vl_chi2=%.3f)", epoch + 1, fold + 1, loss
+                )
+                self.pruned_at = epoch + 1
+                self.pruned_fold = fold
+                self.model.stop_training = True
+                return
+
+
 class LagrangeCallback(CallbackStep):
     """
     Updates the given datasets
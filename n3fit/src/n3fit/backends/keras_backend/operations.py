@@ -118,6 +118,26 @@ def numpy_to_tensor(ival, **kwargs):
     return K.constant(ival, **kwargs)
 
 
+# f(x: numpy) -> y: tensor
+def memory_map_to_tensor(ival):
+    """
+    Make a memory-mapped array into a tensor which points to the same memory,
+    such that the content of the file is not copied and its pages can be shared with
+    any other process mapping the same file.
+    This is only possible on CPU for a writable (e.g. copy-on-write) C-contiguous array
+    of the default float type, otherwise the array is copied as in ``numpy_to_tensor``.
+    """
+    can_share = (
+        ival.dtype == tf.keras.backend.floatx()
+        and ival.flags.c_contiguous
+        and ival.flags.writeable
+        and not tf.config.list_logical_devices('GPU')
+    )
+    if can_share:
+        return tf.experimental.dlpack.from_dlpack(ival.__dlpack__())
+    return numpy_to_tensor(ival)
+
+
 # f(x: tensor) -> y: tensor
 def batchit(x, batch_dimension=0, **kwarg):
     """Add a batch dimension to tensor x"""
@@ -190,6 +210,14 @@ def op_gather_keep_dims(tensor, indices, axis=0, **kwargs):
     return layer_op(tensor)
 
 
+def shape(tensor):
+    """
+    Shape of a tensor known only at runtime,
+    see full `docs <https://www.tensorflow.org/api_docs/python/tf/shape>`_
+    """
+    return tf.shape(tensor)
+
+
 def gather(*args, **kwargs):
     """
     Gather elements from a tensor along an axis
@@ -289,6 +317,14 @@ def tensor_product(*args, **kwargs):
     return tf.tensordot(*args, **kwargs)
 
 
+def matmul(*args, **kwargs):
+    """
+    Computes the matrix product of two tensors
+    See full `docs <https://www.tensorflow.org/api_docs/python/tf/linalg/matmul>`_
+    """
+    return tf.linalg.matmul(*args, **kwargs)
+
+
 @tf.function
 def pow(tensor, power):
     """
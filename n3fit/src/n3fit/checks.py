@@ -7,6 +7,7 @@ import numbers
 import os
 
 from n3fit.hyper_optimization import penalties as penalties_module
+from n3fit.hyper_optimization.pruning import IMPLEMENTED_METHODS as IMPLEMENTED_PRUNING
 from n3fit.hyper_optimization.rewards import IMPLEMENTED_LOSSES, IMPLEMENTED_STATS
 from reportengine.checks import CheckError, make_argcheck
 from validphys.loader import FallbackLoader
@@ -67,8 +68,8 @@ def check_consistent_layers(parameters):
 
 def check_stopping(parameters):
     """Checks whether the stopping-related options are sane:
-    stopping patience as a ratio between 0 and 1
-    and positive number of epochs
+    stopping patience as a ratio between 0 and 1,
+    positive number of epochs and positive validation frequency
     """
     spt = parameters.get("stopping_patience")
     if spt is not None and not 0.0 <= spt <= 1.0:
@@ -76,6 +77,9 @@ def check_stopping(parameters):
     epochs = parameters["epochs"]
     if epochs < 1:
         raise CheckError(f"Needs to run at least 1 epoch, got: {epochs}")
+    vfreq = parameters.get("validation_frequency", 1)
+    if not isinstance(vfreq, int) or vfreq < 1:
+        raise CheckError(f"The validation_frequency must be a positive integer, got: {vfreq}")
 
 
 def check_basis_with_layers(basis, validphys_basis, parameters):
@@ -302,6 +306,20 @@ def check_kfold_options(kfold):
                 "ensure it is implemented in the HyperLoss class in hyper_optimization/rewards.py"
             )
 
+    pruning = kfold.get("pruning")
+    if pruning is not None:
+        unknown_keys = set(pruning) - {"method", "min_epochs", "reduction_factor", "min_trials"}
+        if unknown_keys:
+            raise CheckError(f"Unknown options for the pruning of the trials: {unknown_keys}")
+        method = pruning.get("method", "median")
+        if method not in IMPLEMENTED_PRUNING:
+            raise CheckError(
+                f"The pruning method '{method}' is not recognized, "
+                f"options are: {IMPLEMENTED_PRUNING}"
+            )
+        if pruning.get("reduction_factor", 3) < 2:
+            raise CheckError("The reduction_factor of the pruning must be at least 2")
+
     partitions = kfold["partitions"]
     # Check specific errors for specific targets
     loss_target = kfold.get("fold_statistic")  # TODO: haven't updated this
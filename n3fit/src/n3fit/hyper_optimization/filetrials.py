@@ -1,17 +1,28 @@
 """
     Custom hyperopt trial object for persistent file storage
     in the form of json and pickle files within the nnfit folder
+
+    The finished trials are appended, one per line, to a trial log (``tries.jsonl``) which is
+    periodically compacted into the ``tries.json`` file, so that the cost of storing a trial
+    doesn't grow with the number of trials in the scan.
+    Both files are read by :py:func:`validphys.hyperoptplot.load_trials`.
 """
 import json
 import logging
+import os
 import pickle
 
-from hyperopt import Trials, space_eval
+from hyperopt import JOB_STATE_DONE, JOB_STATE_ERROR, Trials, space_eval
 
 from validphys.hyperoptplot import HyperoptTrial
 
 log = logging.getLogger(__name__)
 
+# The trial log is compacted into the json file once it holds at least as many trials as the
+# json file (so that the cost of the compaction is linear with the number of trials)
+# and never with less than this number of trials
+MIN_COMPACTION_TRIALS = 100
+
 # Note: the plan would be to do a PR in hyperopt's main repository
 # because these are things generic and useful enough that should be
 # in hyperopt by default. But for now it will stay here.
@@ -64,9 +75,13 @@ class FileTrials(Trials):
     def __init__(self, replica_path, parameters=None, **kwargs):
         self._store_trial = False
         self._json_file = replica_path / "tries.json"
+        self._log_file = replica_path / "tries.jsonl"
         self.pkl_file = replica_path / "tries.pkl"
         self._parameters = parameters
         self._rstate = None
+        # ids of the trials already stored and number of them in the log
+        self._stored_tids = set()
+        self._log_size = 0
         super().__init__(**kwargs)
 
     @property
@@ -102,22 +117,57 @@ class FileTrials(Trials):
     def refresh(self):
         """
         This is the "flushing" method which is called at the end of every trial to
-        save things in the database. We are are overloading it in order to also write
-        to a json file with every single trial.
+        save things in the database. We are are overloading it in order to also append
+        to the trial log every single trial once it is finished.
         """
         super().refresh()
 
         # write json to disk
         if self._store_trial:
-            log.info("Storing scan in %s", self._json_file)
-            local_trials = []
-            for idx, t in enumerate(self._dynamic_trials):
-                local_trials.append(t)
-                local_trials[idx]["misc"]["space_vals"] = space_eval_trial(self._parameters, t)
-
-            all_to_str = json.dumps(local_trials, default=str)
-            with open(self._json_file, "w") as f:
-                f.write(all_to_str)
+            finished = (JOB_STATE_DONE, JOB_STATE_ERROR)
+            new_trials = [
+                t
+                for t in self._dynamic_trials
+                if t["state"] in finished and t["tid"] not in self._stored_tids
+            ]
+            if not new_trials:
+                return
+            log.info("Storing scan in %s", self._log_file)
+            lines = []
+            for t in new_trials:
+                t["misc"]["space_vals"] = space_eval_trial(self._parameters, t)
+                lines.append(json.dumps(t, default=str) + "\n")
+                self._stored_tids.add(t["tid"])
+            with open(self._log_file, "a") as f:
+                f.writelines(lines)
+            self._log_size += len(new_trials)
+
+            compacted_trials = len(self._stored_tids) - self._log_size
+            if self._log_size >= max(MIN_COMPACTION_TRIALS, compacted_trials):
+                self.compact()
+
+    def compact(self):
+        """
+        Write all the trials stored so far to the json file and empty the trial log.
+        The json file is replaced atomically, if the scan is killed before the log is removed
+        the trials in both files are read only once.
+        """
+        stored_trials = [t for t in self._dynamic_trials if t["tid"] in self._stored_tids]
+        log.info("Compacting the scan in %s", self._json_file)
+        tmp_file = self._json_file.with_suffix(".json.tmp")
+        with open(tmp_file, "w") as f:
+            f.write(json.dumps(stored_trials, default=str))
+        os.replace(tmp_file, self._json_file)
+        self._log_file.unlink(missing_ok=True)
+        self._log_size = 0
+
+    def fmin(self, fn, space, *args, **kwargs):
+        """Run :py:func:`hyperopt.fmin` with these trials,
+        compacting the trial log at the end of the scan"""
+        try:
+            return super().fmin(fn, space, *args, **kwargs)
+        finally:
+            self.compact()
 
     # The two methods below are just a stupid overloading to avoid writing to the
     # database twice
@@ -134,6 +184,24 @@ class FileTrials(Trials):
         with open(self.pkl_file, "wb") as file:
             pickle.dump(self, file)
 
+    def load_history(self, pickle_filepath):
+        """
+        Take the finished trials and the state of the random generator of the ``FileTrials``
+        saved in a pickle file in order to restart a scan.
+        The trials which were still being evaluated when the file was written are discarded.
+        """
+        previous = self.from_pkl(pickle_filepath)
+        finished = (JOB_STATE_DONE, JOB_STATE_ERROR)
+        self._dynamic_trials = [t for t in previous._dynamic_trials if t["state"] in finished]
+        # keep all previous ids so that the new trials never reuse them
+        self._ids = set(previous._ids)
+        self.attachments = previous.attachments
+        self.rstate = previous.rstate
+        self.refresh()
+        # Start the new json file (and the trial log) with the finished trials
+        self._stored_tids = {t["tid"] for t in self._dynamic_trials}
+        self.compact()
+
     @classmethod
     def from_pkl(cls, pickle_filepath):
         """
@@ -23,6 +23,7 @@ import numpy as np
 from n3fit.backends import MetaLayer, MetaModel
 from n3fit.hyper_optimization.filetrials import FileTrials
 from n3fit.hyper_optimization.mongofiletrials import MongodRunner, MongoFileTrials
+from n3fit.hyper_optimization.poolfiletrials import PoolFileTrials
 
 log = logging.getLogger(__name__)
 
@@ -108,6 +109,9 @@ def hyper_scan_wrapper(replica_path_set, model_trainer, hyperscanner, max_evals=
     of all trials. An additional ``tries.pkl`` file will also be generated in the same folder
     that stores the previous states of `FileTrials`, this file can be used for restarting purposes.
 
+    The trials are run sequentially unless the ``hyperscanner`` asks for parallel trials,
+    either with MongoDB workers or in a local pool of processes (``num_local_workers > 1``).
+
     Parameters
     -----------
         replica_path_set: path
@@ -127,17 +131,11 @@ def hyper_scan_wrapper(replica_path_set, model_trainer, hyperscanner, max_evals=
     # Tell the trainer we are doing hpyeropt
     model_trainer.set_hyperopt(True, keys=hyperscanner.hyper_keys)
 
-    if hyperscanner.restart_hyperopt:
+    if hyperscanner.restart_hyperopt and hyperscanner.parallel_hyperopt:
         # For parallel hyperopt restarts, extract the database tar file
-        if hyperscanner.parallel_hyperopt:
-            tar_file_to_extract = f"{replica_path_set}/{hyperscanner.db_name}.tar.gz"
-            log.info("Restarting hyperopt run using the MongoDB database %s", tar_file_to_extract)
-            MongoFileTrials.extract_mongodb_database(tar_file_to_extract, path=os.getcwd())
-        else:
-            # For sequential hyperopt restarts, reset the state of `FileTrials` saved in the pickle file
-            pickle_file_to_load = f"{replica_path_set}/tries.pkl"
-            log.info("Restarting hyperopt run using the pickle file %s", pickle_file_to_load)
-            trials = FileTrials.from_pkl(pickle_file_to_load)
+        tar_file_to_extract = f"{replica_path_set}/{hyperscanner.db_name}.tar.gz"
+        log.info("Restarting hyperopt run using the MongoDB database %s", tar_file_to_extract)
+        MongoFileTrials.extract_mongodb_database(tar_file_to_extract, path=os.getcwd())
 
     if hyperscanner.parallel_hyperopt:
         # start MongoDB database by launching `mongod`
@@ -156,6 +154,14 @@ def hyper_scan_wrapper(replica_path_set, model_trainer, hyperscanner, max_evals=
             num_workers=hyperscanner.num_mongo_workers,
             parameters=hyperscanner.as_dict(),
         )
+    elif hyperscanner.num_local_workers > 1:
+        # Instantiate `PoolFileTrials`
+        trials = PoolFileTrials(
+            replica_path_set,
+            num_workers=hyperscanner.num_local_workers,
+            parameters=hyperscanner.as_dict(),
+            result_callback=model_trainer.register_hyperopt_result,
+        )
     else:
         # Instantiate `FileTrials`
         trials = FileTrials(replica_path_set, parameters=hyperscanner.as_dict())
@@ -163,6 +169,16 @@ def hyper_scan_wrapper(replica_path_set, model_trainer, hyperscanner, max_evals=
     # Initialize seed for hyperopt
     trials.rstate = np.random.default_rng(HYPEROPT_SEED)
 
+    if hyperscanner.restart_hyperopt and not hyperscanner.parallel_hyperopt:
+        # For sequential (or local pool) hyperopt restarts, recover the trials
+        # and the state of the random generator saved in the pickle file
+        pickle_file_to_load = f"{replica_path_set}/tries.pkl"
+        log.info("Restarting hyperopt run using the pickle file %s", pickle_file_to_load)
+        trials.load_history(pickle_file_to_load)
+        # Let the pruning of the trials know about the ones already evaluated
+        for result in trials.results:
+            model_trainer.register_hyperopt_result(result)
+
     # Call to hyperopt.fmin
     fmin_args = dict(
         fn=model_trainer.hyperparametrizable,
@@ -253,6 +269,9 @@ class HyperScanner:
             self.num_mongo_workers = sampling_dict.get("num_mongo_workers")
             self.mongod_runner = MongodRunner(self.db_name, self.db_port)
 
+        # number of trials to be run simultaneously in a local pool of processes
+        self.num_local_workers = sampling_dict.get("num_local_workers", 1)
+
         self.hyper_keys = set([])
 
         if "parameters" in sampling_dict:
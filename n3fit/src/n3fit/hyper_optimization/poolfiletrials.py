@@ -0,0 +1,189 @@
+"""
+    Hyperopt trial object for parallel hyperoptimization in a local pool of processes.
+    The trials are evaluated concurrently by forked copies of the n3fit process, so that no database
+    is needed, and stored in the json and pickle files of
+    :class:`n3fit.hyper_optimization.filetrials.FileTrials` within the nnfit folder.
+"""
+
+import logging
+import multiprocessing
+import pickle
+import time
+
+from hyperopt import base, space_eval
+from hyperopt.fmin import FMinIter
+from hyperopt.utils import coarse_utcnow
+
+from n3fit.hyper_optimization.filetrials import FileTrials
+
+log = logging.getLogger(__name__)
+
+# Domain (objective function and space) of the scan being run,
+# the worker processes inherit it when they are forked so that it never needs to be pickled
+_DOMAIN = None
+
+
+def _evaluate_trial(spec):
+    """Evaluate the objective function of ``_DOMAIN`` for the hyperparameters ``spec``
+    in a worker process"""
+    return _DOMAIN.evaluate(spec, base.Ctrl(None))
+
+
+class _PoolFMinIter(FMinIter):
+    """``hyperopt.fmin.FMinIter`` handing the new trials to the pool of a ``PoolFileTrials``
+    instead of evaluating them one by one"""
+
+    def serial_evaluate(self, N=-1):
+        self.trials.evaluate_new_trials(self.catch_eval_exceptions, self.poll_interval_secs)
+
+    def exhaust(self):
+        super().exhaust()
+        # Wait for the trials which are still being evaluated
+        while self.trials.num_running:
+            self.trials.evaluate_new_trials(self.catch_eval_exceptions, self.poll_interval_secs)
+        if self.trials_save_file != "":
+            with open(self.trials_save_file, "wb") as file:
+                pickle.dump(self.trials, file)
+        return self
+
+
+class PoolFileTrials(FileTrials):
+    """
+    Version of :class:`n3fit.hyper_optimization.filetrials.FileTrials` which evaluates up to
+    ``num_workers`` trials simultaneously, each of them in a new process forked from the
+    running one.
+
+    A new trial is suggested (with the information of all trials finished until that moment)
+    every time one of the workers becomes idle.
+
+    The workers inherit the state of the backend of the running process, in particular its GPU
+    configuration, which cannot be changed after the fork. When running on a GPU,
+    ``TF_FORCE_GPU_ALLOW_GROWTH=true`` must be set in the environment of ``n3fit``
+    so that no worker takes all the memory of the GPU.
+
+    Parameters
+    ----------
+        replica_path: path
+            Replica folder as generated by n3fit
+        num_workers: int
+            Number of trials to be evaluated concurrently
+        parameters: dict
+            Dictionary of parameters on which we are doing hyperoptimization
+        result_callback: callable
+            Function called in the main process with the result of every finished trial,
+            used to share information between trials evaluated in different workers
+    """
+
+    def __init__(
+        self, replica_path, num_workers=1, parameters=None, result_callback=None, **kwargs
+    ):
+        self.num_workers = num_workers
+        self._result_callback = result_callback
+        self._pool = None
+        self._running = {}
+        super().__init__(replica_path, parameters=parameters, **kwargs)
+
+    def __getstate__(self):
+        # The pool, the trials being evaluated and the callback cannot be pickled
+        state = self.__dict__.copy()
+        state["_result_callback"] = None
+        state["_pool"] = None
+        state["_running"] = {}
+        return state
+
+    @property
+    def num_running(self):
+        """Number of trials being evaluated"""
+        return len(self._running)
+
+    def evaluate_new_trials(self, catch_eval_exceptions=False, poll_interval=1.0):
+        """
+        Hand the new trials to the idle workers of the pool.
+        If, after that, there are no idle workers left (or no trials were given to the workers),
+        wait until at least one of the trials being evaluated is finished and collect its result.
+
+        Parameters
+        ----------
+            catch_eval_exceptions: bool
+                if False, an exception in the evaluation of a trial is raised
+                otherwise the trial is marked as failed
+            poll_interval: float
+                seconds between checks of the status of the workers
+        """
+        new_trials = [t for t in self._dynamic_trials if t["state"] == base.JOB_STATE_NEW]
+        idle_workers = self.num_workers - self.num_running
+        for trial in new_trials[:idle_workers]:
+            now = coarse_utcnow()
+            trial["state"] = base.JOB_STATE_RUNNING
+            trial["book_time"] = now
+            trial["refresh_time"] = now
+            spec = base.spec_from_misc(trial["misc"])
+            self._running[trial["tid"]] = (trial, self._pool.apply_async(_evaluate_trial, (spec,)))
+        self.refresh()
+
+        # Leave the idle workers free for the next trials to be suggested
+        if new_trials and self.num_running < self.num_workers:
+            return
+
+        finished = []
+        while self._running and not finished:
+            time.sleep(poll_interval)
+            finished = [tid for tid, (_, res) in self._running.items() if res.ready()]
+
+        for tid in finished:
+            trial, res = self._running.pop(tid)
+            trial["refresh_time"] = coarse_utcnow()
+            try:
+                trial["result"] = res.get()
+                trial["state"] = base.JOB_STATE_DONE
+                if self._result_callback is not None:
+                    self._result_callback(trial["result"])
+            except Exception as e:
+                log.error("job exception: %s", e)
+                trial["state"] = base.JOB_STATE_ERROR
+                trial["misc"]["error"] = (str(type(e)), str(e))
+                if not catch_eval_exceptions:
+                    self.refresh()
+                    raise
+        self._store_trial = True
+        self.refresh()
+
+    def fmin(
+        self,
+        fn,
+        space,
+        algo=None,
+        max_evals=None,
+        rstate=None,
+        pass_expr_memo_ctrl=None,
+        catch_eval_exceptions=False,
+        return_argmin=True,
+        **kwargs,
+    ):
+        """
+        Minimize ``fn`` over ``space`` evaluating the trials in a pool of ``num_workers``
+        processes. This method is called by :py:func:`hyperopt.fmin`, which forwards to it
+        all its arguments.
+        """
+        global _DOMAIN
+        _DOMAIN = base.Domain(fn, space, pass_expr_memo_ctrl=pass_expr_memo_ctrl)
+        # Every process evaluates one single trial so that the backend always starts anew
+        context = multiprocessing.get_context("fork")
+        log.info("Starting a pool of %d processes for the hyperopt trials", self.num_workers)
+        try:
+            with context.Pool(self.num_workers, maxtasksperchild=1) as pool:
+                self._pool = pool
+                fmin_iter = _PoolFMinIter(
+                    algo, _DOMAIN, self, rstate=rstate, max_evals=max_evals, **kwargs
+                )
+                fmin_iter.catch_eval_exceptions = catch_eval_exceptions
+                fmin_iter.exhaust()
+        finally:
+            self._pool = None
+            self._running = {}
+            _DOMAIN = None
+            self.compact()
+
+        if return_argmin:
+            return self.argmin
+        return space_eval(space, self.argmin)
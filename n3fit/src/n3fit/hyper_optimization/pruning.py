@@ -0,0 +1,135 @@
+"""
+    Early termination (pruning) of hyperopt trials
+
+    During the training of every fold the validation chi2 monitored by the stopping is reported
+    at a number of epochs (rungs) and compared with the one reported, at the same fold and rung,
+    by the trials evaluated before. Trials which are not promising are stopped there,
+    saving the training of the remaining epochs and folds.
+
+    The rungs are geometrically spaced, ``min_epochs * reduction_factor**i``, and the
+    trials are compared following one of the implemented rules:
+
+    - ``median``: median stopping rule, a trial is pruned when its loss
+      is worse than the median of the previous trials
+    - ``asha``: asynchronous successive halving, a trial is pruned unless its loss is
+      among the best ``1/reduction_factor`` of all the trials which have reached the rung
+
+    Example
+    -------
+    >>> from n3fit.hyper_optimization.pruning import HyperPruner
+    >>> pruner = HyperPruner(method="median", min_epochs=10, min_trials=2)
+    >>> pruner.rungs(100)
+    [10, 30, 90]
+    >>> pruner.add_reports([(0, 10, 2.0), (0, 30, 1.5)])
+    >>> pruner.add_reports([(0, 10, 4.0)])
+    >>> pruner.start_trial()
+    >>> pruner.report(0, 10, 3.5)
+    True
+"""
+
+import numpy as np
+
+IMPLEMENTED_METHODS = ("median", "asha")
+
+
+class HyperPruner:
+    """
+    Decides whether the trial being evaluated has to be pruned by comparing the losses
+    it reports with the losses reported by the previous trials at the same fold and rung.
+
+    Parameters
+    ----------
+        method: str
+            rule used to prune the trials, one of ``IMPLEMENTED_METHODS``
+        min_epochs: int
+            number of epochs of the first rung
+        reduction_factor: int
+            ratio between the epochs of consecutive rungs,
+            with ``asha`` only the best ``1/reduction_factor`` of the trials continue
+        min_trials: int
+            number of previous trials which must have reached a rung before
+            any trial is pruned at it
+    """
+
+    def __init__(self, method="median", min_epochs=1000, reduction_factor=3, min_trials=5):
+        if method not in IMPLEMENTED_METHODS:
+            raise ValueError(
+                f"Pruning method {method} not implemented, options are: {IMPLEMENTED_METHODS}"
+            )
+        if reduction_factor < 2:
+            raise ValueError("The reduction factor of the pruning must be at least 2")
+        self.method = method
+        self.min_epochs = min_epochs
+        self.reduction_factor = reduction_factor
+        self.min_trials = min_trials
+        # Losses of the previous trials for each (fold, rung)
+        self._history = {}
+        # Reports of the trial being evaluated as (fold, rung, loss)
+        self._reports = []
+
+    def rungs(self, epochs):
+        """List of the rungs (in number of epochs) before a total of ``epochs``"""
+        rungs = []
+        rung = self.min_epochs
+        while rung < epochs:
+            rungs.append(rung)
+            rung *= self.reduction_factor
+        return rungs
+
+    def start_trial(self):
+        """Start a new trial, forgetting the reports of the previous one
+        if it was never ended"""
+        self._reports = []
+
+    def report(self, fold, rung, loss):
+        """
+        Report the ``loss`` of the current trial at the given ``fold`` and ``rung``
+        and decide whether the trial has to be pruned.
+
+        Parameters
+        ----------
+            fold: int
+                index of the fold being trained
+            rung: int
+                number of epochs trained in this fold
+            loss: float
+                validation loss of the trial
+
+        Returns
+        -------
+            bool
+                whether the trial has to be pruned
+        """
+        self._reports.append((fold, rung, loss))
+        if np.isnan(loss):
+            return True
+        previous = self._history.get((fold, rung), [])
+        if len(previous) < self.min_trials:
+            return False
+
+        if self.method == "median":
+            return bool(loss > np.median(previous))
+        # asha: keep the trial only if it is among the best 1/eta at this rung
+        n_keep = max(1, (len(previous) + 1) // self.reduction_factor)
+        return bool(np.sum(np.array(previous) < loss) >= n_keep)
+
+    def end_trial(self):
+        """End the current trial, adding its reports to the history
+
+        Returns
+        -------
+            list
+                the reports of the trial as (fold, rung, loss)
+        """
+        reports = self._reports
+        self.add_reports(reports)
+        self._reports = []
+        return reports
+
+    def add_reports(self, reports):
+        """Add to the history the ``reports`` of a trial evaluated somewhere else
+        (for instance in a different process or in a previous run)"""
+        for fold, rung, loss in reports:
+            if np.isnan(loss):
+                continue
+            self._history.setdefault((int(fold), int(rung)), []).append(float(loss))
@@ -199,6 +199,7 @@ class HyperLoss:
         pdf_model: MetaModel,
         experimental_data: list[DataGroupSpec],
         fold_idx: int = 0,
+        replica_models: list = None,
     ) -> float:
         """
         Compute the loss, including added penalties, for a single fold.
@@ -220,6 +221,9 @@ class HyperLoss:
                 List of tuples containing `validphys.core.DataGroupSpec` instances for each group data set
             fold_idx: int
                 k-fold index. Defaults to 0.
+            replica_models: List[:class:`n3fit.backends.MetaModel`]
+                Single replica models to be used instead of the replicas of ``pdf_model``
+                (e.g., if it was already split or only some of its replicas belong to the fold).
             include_penalties: float
                 Whether to include the penalties in the returned loss value
 
@@ -244,7 +248,9 @@ class HyperLoss:
         >>> loss = hyper.compute_loss(penalties, experimental_loss, pdf_model, experimental_data)
         """
         # calculate phi for a given k-fold using vpinterface and validphys
-        phi_per_fold = compute_phi(N3PDF(pdf_model.split_replicas()), experimental_data)
+        if replica_models is None:
+            replica_models = pdf_model.split_replicas()
+        phi_per_fold = compute_phi(N3PDF(replica_models), experimental_data)
 
         # update hyperopt metrics
         # these are saved in the phi_vector and chi2_matrix attributes, excluding penalties
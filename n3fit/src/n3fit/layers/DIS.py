@@ -80,9 +80,51 @@ class DIS(Observable):
         """
         return op.einsum('fF, nFx -> nxf', mask, fk)
 
+    def map_fk(self, fk, bool_mask):
+        """
+        Prepare a memory-mapped fk table to be contracted, in the layout in which it is stored,
+        with the active flavours of the PDF, see ``compute_dis_observable_memory_map``.
+
+        Parameters
+        ----------
+            fk: tensor
+                FK table of shape (ndata, active_flavours, x)
+            bool_mask: tensor
+                mask of the active flavours of shape (flavours,)
+
+        Returns
+        -------
+            (fk, flavours): tuple
+                fk table of shape (ndata, active_flavours * x) and the active flavours
+        """
+        return op.reshape(fk, (fk.shape[0], -1)), np.flatnonzero(bool_mask)
+
+    def stack_fk(self, fks, masks):
+        """
+        Stack the padded fk tables of several DIS observables along the data axis.
+
+        Parameters
+        ----------
+            fks: list[tensor]
+                FK tables of shape (ndata_i, active_flavours_i, x)
+            masks: list[tensor]
+                masks of shape (flavours, active_flavours_i)
+
+        Returns
+        -------
+            stacked_fk: tensor
+                padded fk table of shape (x, flavours, sum(ndata_i))
+            compute_observable: function
+                the function contracting ``stacked_fk`` with the PDF
+        """
+        padded_fks = [op.einsum('fF, nFx -> xfn', m, fk) for fk, m in zip(fks, masks)]
+        return op.concatenate(padded_fks, axis=-1), compute_dis_observable_stacked
+
     def build(self, input_shape):
         super().build(input_shape)
-        if self.num_replicas > 1:
+        if self.memory_mapped:
+            self.compute_observable = compute_dis_observable_memory_map
+        elif self.num_replicas > 1:
             self.compute_observable = compute_dis_observable_many_replica
         else:
             self.compute_observable = compute_dis_observable_one_replica
@@ -113,3 +155,47 @@ def compute_dis_observable_one_replica(pdf, padded_fk):
     masking the PDF rather than the fk table.
     """
     return op.tensor_product(pdf[0], padded_fk, axes=[(2, 3), (1, 2)])
+
+
+def compute_dis_observable_stacked(pdf, stacked_fk):
+    """
+    Contract the fk table of a stack of observables with the PDF,
+    with the fk table already transposed such that this is one single matrix product.
+
+    Parameters
+    ----------
+        pdf: list[tensor]
+            list of pdf of shape (batch=1, replicas, xgrid, flavours)
+        stacked_fk: tensor
+            masked fk table of shape (xgrid, flavours, ndata)
+
+    Returns
+    -------
+        tensor
+            observable of shape (batch=1, replicas, ndata)
+    """
+    return op.tensor_product(pdf[0], stacked_fk, axes=[(2, 3), (0, 1)])
+
+
+def compute_dis_observable_memory_map(pdf, fk_and_flavours):
+    """
+    Contract a memory-mapped fk table with the PDF.
+    The active flavours of the PDF are transposed to the layout of the fk table,
+    such that this is one single matrix product in which the fk table is never copied.
+
+    Parameters
+    ----------
+        pdf: list[tensor]
+            list of pdf of shape (batch=1, replicas, xgrid, flavours)
+        fk_and_flavours: tuple
+            fk table of shape (ndata, active_flavours * xgrid) and the active flavours
+
+    Returns
+    -------
+        tensor
+            observable of shape (batch=1, replicas, ndata)
+    """
+    fk, flavours = fk_and_flavours
+    pdf_active = op.einsum('brxF -> brFx', op.gather(pdf[0], flavours, axis=-1))
+    observable = op.matmul(op.reshape(pdf_active, (-1, fk.shape[1])), fk, transpose_b=True)
+    return op.batchit(observable)
@@ -34,8 +34,13 @@ class DY(Observable):
 
     def pad_fk(self, fk, mask):
         """
-        Combine an fk table and a mask into an fk table padded with zeroes for the inactive
-        flavours, to be contracted with the full PDF.
+        Combine an fk table and a mask into the input of ``compute_observable``.
+
+        In the case of more than 1 replica, the fk table is padded with zeroes only to the
+        flavours of the PDFs that enter at least one of the active luminosity channels,
+        and only those flavours are taken from the PDFs.
+        The fk table is transposed such that it is contracted first with the PDF with more
+        active flavours, leaving the smallest intermediate tensor for the second contraction.
 
         In the case of 1 replica, this is less efficient than masking the PDF directly, so we
         leave them separate.
@@ -49,28 +54,151 @@ class DY(Observable):
 
         Returns
         -------
-            padded_fk: tensor of shape ndata, x, flavours, y, flavours) (>1 replicas case)
+            (padded_fk, first, second): tuple of inputs (>1 replicas case)
             (mask, fk): tuple of inputs (1 replica case)
         """
         if self.num_replicas > 1:
-            return op.einsum('fgF, nFxy -> nxfyg', mask, fk)
+            return pad_fk_active_flavours([fk], [mask])
         else:
             mask = op.einsum('fgF -> Ffg', mask)
             fk = op.einsum('nFxy -> nFyx', fk)
             mask_and_fk = (mask, fk)
             return mask_and_fk
 
+    def map_fk(self, fk, bool_mask):
+        """
+        Prepare a memory-mapped fk table to be contracted, in the layout in which it is stored,
+        with the luminosity of the active channels, see ``compute_dy_observable_memory_map``.
+
+        Parameters
+        ----------
+            fk: tensor
+                FK table of shape (ndata, active_flavours, x, y)
+            bool_mask: tensor
+                mask of the active luminosity channels of shape (flavours, flavours)
+
+        Returns
+        -------
+            (fk, flavours_x, flavours_y): tuple
+                fk table of shape (ndata, active_flavours * x * y) and the flavours of the first
+                and second PDF entering each of the active channels
+        """
+        flavours_x, flavours_y = np.argwhere(bool_mask).T
+        return op.reshape(fk, (fk.shape[0], -1)), flavours_x, flavours_y
+
+    def stacking_key(self):
+        """
+        The stacking of DY observables must not increase the size of the contractions:
+        in the case of more than 1 replica, only observables with the same flavours entering
+        the active luminosity channels are stacked together,
+        in the case of 1 replica, only observables with the same luminosity channels.
+        """
+        mask = np.asarray(self.all_masks[0])
+        if self.num_replicas > 1:
+            flavours_x = np.flatnonzero(mask.any(axis=1))
+            flavours_y = np.flatnonzero(mask.any(axis=0))
+            return tuple(flavours_x), tuple(flavours_y)
+        return tuple(map(tuple, np.argwhere(mask)))
+
+    def stack_fk(self, fks, masks):
+        """
+        Stack several fk tables, which must share the same ``stacking_key``,
+        along the data axis into the input of ``compute_observable``.
+
+        Parameters
+        ----------
+            fks: list[tensor]
+                FK tables of shape (ndata_i, active_flavours, x, y)
+            masks: list[tensor]
+                masks of shape (flavours, flavours, active_flavours)
+
+        Returns
+        -------
+            stacked_fk: tuple
+                input of ``compute_observable``
+            compute_observable: function
+                the function contracting ``stacked_fk`` with the PDFs
+        """
+        if self.num_replicas > 1:
+            return pad_fk_active_flavours(fks, masks), compute_dy_observable_active_flavours
+        mask, _ = self.pad_fk(fks[0], masks[0])
+        stacked_fk = op.concatenate([self.pad_fk(fk, m)[1] for fk, m in zip(fks, masks)], axis=0)
+        return (mask, stacked_fk), compute_dy_observable_one_replica
+
     def build(self, input_shape):
         super().build(input_shape)
-        if self.num_replicas > 1:
-            self.compute_observable = compute_dy_observable_many_replica
+        if self.memory_mapped:
+            self.compute_observable = compute_dy_observable_memory_map
+        elif self.num_replicas > 1:
+            self.compute_observable = compute_dy_observable_active_flavours
         else:
             self.compute_observable = compute_dy_observable_one_replica
 
 
+def pad_fk_active_flavours(fks, masks):
+    """
+    Pad a list of fk tables with zeroes to the flavours of the PDFs entering at least one of
+    the active luminosity channels of any of them and stack them along the data axis.
+    The fk table is transposed such that it is contracted first with the PDF with more
+    active flavours, leaving the smallest intermediate tensor for the second contraction.
+
+    Parameters
+    ----------
+        fks: list[tensor]
+            FK tables of shape (ndata_i, active_flavours_i, x, y)
+        masks: list[tensor]
+            masks of shape (flavours, flavours, active_flavours_i)
+
+    Returns
+    -------
+        (padded_fk, first, second): tuple
+            input of ``compute_dy_observable_active_flavours``
+    """
+    masks = [np.asarray(mask) for mask in masks]
+    flavours_x = np.flatnonzero(np.any([mask.any(axis=(1, 2)) for mask in masks], axis=0))
+    flavours_y = np.flatnonzero(np.any([mask.any(axis=(0, 2)) for mask in masks], axis=0))
+    active_masks = [mask[np.ix_(flavours_x, flavours_y)] for mask in masks]
+    # (index of the PDF, active flavours) for the first and second contractions
+    if len(flavours_x) <= len(flavours_y):
+        padded_fks = [op.einsum('fgF, nFxy -> ygnxf', m, fk) for m, fk in zip(active_masks, fks)]
+        return op.concatenate(padded_fks, axis=2), (1, flavours_y), (0, flavours_x)
+    padded_fks = [op.einsum('fgF, nFxy -> xfnyg', m, fk) for m, fk in zip(active_masks, fks)]
+    return op.concatenate(padded_fks, axis=2), (0, flavours_x), (1, flavours_y)
+
+
+def compute_dy_observable_active_flavours(pdf, fk_and_flavours):
+    """
+    Contract the fk table, padded only to the active flavours, with two PDFs.
+
+    Parameters
+    ----------
+        pdf: list[tensor]
+            list of pdf of shape (batch=1, replicas, xgrid, flavours)
+        fk_and_flavours: tuple
+            fk table of shape (xgrid, active flavours, ndata, xgrid, active flavours)
+            where the first two axes are contracted with the first PDF
+            and the last two with the second, and, for each of the two contractions,
+            the index of the PDF in ``pdf`` and its active flavours
+
+    Returns
+    -------
+        tensor
+            observable of shape (batch=1, replicas, ndata)
+    """
+    padded_fk, (i_first, flavours_first), (i_second, flavours_second) = fk_and_flavours
+    pdf_first = op.gather(pdf[i_first], flavours_first, axis=-1)
+    pdf_second = op.gather(pdf[i_second], flavours_second, axis=-1)
+
+    temp = op.tensor_product(pdf_first, padded_fk, axes=[(2, 3), (0, 1)])  # brnxf
+    return op.einsum('brnxf, brxf -> brn', temp, pdf_second)
+
+
 def compute_dy_observable_many_replica(pdf, padded_fk):
     """
     Contract masked fk table with two PDFs.
+    This is the implementation with the fk table padded to all flavours with zeroes
+    (padded_fk = einsum('fgF, nFxy -> nxfyg', mask, fk)),
+    see ``compute_dy_observable_active_flavours`` for the one used in the fit.
 
     Parameters
     ----------
@@ -86,7 +214,7 @@ def compute_dy_observable_many_replica(pdf, padded_fk):
     """
     pdfa = pdf[1]
     pdfb = pdf[0]
-    
+
     temp = op.einsum('nxfyg, bryg -> brnxf', padded_fk, pdfa)
     return op.einsum('brnxf, brxf -> brn', temp, pdfb)
 
@@ -108,3 +236,31 @@ def compute_dy_observable_one_replica(pdf, mask_and_fk):
     observable = op.tensor_product(fk, pdf_x_pdf, axes=[(1, 2, 3), (0, 1, 2)])  # nFyx, Fyx -> n
 
     return op.batchit(op.batchit(observable))  # brn
+
+
+def compute_dy_observable_memory_map(pdf, fk_and_flavours):
+    """
+    Contract a memory-mapped fk table with two PDFs.
+    The luminosity of the active channels is computed in the layout of the fk table,
+    such that the contraction with the fk table is one single matrix product
+    in which the fk table is never copied.
+
+    Parameters
+    ----------
+        pdf: list[tensor]
+            list of pdf of shape (batch=1, replicas, xgrid, flavours)
+        fk_and_flavours: tuple
+            fk table of shape (ndata, active_flavours * xgrid * xgrid) and the flavours
+            of the first and second PDF entering each of the active channels
+
+    Returns
+    -------
+        tensor
+            observable of shape (batch=1, replicas, ndata)
+    """
+    fk, flavours_x, flavours_y = fk_and_flavours
+    pdf_x = op.gather(pdf[0], flavours_x, axis=-1)
+    pdf_y = op.gather(pdf[1], flavours_y, axis=-1)
+    luminosity = op.einsum('brxF, bryF -> brFxy', pdf_x, pdf_y)
+    observable = op.matmul(op.reshape(luminosity, (-1, fk.shape[1])), fk, transpose_b=True)
+    return op.batchit(observable)
@@ -4,6 +4,7 @@ from .DIS import DIS
 from .DY import DY
 from .mask import Mask
 from .msr_normalization import MSR_Normalization
+from .observable import StackedObservable
 from .preprocessing import Preprocessing
 from .rotations import AddPhoton, FkRotation, FlavourToEvolution, ObsRotation
 from .x_operations import xDivide, xIntegrator
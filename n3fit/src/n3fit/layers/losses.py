@@ -9,6 +9,7 @@
 """
 
 import numpy as np
+from scipy.linalg import solve_triangular
 
 from n3fit.backends import MetaLayer
 from n3fit.backends import operations as op
@@ -20,7 +21,8 @@ class LossInvcovmat(MetaLayer):
     L = \\sum_{ij} (yt - yp)_{i} invcovmat_{ij} (yt - yp)_{j}
 
     Takes as argument the inverse of the covmat and the target data.
-    It also takes an optional argument to mask part of the predictions
+    It also takes an optional argument to mask part of the predictions,
+    either for all replicas (shape (ndata,)) or per replica (shape (replicas, ndata)).
 
     Both the inverse covmat and the mask (if any) are stored as layer weights
     and can be updated at any points either directly or by using the
@@ -39,15 +41,17 @@ class LossInvcovmat(MetaLayer):
     True
     """
 
+    _kernel_name = "invcovmat"
+
     def __init__(self, invcovmat, y_true, mask=None, covmat=None, **kwargs):
         self._invcovmat = op.numpy_to_tensor(invcovmat)
         self._covmat = covmat
         self._y_true = op.numpy_to_tensor(y_true)
         self._ndata = y_true.shape[-1]
-        if mask is None or all(mask):
+        if mask is None or np.all(mask):
             self._mask = None
         else:
-            mask = np.array(mask, dtype=np.float32).reshape((1, 1, -1))
+            mask = np.array(mask, dtype=np.float32).reshape((1, -1, self._ndata))
             self._mask = op.numpy_to_tensor(mask)
         super().__init__(**kwargs)
 
@@ -55,11 +59,14 @@ class LossInvcovmat(MetaLayer):
         """Transform the inverse covmat and the mask into
         weights of the layers"""
         init = MetaLayer.init_constant(self._invcovmat)
-        self.kernel = self.builder_helper("invcovmat", self._invcovmat.shape, init, trainable=False)
-        mask_shape = (1, 1, self._ndata)
+        self.kernel = self.builder_helper(
+            self._kernel_name, self._invcovmat.shape, init, trainable=False
+        )
         if self._mask is None:
+            mask_shape = (1, 1, self._ndata)
             init_mask = MetaLayer.init_constant(np.ones(mask_shape))
         else:
+            mask_shape = tuple(self._mask.shape)
             init_mask = MetaLayer.init_constant(self._mask)
         self.mask = self.builder_helper("mask", mask_shape, init_mask, trainable=False)
 
@@ -75,27 +82,100 @@ class LossInvcovmat(MetaLayer):
         """Update the mask"""
         self.mask.assign(new_mask)
 
-    def call(self, y_pred, **kwargs):
-        obs_diff_raw = self._y_true - y_pred
+    def _selected_weights(self, training):
+        """Target data, kernel and mask of the replicas in the ``replica_selection``
+        (the kernel has a replica axis only if it is not the experimental one)"""
+        y_true = self.select_replicas(self._y_true, training, axis=-2)
+        mask = self.select_replicas(self.mask, training, axis=-2)
+        kernel = self.kernel
+        if len(kernel.shape) == 3:
+            kernel = self.select_replicas(kernel, training, axis=0)
+        return y_true, kernel, mask
+
+    def call(self, y_pred, training=None):
+        y_true, kernel, mask = self._selected_weights(training)
+        obs_diff_raw = y_true - y_pred
         # TODO: most of the time this is a y * I multiplication and can be skipped
         # benchmark how much time (if any) is lost in this in actual fits for the benefit of faster kfolds
-        obs_diff = op.op_multiply([obs_diff_raw, self.mask])
+        obs_diff = op.op_multiply([obs_diff_raw, mask])
 
         # The experimental loss doesn't depend on replicas, so it doesn't have a replica axis and
         # must be treated separately
-        experimental_loss = len(self.kernel.shape) == 2
+        experimental_loss = len(kernel.shape) == 2
         one_replica = obs_diff.shape[1] == 1
 
         if one_replica:  # einsum is not well suited for CPU, so use tensordot if single replica
-            kernel = self.kernel if experimental_loss else self.kernel[0]
+            kernel = kernel if experimental_loss else kernel[0]
             right_dot = op.tensor_product(kernel, obs_diff[0, 0, :], axes=1)
             loss = op.tensor_product(obs_diff[0, :, :], right_dot, axes=1)
         else:
             einstr = "bri, ij, brj -> r" if experimental_loss else "bri, rij, brj -> r"
-            loss = op.einsum(einstr, obs_diff, self.kernel, obs_diff)
+            loss = op.einsum(einstr, obs_diff, kernel, obs_diff)
         return loss
 
 
+def whitening_matrix(covmat):
+    """Compute the inverse of the lower triangular Cholesky factor of ``covmat``,
+    i.e., the matrix ``W = L^{-1}`` with ``covmat = L L^T`` such that
+    ``x^T covmat^{-1} x = |W x|^2``.
+    ``covmat`` can also be a stack of covariance matrices of shape (replicas, ndata, ndata)
+    """
+    factor = np.linalg.cholesky(covmat)
+    if factor.ndim == 2:
+        return solve_triangular(factor, np.eye(factor.shape[-1]), lower=True)
+    return np.stack([whitening_matrix(c) for c in covmat])
+
+
+class LossCholesky(LossInvcovmat):
+    """
+    Loss function such that:
+    L = \\sum_{i} (\\sum_{j} W_{ij} (yt - yp)_{j})^2
+
+    where ``W`` is the inverse of the lower triangular Cholesky factor of the covmat
+    (see :py:func:`whitening_matrix`), which gives the same chi2 as ``LossInvcovmat``
+    without ever inverting the covmat explicitly.
+    The residuals are whitened with a single matrix product
+    and the loss is a sum of squares, so it cannot become negative because of rounding errors.
+
+    The covmat can be given with shape (ndata, ndata), in which case the factor is shared
+    by all replicas, or with shape (replicas, ndata, ndata).
+    The (per-replica) mask is applied to the residuals, so it does not need a copy of the factor.
+
+    Example
+    -------
+    >>> import numpy as np
+    >>> from n3fit.layers import losses
+    >>> C = np.random.rand(5,5)
+    >>> data = np.random.rand(1, 1, 5)
+    >>> pred = np.random.rand(1, 1, 5)
+    >>> loss_f = losses.LossCholesky(C @ C.T, data)
+    >>> loss_f(pred).shape == 1
+    True
+    """
+
+    _kernel_name = "whitening"
+
+    def __init__(self, covmat, y_true, mask=None, **kwargs):
+        super().__init__(whitening_matrix(covmat), y_true, mask, covmat=covmat, **kwargs)
+
+    def add_covmat(self, covmat):
+        """Add a piece to the covmat, the whitening matrix is recomputed.
+        Note, however, that the _covmat attribute of the layer will
+        still refer to the original data covmat
+        """
+        self.kernel.assign(whitening_matrix(self._covmat + covmat))
+
+    def call(self, y_pred, training=None):
+        y_true, kernel, mask = self._selected_weights(training)
+        obs_diff = op.op_multiply([y_true - y_pred, mask])
+        # The factor of the experimental loss is shared by all replicas
+        if len(kernel.shape) == 2:
+            whitened = op.einsum("ij, brj -> bri", kernel, obs_diff)
+        else:
+            whitened = op.einsum("rij, brj -> bri", kernel, obs_diff)
+        return op.sum(whitened * whitened, axis=[0, 2])
+
+
 class LossLagrange(MetaLayer):
     """
     Abstract loss function to apply lagrange multipliers to a model.
@@ -45,9 +45,10 @@ class Mask(MetaLayer):
             self.masked_output_shape[-2] = self.mask.shape[-2]
         super().build(input_shape)
 
-    def call(self, ret):
+    def call(self, ret, training=None):
         """
         Apply the mask to the input tensor, and multiply by the constant if present.
+        During the training the mask is applied only to the replicas in the ``replica_selection``.
 
         Parameters
         ----------
@@ -58,7 +59,12 @@ class Mask(MetaLayer):
             Tensor of shape (batch_size, n_replicas, n_features)
         """
         if self.mask is not None:
-            ret = op.boolean_mask(ret, self.mask, axis=1, target_shape=self.masked_output_shape)
+            mask = self.select_replicas(self.mask, training, axis=0)
+            target_shape = self.masked_output_shape
+            if mask is not self.mask:
+                # The number of replicas selected is only known when the layer is called
+                target_shape = [op.shape(ret)[0], -1, self.last_dim]
+            ret = op.boolean_mask(ret, mask, axis=1, target_shape=target_shape)
         if self.c is not None:
             ret = ret * self.kernel
         return ret
@@ -73,7 +73,10 @@ class Observable(MetaLayer, ABC):
         fktable_data: list[validphys.coredata.FKTableData]
             list of FK which define basis and xgrid for the fktables in the list
         fktable_arr: list
-            list of fktables for this observable
+            list of fktables for this observable, they are only converted to tensors
+            when the layer is built. If they are all memory maps (read from the fktable store)
+            the tensors point to the mapped memory and they are contracted in the layout
+            in which they are stored, so that they are never copied
         operation_name: str
             string defining the name of the operation to be applied to the fktables
         nfl: int
@@ -106,7 +109,7 @@ class Observable(MetaLayer, ABC):
         for fkdata, fk in zip(fktable_data, fktable_arr):
             xgrids.append(fkdata.xgrid.reshape(1, -1))
             all_bases.append(fkdata.luminosity_mapping)
-            fktables.append(op.numpy_to_tensor(fk))
+            fktables.append(fk)
 
             set_pdf_tmp = []
             for conv_type in fkdata.convolution_types:
@@ -124,6 +127,7 @@ class Observable(MetaLayer, ABC):
                     set_pdf_tmp.append(None)
             self.boundary_pdf.append(set_pdf_tmp)
         self.fktables = fktables
+        self.memory_mapped = all(isinstance(fk, np.memmap) for fk in fktables)
 
         # check how many xgrids this dataset needs
         if is_unique(xgrids):
@@ -134,6 +138,16 @@ class Observable(MetaLayer, ABC):
         self.operation = op.c_to_py_fun(operation_name)
         self.output_dim = self.fktables[0].shape[0]
 
+        # Observables made of one single fktable, with no operation and no boundary condition,
+        # can be computed together with others in a ``StackedObservable``
+        # (unless the fktable is memory-mapped, since stacking copies it)
+        self.stackable = (
+            not self.memory_mapped
+            and operation_name == "NULL"
+            and len(self.fktables) == 1
+            and all(bc is None for bc in self.boundary_pdf[0])
+        )
+
         if is_unique(all_bases) and is_unique(xgrids):
             self.all_masks = [self.gen_mask(all_bases[0])]
         else:
@@ -144,14 +158,24 @@ class Observable(MetaLayer, ABC):
     def build(self, input_shape):
         # repeat the masks if necessary for fktables (if not, the extra copies
         # will get lost in the zip)
-        masks = self.masks * len(self.fktables)
-        self.padded_fk_tables = [self.pad_fk(fk, mask) for fk, mask in zip(self.fktables, masks)]
+        if self.memory_mapped:
+            masks = self.all_masks * len(self.fktables)
+            self.padded_fk_tables = [
+                self.map_fk(op.memory_map_to_tensor(fk), mask)
+                for fk, mask in zip(self.fktables, masks)
+            ]
+        else:
+            masks = self.masks * len(self.fktables)
+            self.padded_fk_tables = [
+                self.pad_fk(op.numpy_to_tensor(fk), mask) for fk, mask in zip(self.fktables, masks)
+            ]
 
         super().build(input_shape)
 
-    def call(self, pdf):
+    def call(self, pdf, training=None):
         """
         This function perform the convolution with the fktable and one (DIS) or two (DY-like) pdfs.
+        During the training only the replicas in the ``replica_selection`` are computed.
 
         Parameters
         ----------
@@ -163,6 +187,7 @@ class Observable(MetaLayer, ABC):
             observables: backend tensor
                 rank 3 tensor (batchsize, replicas, ndata)
         """
+        pdf = self.select_replicas(pdf, training)
         if self.splitting:
             pdfs = op.split(pdf, self.splitting, axis=2)
         else:
@@ -170,7 +195,10 @@ class Observable(MetaLayer, ABC):
 
         observables = []
         for idx, (pdf, padded_fk) in enumerate(zip(pdfs, self.padded_fk_tables)):
-            pdf_to_convolute = [pdf if p is None else p for p in self.boundary_pdf[idx]]
+            pdf_to_convolute = [
+                pdf if p is None else self.select_replicas(p, training)
+                for p in self.boundary_pdf[idx]
+            ]
             observable = self.compute_observable(pdf_to_convolute, padded_fk)
             observables.append(observable)
 
@@ -186,11 +214,73 @@ class Observable(MetaLayer, ABC):
     def pad_fk(self, fk, mask):
         pass
 
+    @abstractmethod
+    def map_fk(self, fk, bool_mask):
+        pass
+
+    @abstractmethod
+    def stack_fk(self, fks, masks):
+        pass
+
+    def stacking_key(self):
+        """Observables can only be stacked together if they share the same stacking key"""
+        return ()
+
     def is_pos_polarized(self):
         """Check if the given Positivity dataset contains Polarized FK tables by checking name."""
         return self.dataname.startswith("NNPDF_POS_") and self.dataname.endswith("-POLARIZED")
 
 
+class StackedObservable(MetaLayer):
+    """
+    Computes at once the predictions of several observables of the same type (DIS or DY)
+    which take the PDF in the same xgrid.
+
+    The fktables of all observables are stacked along the data axis into one single operator
+    such that one single contraction with the PDF is performed,
+    the result is then split back into the predictions for each of the observables.
+
+    Parameters
+    ----------
+        observables: list[Observable]
+            list of observable layers, all of the same type, with ``stackable == True``
+            and the same ``stacking_key``
+    """
+
+    def __init__(self, observables, **kwargs):
+        super(MetaLayer, self).__init__(**kwargs)
+        if not all(obs.stackable for obs in observables):
+            raise ValueError("Only observables made of one single fktable can be stacked")
+        if len({(type(obs), obs.stacking_key()) for obs in observables}) != 1:
+            raise ValueError("Only observables of the same type and stacking key can be stacked")
+        self.observables = observables
+        self.splitting = [obs.output_dim for obs in observables]
+        self.compute_observable = None
+        self.stacked_fk = None
+
+    def build(self, input_shape):
+        fks = [op.numpy_to_tensor(obs.fktables[0]) for obs in self.observables]
+        masks = [obs.masks[0] for obs in self.observables]
+        self.stacked_fk, self.compute_observable = self.observables[0].stack_fk(fks, masks)
+        super().build(input_shape)
+
+    def call(self, pdf, training=None):
+        """
+        Parameters
+        ----------
+            pdf:  backend tensor
+                rank 4 tensor (batch_size, replicas, xgrid, flavours)
+
+        Returns
+        -------
+            observables: list(backend tensor)
+                list of rank 3 tensors (batchsize, replicas, ndata), one per observable
+        """
+        pdf = self.select_replicas(pdf, training)
+        observables = self.compute_observable([pdf, pdf], self.stacked_fk)
+        return op.split(observables, self.splitting, axis=-1)
+
+
 def compute_float_mask(bool_mask):
     """
     Compute a float form of the given boolean mask, that can be contracted over the full flavor
@@ -70,8 +70,16 @@ class ObservableWrapper:
 
     def _generate_loss(self, mask=None):
         """Generates the corresponding loss function depending on the values the wrapper
-        was initialized with"""
-        if self.invcovmat is not None:
+        was initialized with.
+        If the wrapper is given a ``covmat`` but no ``invcovmat``, the chi2 is computed
+        from the Cholesky factor of the covmat."""
+        if self.invcovmat is None and self.covmat is not None:
+            if self.rotation:
+                covmat_matrix = np.eye(self.covmat.shape[-1]) * self.covmat[..., np.newaxis]
+            else:
+                covmat_matrix = self.covmat
+            loss = losses.LossCholesky(covmat_matrix, self.data, mask, name=self.name)
+        elif self.invcovmat is not None:
             if self.rotation:
                 # If we have a matrix diagonal only, padd with 0s and hope it's not too heavy on memory
                 invcovmat_matrix = (
@@ -93,11 +101,17 @@ class ObservableWrapper:
             loss = losses.LossIntegrability(name=self.name, c=self.multiplier)
         return loss
 
-    def _generate_experimental_layer(self, pdf):
+    def _generate_experimental_layer(self, pdf, predictions=None):
         """Generate the experimental layer by feeding to each observable its PDF.
         In the most general case, each observable might need a PDF evaluated on a different xgrid,
         the input PDF is evaluated in all points that the experiment needs and needs to be split
+
+        The observables found in ``predictions`` (a dictionary of observable layers to outputs,
+        see ``StackedObservable``) are not computed again.
         """
+        if predictions is None:
+            predictions = {}
+
         if len(self.dataset_xsizes) > 1:
             splitting_layer = op.as_layer(
                 op.split,
@@ -106,9 +120,12 @@ class ObservableWrapper:
                 name=f"{self.name}_split",
             )
             sp_pdf = splitting_layer(pdf)
-            output_layers = [obs(p) for obs, p in zip(self.observables, sp_pdf)]
         else:
-            output_layers = [obs(pdf) for obs in self.observables]
+            sp_pdf = [pdf] * len(self.observables)
+        output_layers = [
+            predictions[obs] if obs in predictions else obs(p)
+            for obs, p in zip(self.observables, sp_pdf)
+        ]
 
         # Finally concatenate all observables (so that experiments are one single entity)
         ret = op.concatenate(output_layers, axis=-1)
@@ -121,9 +138,9 @@ class ObservableWrapper:
 
         return ret
 
-    def __call__(self, pdf_layer, mask=None):
+    def __call__(self, pdf_layer, mask=None, predictions=None):
         loss_f = self._generate_loss(mask)
-        experiment_prediction = self._generate_experimental_layer(pdf_layer)
+        experiment_prediction = self._generate_experimental_layer(pdf_layer, predictions)
         return loss_f(experiment_prediction)
 
 
@@ -135,6 +152,8 @@ def observable_generator(
     validation_data=None,
     invcovmat_tr=None,
     invcovmat_vl=None,
+    covmat_tr=None,
+    covmat_vl=None,
     positivity_initial=1.0,
     integrability=False,
     n_replicas=1,
@@ -179,6 +198,12 @@ def observable_generator(
             set the positivity lagrange multiplier for epoch 1
         integrability: bool
             switch on/off the integrability constraints
+        covmat_tr: np.ndarray
+            training covmat, used instead of ``invcovmat_tr`` when the chi2 is computed from
+            its Cholesky factor, can be shared by all replicas (ndata, ndata)
+            or be given per replica (replicas, ndata, ndata)
+        covmat_vl: np.ndarray
+            same as ``covmat_tr`` for the validation
 
     Returns
     ------
@@ -286,6 +311,7 @@ def observable_generator(
         tr_mask_layer,
         dataset_xsizes,
         invcovmat=invcovmat_tr,
+        covmat=covmat_tr,
         data=training_data,
         rotation=obsrot,
     )
@@ -295,6 +321,7 @@ def observable_generator(
         vl_mask_layer,
         dataset_xsizes,
         invcovmat=invcovmat_vl,
+        covmat=covmat_vl,
         data=validation_data,
         rotation=obsrot,
     )
@@ -20,8 +20,10 @@ from n3fit.backends import NN_LAYER_ALL_REPLICAS, MetaModel, callbacks, clear_ba
 from n3fit.backends import operations as op
 from n3fit.hyper_optimization.hyper_scan import HYPEROPT_STATUSES
 import n3fit.hyper_optimization.penalties
+from n3fit.hyper_optimization.pruning import HyperPruner
 import n3fit.hyper_optimization.rewards
 from n3fit.hyper_optimization.rewards import HyperLoss
+from n3fit.layers import StackedObservable
 from n3fit.scaler import generate_scaler
 from n3fit.stopping import Stopping
 from n3fit.vpinterface import N3PDF, compute_phi
@@ -44,14 +46,26 @@ PUSH_INTEGRABILITY_EACH = 100
 InputInfo = namedtuple("InputInfo", ["input", "split", "idx"])
 
 
-def _pdf_injection(pdf_layers, observables, masks):
+def _pdf_injection(pdf_layers, observables, masks, predictions=None):
     """
     Takes as input a list of PDF layers each corresponding to one observable (also given as a list)
     And (where neded) a mask to select the output.
     Returns a list of obs(pdf).
     Note that the list of masks don't need to be the same size as the list of layers/observables
+    Predictions already computed for some of the observables can be given in ``predictions``
     """
-    return [f(x, mask=m) for f, x, m in zip_longest(observables, pdf_layers, masks)]
+    return [
+        f(x, mask=m, predictions=predictions)
+        for f, x, m in zip_longest(observables, pdf_layers, masks)
+    ]
+
+
+def _select_replicas(values, replicas=None):
+    """Select the per-replica ``values`` of the given ``replicas`` (a slice),
+    all of them if ``replicas`` is None"""
+    if replicas is None:
+        return values
+    return values[replicas]
 
 
 def _LM_initial_and_multiplier(input_initial, input_multiplier, max_lambda, steps):
@@ -174,6 +188,8 @@ class ModelTrainer:
         if kfold_parameters is None:
             self.kpartitions = [None]
             self.hyper_threshold = None
+            self._pruner = None
+            self._concurrent_folds = False
         else:
             self.kpartitions = kfold_parameters["partitions"]
             self.hyper_threshold = kfold_parameters.get("threshold", HYPER_THRESHOLD)
@@ -194,6 +210,14 @@ class ModelTrainer:
                 fold_statistic=fold_statistic,
                 penalties_in_loss=kfold_parameters.get("penalties_in_loss", False),
             )
+            # Early termination of the trials which are not promising
+            pruning = kfold_parameters.get("pruning")
+            self._pruner = None if pruning is None else HyperPruner(**pruning)
+            # Train all folds at once as copies of the replicas of a single model
+            self._concurrent_folds = kfold_parameters.get("concurrent_folds", False)
+            if self._concurrent_folds and lux_params:
+                log.warning("The folds of QED fits cannot be trained concurrently")
+                self._concurrent_folds = False
 
         # Initialize the dictionaries which contain all fitting information
         self.input_list = []
@@ -247,6 +271,13 @@ class ModelTrainer:
             self.print_summary = True
             self.mode_hyperopt = False
 
+    def register_hyperopt_result(self, result):
+        """Add to the history of the pruner of the trials (if any) the reports of
+        a trial evaluated in a different process or in a previous run,
+        given the ``result`` dictionary returned by ``hyperparametrizable``"""
+        if self._pruner is not None:
+            self._pruner.add_reports(result.get("kfold_meta", {}).get("pruning_reports", []))
+
     ###########################################################################
     # # Internal functions                                                    #
     # Never to be called from the dark and cold outside world                 #
@@ -362,7 +393,56 @@ class ModelTrainer:
 
         return InputInfo(input_layer, sp_layer, inputs_idx)
 
-    def _model_generation(self, xinput, pdf_model, partition, partition_idx):
+    def _stacked_predictions(self, split_pdf_unique, inputs_idx):
+        """
+        Computes together the predictions of all observables of the same type (DIS or DY)
+        that take the PDF in the same xgrid, see ``n3fit.layers.StackedObservable``.
+
+        Only the experiments (or positivity and integrability sets) for which all datasets
+        share one xgrid are considered, and only the datasets made of one single fktable.
+        Observables with different ``stacking_key`` (e.g., DY observables with different
+        active flavours) are computed in separate groups.
+
+        Parameters
+        ----------
+            split_pdf_unique: list
+                the PDF evaluated in each of the unique xgrids
+            inputs_idx: list(int)
+                index of the unique xgrid for each of the entries of ``self.training["output"]``
+
+        Returns
+        -------
+            predictions: dict
+                the output (of shape (1, replicas, ndata)) for each of the stacked observables
+        """
+        groups = {}
+        for grid_idx, obs_wrapper in zip(inputs_idx, self.training["output"]):
+            if len(obs_wrapper.dataset_xsizes) > 1:
+                continue
+            for obs in obs_wrapper.observables:
+                if obs.stackable:
+                    key = (type(obs).__name__, grid_idx, obs.stacking_key())
+                    groups.setdefault(key, []).append(obs)
+
+        predictions = {}
+        for i, ((obs_type, grid_idx, _), observables) in enumerate(groups.items()):
+            if len(observables) < 2:
+                continue
+            log.info("Stacking %d %s observables on xgrid %d", len(observables), obs_type, grid_idx)
+            stacked = StackedObservable(observables, name=f"stacked_{obs_type}_{i}")
+            outputs = stacked(split_pdf_unique[grid_idx])
+            predictions.update(zip(observables, outputs))
+        return predictions
+
+    def _model_generation(
+        self,
+        xinput,
+        pdf_model,
+        partition,
+        partition_idx,
+        stack_observables=False,
+        stacked_folds=False,
+    ):
         """
         Fills the three dictionaries (``training``, ``validation``, ``experimental``)
         with the ``model`` entry
@@ -399,6 +479,13 @@ class ModelTrainer:
                 Only active during k-folding, information about the partition to be fitted
             partition_idx: int
                 Index of the partition
+            stack_observables: bool
+                whether to compute the observables sharing an xgrid with one single contraction
+                per type of observable, see ``_stacked_predictions``
+            stacked_folds: bool
+                whether the replicas of ``pdf_model`` are copies for all folds trained at once,
+                ``partition`` is then ignored and the masks of all folds are used instead,
+                see ``_stacked_fold_masks``
 
         Returns
         -------
@@ -416,9 +503,17 @@ class ModelTrainer:
 
         # Now reorganize the uniques PDF so that each experiment receives its corresponding PDF
         split_pdf = [split_pdf_unique[i] for i in xinput.idx]
+
+        # The predictions of the stacked observables are shared by all models
+        predictions = None
+        if stack_observables:
+            predictions = self._stacked_predictions(split_pdf_unique, xinput.idx)
+
         # If we are in a kfolding partition, select which datasets are out
         training_mask = validation_mask = experimental_mask = [None]
-        if partition and partition["datasets"]:
+        if stacked_folds:
+            training_mask, validation_mask, experimental_mask = self._stacked_fold_masks()
+        elif partition and partition["datasets"]:
             # If we want to overfit the fold, leave the training and validation masks as [None]
             # otherwise, use the mask generated for the fold.
             # The experimental model instead is always limited to the fold
@@ -429,7 +524,7 @@ class ModelTrainer:
 
         # Training and validation leave out the kofld dataset
         # experiment leaves out the negation
-        output_tr = _pdf_injection(split_pdf, self.training["output"], training_mask)
+        output_tr = _pdf_injection(split_pdf, self.training["output"], training_mask, predictions)
         training = MetaModel(full_model_input_dict, output_tr)
 
         # Validation skips integrability and the "true" chi2 skips also positivity,
@@ -444,11 +539,15 @@ class ModelTrainer:
                 val_pdfs.append(partial_pdf)
 
         # We don't want to included the integrablity in the validation
-        output_vl = _pdf_injection(val_pdfs, self.validation["output"], validation_mask)
+        output_vl = _pdf_injection(
+            val_pdfs, self.validation["output"], validation_mask, predictions
+        )
         validation = MetaModel(full_model_input_dict, output_vl)
 
         # Or the positivity in the total chi2
-        output_ex = _pdf_injection(exp_pdfs, self.experimental["output"], experimental_mask)
+        output_ex = _pdf_injection(
+            exp_pdfs, self.experimental["output"], experimental_mask, predictions
+        )
         experimental = MetaModel(full_model_input_dict, output_ex)
 
         if self.print_summary:
@@ -468,6 +567,38 @@ class ModelTrainer:
 
         return models
 
+    def _stacked_fold_masks(self):
+        """
+        Masks for the training, validation and experimental models when all folds are trained
+        at once, with the replicas of the fold ``k`` being the ``k``-th copy of the
+        ``len(self.replicas)`` replicas.
+        The masks are the same used for each of the folds when they are trained separately
+        (see ``_model_generation``) stacked along the replica axis.
+
+        Returns
+        -------
+            tuple
+                lists with one array of shape (folds*replicas, ndata) per experiment
+                for the training, validation and experimental models
+        """
+        n_replicas = len(self.replicas)
+        stacked_masks = []
+        for info in [self.training, self.validation, self.experimental]:
+            masks = []
+            for fold_masks in info["folds"]:
+                replica_masks = []
+                for mask, partition in zip(fold_masks, self.kpartitions):
+                    # Folds with all the data and folds which are overfitted
+                    # (only for the training and validation) don't mask anything
+                    if not partition["datasets"] or (
+                        partition.get("overfit", False) and info is not self.experimental
+                    ):
+                        mask = np.ones_like(mask)
+                    replica_masks += [mask] * n_replicas
+                masks.append(np.stack(replica_masks))
+            stacked_masks.append(masks)
+        return tuple(stacked_masks)
+
     def _reset_observables(self):
         """
         Resets the 'output' and 'losses' entries of all 3 dictionaries:
@@ -500,6 +631,7 @@ class ModelTrainer:
         all_integ_initial,
         epochs,
         interpolation_points,
+        replica_copies=1,
     ):
         """
         This functions fills the 3 dictionaries (training, validation, experimental)
@@ -517,19 +649,27 @@ class ModelTrainer:
                 initial value for the positivity lambda
             epochs: int
                 total number of epochs for the run
+            replica_copies: int
+                number of copies of the replicas to be fitted at once (one per fold when
+                the folds are trained concurrently), the data of every replica is repeated
         """
+        exp_info = self.exp_info * replica_copies
+        n_replicas = len(exp_info)
 
         # First reset the dictionaries
         self._reset_observables()
         log.info("Generating layers")
 
         # We need to transpose Experimental data, stacking over replicas
+        # Note that either the inverse covmats or the covmats (for the Cholesky loss) are None
         experiment_data = {
             "trmask": [],
             "expdata": [],
             "expdata_vl": [],
             "invcovmat": [],
             "invcovmat_vl": [],
+            "covmat_tr": [],
+            "covmat_vl": [],
         }
 
         # Loop over datasets
@@ -538,14 +678,21 @@ class ModelTrainer:
             for key, value in experiment_data.items():
                 replica_data = []
                 # Loop over replicas
-                for replica in self.exp_info:
+                for replica in exp_info:
                     if key in ["expdata", "expdata_vl"]:
                         # Save the data with shape (ndata) instead of (1, ndata)
                         replica_data.append(replica[i][key][0])
                     else:
                         replica_data.append(replica[i][key])
-                # Stack
-                value.append(np.stack(replica_data))
+                # Stack, but when all replicas share the same covmat keep one single copy
+                if replica_data[0] is None:
+                    value.append(None)
+                elif key.startswith("covmat") and all(
+                    np.array_equal(replica_data[0], c) for c in replica_data[1:]
+                ):
+                    value.append(replica_data[0])
+                else:
+                    value.append(np.stack(replica_data))
 
         # Now we need to loop over all dictionaries (First exp_info, then pos_info and integ_info)
         for i, exp_dict in enumerate(self.exp_info[0]):
@@ -561,7 +708,9 @@ class ModelTrainer:
                 validation_data=experiment_data["expdata_vl"][i],
                 invcovmat_tr=experiment_data["invcovmat"][i],
                 invcovmat_vl=experiment_data["invcovmat_vl"][i],
-                n_replicas=len(self.replicas),
+                covmat_tr=experiment_data["covmat_tr"][i],
+                covmat_vl=experiment_data["covmat_vl"][i],
+                n_replicas=n_replicas,
             )
 
             # Save the input(s) corresponding to this experiment
@@ -583,9 +732,8 @@ class ModelTrainer:
             pos_initial, pos_multiplier = _LM_initial_and_multiplier(
                 all_pos_initial, all_pos_multiplier, max_lambda, positivity_steps
             )
-            num_experiments = len(self.exp_info)
-            replica_masks = np.stack([pos_dict["trmask"]] * num_experiments)
-            training_data = np.stack([pos_dict["expdata"].flatten()] * num_experiments)
+            replica_masks = np.stack([pos_dict["trmask"]] * n_replicas)
+            training_data = np.stack([pos_dict["expdata"].flatten()] * n_replicas)
 
             pos_layer = model_gen.observable_generator(
                 pos_dict,
@@ -594,7 +742,7 @@ class ModelTrainer:
                 mask_array=replica_masks,
                 training_data=training_data,
                 validation_data=training_data,
-                n_replicas=len(self.replicas),
+                n_replicas=n_replicas,
             )
             # The input list is still common
             self.input_list.append(pos_layer["inputs"])
@@ -623,7 +771,7 @@ class ModelTrainer:
                 self.boundary_condition,
                 positivity_initial=integ_initial,
                 integrability=True,
-                n_replicas=len(self.replicas),
+                n_replicas=n_replicas,
             )
             # The input list is still common
             self.input_list.append(integ_layer["inputs"])
@@ -697,7 +845,7 @@ class ModelTrainer:
             regularizer_args=regularizer_args,
             impose_sumrule=self.impose_sumrule,
             scaler=self._scaler,
-            num_replicas=len(self.replicas),
+            num_replicas=len(seed),
             photons=photons,
         )
         return pdf_model
@@ -723,17 +871,54 @@ class ModelTrainer:
             reporting_list.append(reporting_dict)
         return reporting_list
 
-    def _train_and_fit(self, training_model, stopping_object, epochs=100) -> bool:
+    def _prepare_stacked_reporting(self):
+        """Reporting information (see ``_prepare_reporting``) when all folds are trained at once
+        (see ``_stacked_fold_masks``), the number of points of the experiments is then given
+        per replica, as it depends on the fold"""
+        n_replicas = len(self.replicas)
+        reporting_per_fold = [self._prepare_reporting(p) for p in self.kpartitions]
+        reporting_list = []
+        for fold_dicts in zip(*reporting_per_fold):
+            reporting_dict = dict(fold_dicts[0])
+            if reporting_dict["count_chi2"]:
+                for key in ["ndata", "ndata_vl"]:
+                    reporting_dict[key] = np.repeat([d[key] for d in fold_dicts], n_replicas)
+            reporting_list.append(reporting_dict)
+        return reporting_list
+
+    def _train_and_fit(
+        self,
+        training_model,
+        stopping_object,
+        epochs=100,
+        freeze_stopped_replicas=False,
+        validation_frequency=1,
+        adaptive_validation=False,
+        pruning_callback=None,
+    ) -> bool:
         """
         Trains the NN for the number of epochs given using
         stopping_object as the stopping criteria
 
+        If ``freeze_stopped_replicas`` is True, the replicas that have been stopped
+        are frozen, the ``training_model`` must have been compiled with a ``freezable_pdf_model``.
+
+        The validation chi2 is evaluated every ``validation_frequency`` epochs
+        (and, with ``adaptive_validation``, on the epochs in which a replica could be stopped).
+
+        If a ``pruning_callback`` is given, the training is stopped as well when the trial is pruned.
+
         Every ``PUSH_POSITIVITY_EACH`` epochs the positivity will be multiplied by their
         respective positivity multipliers.
         In the same way, every ``PUSH_INTEGRABILITY_EACH`` epochs the integrability
         will be multiplied by their respective integrability multipliers
         """
-        callback_st = callbacks.StoppingCallback(stopping_object)
+        callback_st = callbacks.StoppingCallback(
+            stopping_object,
+            freeze_stopped_replicas=freeze_stopped_replicas,
+            validation_frequency=validation_frequency,
+            adaptive_validation=adaptive_validation,
+        )
         callback_pos = callbacks.LagrangeCallback(
             self.training["posdatasets"],
             self.training["posmultipliers"],
@@ -745,10 +930,13 @@ class ModelTrainer:
             update_freq=PUSH_INTEGRABILITY_EACH,
         )
 
+        # The pruning must go right after the stopping, which monitors the validation chi2
+        training_callbacks = [callback_st, callback_pos, callback_integ]
+        if pruning_callback is not None:
+            training_callbacks.insert(1, pruning_callback)
+
         training_model.perform_fit(
-            epochs=epochs,
-            verbose=False,
-            callbacks=self.callbacks + [callback_st, callback_pos, callback_integ],
+            epochs=epochs, verbose=False, callbacks=self.callbacks + training_callbacks
         )
 
     def _hyperopt_override(self, params):
@@ -842,6 +1030,17 @@ class ModelTrainer:
 
         return filtered_datagroupspec
 
+    def _fold_seeds(self, k):
+        """Seeds of the replicas of the NN for the fold ``k``"""
+        seeds = self._nn_seeds
+        if k > 0:
+            # generate random integers for each k-fold from the input `nnseeds`
+            # we generate new seeds to avoid the integer overflow that may
+            # occur when doing k*nnseeds
+            rngs = [np.random.default_rng(seed=seed) for seed in seeds]
+            seeds = [generator.integers(1, pow(2, 30)) * k for generator in rngs]
+        return seeds
+
     def hyperparametrizable(self, params):
         """
         Wrapper around all the functions defining the fit.
@@ -855,6 +1054,9 @@ class ModelTrainer:
         Parameters used only here:
             - ``epochs``: maximum number of iterations for the fit to run
             - ``stopping_patience``: patience of the stopper after finding a new minimum
+            - ``freeze_stopped_replicas``: train only the replicas which have not been stopped yet
+            - ``validation_frequency``: each how many epochs the validation chi2 is evaluated
+            - ``adaptive_validation``: evaluate also on the epochs in which a replica could stop
         All other parameters are passed to the corresponding functions
         """
 
@@ -874,6 +1076,16 @@ class ModelTrainer:
         epochs = int(params["epochs"])
         stopping_patience = params["stopping_patience"]
         stopping_epochs = int(epochs * stopping_patience)
+        validation_frequency = int(params.get("validation_frequency", 1))
+        adaptive_validation = params.get("adaptive_validation", False)
+        stack_observables = params.get("stack_observables", False)
+        # Train all folds at once, each with its own copy of the replicas
+        n_folds = len(self.kpartitions)
+        concurrent_folds = self.mode_hyperopt and self._concurrent_folds and n_folds > 1
+        # With one single replica the fit is over as soon as it is stopped, so nothing is frozen
+        freeze_stopped_replicas = params.get("freeze_stopped_replicas", False) and (
+            len(self.replicas) > 1 or concurrent_folds
+        )
 
         # Fill the 3 dictionaries (training, validation, experimental) with the layers and losses
         # when k-folding, these are the same for all folds
@@ -886,6 +1098,7 @@ class ModelTrainer:
             integrability_dict.get("initial"),
             epochs,
             params.get("interpolation_points"),
+            replica_copies=n_folds if concurrent_folds else 1,
         )
         threshold_pos = positivity_dict.get("threshold", 1e-6)
         threshold_chi2 = params.get("threshold_chi2", CHI2_THRESHOLD)
@@ -899,6 +1112,11 @@ class ModelTrainer:
         exp_models = []
         # phi evaluated over training/validation exp data
         trvl_phi_per_fold = []
+        # epochs trained in each fold and whether the trial has been pruned
+        trained_epochs = []
+        pruned = False
+        if self._pruner is not None:
+            self._pruner.start_trial()
 
         # Generate the grid in x, note this is the same for all partitions
         xinput = self._xgrid_generation()
@@ -912,78 +1130,130 @@ class ModelTrainer:
             photons = None
         ### Training loop
         for k, partition in enumerate(self.kpartitions):
-            # Each partition of the kfolding needs to have its own separate model
-            # and the seed needs to be updated accordingly
-            seeds = self._nn_seeds
-            if k > 0:
-                # generate random integers for each k-fold from the input `nnseeds`
-                # we generate new seeds to avoid the integer overflow that may
-                # occur when doing k*nnseeds
-                rngs = [np.random.default_rng(seed=seed) for seed in seeds]
-                seeds = [generator.integers(1, pow(2, 30)) * k for generator in rngs]
-
-            # Generate the pdf model
-            pdf_model = self._generate_pdf(
-                params["nodes_per_layer"],
-                params["activation_per_layer"],
-                params["initializer"],
-                params["layer_type"],
-                params["dropout"],
-                params.get("regularizer", None),  # regularizer optional
-                params.get("regularizer_args", None),
-                seeds,
-                photons,
-            )
-
-            if photons:
-                pdf_model.get_layer("add_photon").register_photon(xinput.input.tensor_content)
-
-            # Model generation joins all the different observable layers
-            # together with pdf model generated above
-            models = self._model_generation(xinput, pdf_model, partition, k)
+            # When the folds are trained concurrently, all of them are trained
+            # in the first iteration (each with its own copy of the replicas)
+            # and the rest of iterations only evaluate the corresponding fold
+            if k == 0 or not concurrent_folds:
+                trained_folds = list(range(n_folds)) if concurrent_folds else [k]
+
+                # Each partition of the kfolding needs to have its own separate model
+                # and the seed needs to be updated accordingly
+                seeds = [seed for fold in trained_folds for seed in self._fold_seeds(fold)]
+
+                # Generate the pdf model
+                pdf_model = self._generate_pdf(
+                    params["nodes_per_layer"],
+                    params["activation_per_layer"],
+                    params["initializer"],
+                    params["layer_type"],
+                    params["dropout"],
+                    params.get("regularizer", None),  # regularizer optional
+                    params.get("regularizer_args", None),
+                    seeds,
+                    photons,
+                )
 
-            # Only after model generation, apply possible weight file
-            # Starting every replica with the same weights
-            if self.model_file:
-                log.info("Applying model file %s", self.model_file)
-                pdf_model.load_identical_replicas(self.model_file)
+                if photons:
+                    pdf_model.get_layer("add_photon").register_photon(xinput.input.tensor_content)
+
+                # Model generation joins all the different observable layers
+                # together with pdf model generated above
+                models = self._model_generation(
+                    xinput,
+                    pdf_model,
+                    partition,
+                    k,
+                    stack_observables,
+                    stacked_folds=concurrent_folds,
+                )
 
-            if k > 0:
-                # Reset the positivity and integrability multipliers
-                pos_and_int = self.training["posdatasets"] + self.training["integdatasets"]
-                initial_values = self.training["posinitials"] + self.training["posinitials"]
-                models["training"].reset_layer_weights_to(pos_and_int, initial_values)
+                # Only after model generation, apply possible weight file
+                # Starting every replica with the same weights
+                if self.model_file:
+                    log.info("Applying model file %s", self.model_file)
+                    pdf_model.load_identical_replicas(self.model_file)
+
+                if k > 0:
+                    # Reset the positivity and integrability multipliers
+                    pos_and_int = self.training["posdatasets"] + self.training["integdatasets"]
+                    initial_values = self.training["posinitials"] + self.training["posinitials"]
+                    models["training"].reset_layer_weights_to(pos_and_int, initial_values)
+
+                # Generate the list containing reporting info necessary for chi2
+                if concurrent_folds:
+                    reporting = self._prepare_stacked_reporting()
+                else:
+                    reporting = self._prepare_reporting(partition)
 
-            # Generate the list containing reporting info necessary for chi2
-            reporting = self._prepare_reporting(partition)
+                if self.no_validation:
+                    # Substitute the validation model with the training model
+                    models["validation"] = models["training"]
+                    validation_model = models["training"]
+                else:
+                    validation_model = models["validation"]
+
+                # Generate the stopping_object
+                # this object holds statistical information about the fit
+                # it is used to perform stopping
+                stopping_object = Stopping(
+                    validation_model,
+                    reporting,
+                    pdf_model,
+                    total_epochs=epochs,
+                    stopping_patience=stopping_epochs,
+                    threshold_positivity=threshold_pos,
+                    threshold_chi2=threshold_chi2,
+                )
 
-            if self.no_validation:
-                # Substitute the validation model with the training model
-                models["validation"] = models["training"]
-                validation_model = models["training"]
-            else:
-                validation_model = models["validation"]
-
-            # Generate the stopping_object this object holds statistical information about the fit
-            # it is used to perform stopping
-            stopping_object = Stopping(
-                validation_model,
-                reporting,
-                pdf_model,
-                total_epochs=epochs,
-                stopping_patience=stopping_epochs,
-                threshold_positivity=threshold_pos,
-                threshold_chi2=threshold_chi2,
-            )
+                # Compile each of the models with the right parameters
+                training_model = models["training"]
+                for model in models.values():
+                    if model is not training_model:
+                        model.compile(**params["optimizer"])
+                # The replicas of the training model can be frozen once they are stopped
+                training_model.compile(
+                    **params["optimizer"],
+                    freezable_pdf_model=pdf_model if freeze_stopped_replicas else None,
+                )
 
-            # Compile each of the models with the right parameters
-            for model in models.values():
-                model.compile(**params["optimizer"])
+                pruning_callback = None
+                if self.mode_hyperopt and self._pruner is not None:
+                    pruning_callback = callbacks.PruningCallback(
+                        self._pruner, stopping_object, folds=trained_folds, epochs=epochs
+                    )
 
-            self._train_and_fit(models["training"], stopping_object, epochs=epochs)
+                self._train_and_fit(
+                    models["training"],
+                    stopping_object,
+                    epochs=epochs,
+                    freeze_stopped_replicas=freeze_stopped_replicas,
+                    validation_frequency=validation_frequency,
+                    adaptive_validation=adaptive_validation,
+                    pruning_callback=pruning_callback,
+                )
+                trained_epochs += [stopping_object.stop_epoch] * len(trained_folds)
+
+                if self.mode_hyperopt:
+                    # Compute the losses and penalties of all the replicas
+                    # which are then selected for each of the folds trained
+                    all_validation_losses = stopping_object.vl_chi2
+                    all_exp_losses = models["experimental"].compute_losses()["loss"]
+                    all_penalties = {
+                        penalty.__name__: penalty(
+                            pdf_model=pdf_model, stopping_object=stopping_object
+                        )
+                        for penalty in self.hyper_penalties
+                    }
+                    replica_models = pdf_model.split_replicas()
 
             if self.mode_hyperopt:
-                validation_loss = stopping_object.vl_chi2
+                # Replicas which have been fitted to this fold
+                fold_replicas = None
+                if concurrent_folds:
+                    n_replicas = len(self.replicas)
+                    fold_replicas = slice(k * n_replicas, (k + 1) * n_replicas)
+
+                validation_loss = _select_replicas(all_validation_losses, fold_replicas)
 
                 # number of active points in this fold
                 # it would be nice to have a ndata_per_fold variable coming in the vp object...
@@ -993,14 +1263,15 @@ class ModelTrainer:
                     ndata = self.experimental["ndata"]
 
                 # Compute experimental loss, over excluded datasets
-                exp_loss_raw = models["experimental"].compute_losses()["loss"]
+                exp_loss_raw = _select_replicas(all_exp_losses, fold_replicas)
                 experimental_loss = exp_loss_raw / ndata
 
-                # Compute penalties per replica
+                # Penalties per replica
                 penalties = {
-                    penalty.__name__: penalty(pdf_model=pdf_model, stopping_object=stopping_object)
-                    for penalty in self.hyper_penalties
+                    name: _select_replicas(penalty, fold_replicas)
+                    for name, penalty in all_penalties.items()
                 }
+                fold_models = _select_replicas(replica_models, fold_replicas)
 
                 # Extracting the necessary data to compute phi
                 # First, create a list of `validphys.core.DataGroupSpec`
@@ -1014,6 +1285,7 @@ class ModelTrainer:
                     pdf_model=pdf_model,
                     experimental_data=experimental_data,
                     fold_idx=k,
+                    replica_models=fold_models,
                 )
 
                 # Create another list of `validphys.core.DataGroupSpec`
@@ -1025,7 +1297,7 @@ class ModelTrainer:
                 ]
                 trvl_data = self._filter_datagroupspec(trvl_exp_names)
                 # evaluate phi on training/validation exp set
-                trvl_phi = compute_phi(N3PDF(pdf_model.split_replicas()), trvl_data)
+                trvl_phi = compute_phi(N3PDF(fold_models), trvl_data)
 
                 # Now save all information from this fold
                 l_hyper.append(hyper_loss)
@@ -1035,12 +1307,16 @@ class ModelTrainer:
                 pdfs_per_fold.append(pdf_model)
                 exp_models.append(models["experimental"])
 
-                if hyper_loss > self.hyper_threshold:
-                    log.info(
-                        "Loss above threshold (%.1f > %.1f), breaking",
-                        hyper_loss,
-                        self.hyper_threshold,
-                    )
+                pruned = pruning_callback is not None and pruning_callback.pruned_fold == k
+                if hyper_loss > self.hyper_threshold or pruned:
+                    if pruned:
+                        log.info("Trial pruned in fold %d, breaking", k + 1)
+                    else:
+                        log.info(
+                            "Loss above threshold (%.1f > %.1f), breaking",
+                            hyper_loss,
+                            self.hyper_threshold,
+                        )
                     # Apply a penalty proportional to the number of folds not computed
                     pen_mul = len(self.kpartitions) - k
                     l_hyper = [i * pen_mul for i in l_hyper]
@@ -1061,6 +1337,8 @@ class ModelTrainer:
             # Compute the loss over all folds for hyperopt
             final_hyper_loss = self._hyper_loss.reduce_over_folds(l_hyper)
 
+            pruning_reports = [] if self._pruner is None else self._pruner.end_trial()
+
             # Hyperopt needs a dictionary with information about the losses
             # it is possible to store arbitrary information in the trial file
             # by adding it to this dictionary
@@ -1079,6 +1357,10 @@ class ModelTrainer:
                         name: np.array(values)
                         for name, values in self._hyper_loss.penalties.items()
                     },
+                    "trained_epochs": trained_epochs,
+                    "max_epochs": epochs * len(self.kpartitions),
+                    "pruned": pruned,
+                    "pruning_reports": pruning_reports,
                 },
             }
             return dict_out
@@ -17,6 +17,7 @@ from reportengine.namespaces import NSList
 from validphys.app import App
 from validphys.config import Config, ConfigError, Environment, EnvironmentError_
 from validphys.core import FitSpec
+from validphys.n3fit_data_utils import FKTABLE_STORE_FOLDER
 
 N3FIT_FIXED_CONFIG = dict(use_cuts='internal', use_t0=True, actions_=[])
 
@@ -188,6 +189,20 @@ class N3FitConfig(Config):
         fitpath = self.environment.output_path
         return FitSpec(fitpath.name, fitpath)
 
+    def produce_fktable_store_path(self, fktable_store: bool = False):
+        """If ``fktable_store`` is set, return the folder where ``vp-setupfit`` has written
+        the fktable tensors so that they can be memory-mapped by the fit.
+        """
+        if not fktable_store:
+            return None
+        store_path = self.environment.output_path / FKTABLE_STORE_FOLDER
+        if not store_path.is_dir():
+            raise ConfigError(
+                f"Could not find the fktable store at {store_path}. "
+                "Did you run vp-setupfit on the runcard?"
+            )
+        return store_path
+
     def parse_fakedata(self, fakedata: bool):
         """Parses the `fakedata` key from the closuretest namespace, if True then
         use generated closure test in fit
@@ -246,6 +261,8 @@ class N3FitConfig(Config):
                     'num_mongo_workers': self.environment.num_mongo_workers,
                 }
             )
+        if hyperopt and self.environment.num_local_workers > 1:
+            hyperscan_config.update({'num_local_workers': self.environment.num_local_workers})
         return HyperScanner(parameters, hyperscan_config)
 
 
@@ -287,6 +304,12 @@ class N3FitApp(App):
             type=check_positive,
             default=1,
         )
+        parser.add_argument(
+            "--num-local-workers",
+            help="Number of hyperopt trials to be run simultaneously in a local pool of processes",
+            type=check_positive,
+            default=1,
+        )
         parser.add_argument("replica", help="MC replica number", type=check_positive)
         parser.add_argument(
             "-r",
@@ -309,6 +332,14 @@ class N3FitApp(App):
                 raise argparse.ArgumentError(
                     None, "The --parallel-hyperopt option requires --hyperopt to be set."
                 )
+            if args["num_local_workers"] > 1:
+                raise argparse.ArgumentError(
+                    None, "The --num-local-workers option requires --hyperopt to be set."
+                )
+        elif args["parallel_hyperopt"] and args["num_local_workers"] > 1:
+            raise argparse.ArgumentError(
+                None, "The --num-local-workers option cannot be used with --parallel-hyperopt."
+            )
 
         if args["output"] is None:
             args["output"] = pathlib.Path(args["config_yml"]).stem
@@ -330,6 +361,7 @@ class N3FitApp(App):
             self.environment.db_port = self.args["db_port"]
             self.environment.db_name = self.args["db_name"]
             self.environment.num_mongo_workers = self.args["num_mongo_workers"]
+            self.environment.num_local_workers = self.args["num_local_workers"]
             super().run()
         except N3FitError as e:
             log.error(f"Error in n3fit:\n{e}")
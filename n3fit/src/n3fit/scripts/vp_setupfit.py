@@ -51,6 +51,7 @@ SETUPFIT_PROVIDERS = [
     'validphys.commondata',
     'validphys.covmats',
     'validphys.filters',
+    'validphys.n3fit_data',
     'validphys.results',
     'validphys.theorycovariance.construction',
 ]
@@ -161,6 +162,10 @@ class SetupFitConfig(Config):
             SETUPFIT_FIXED_CONFIG['actions_'].append('fiatlux check_luxset')
             if file_content.get('fiatlux')["additional_errors"]:
                 SETUPFIT_FIXED_CONFIG['actions_'].append('fiatlux check_additional_errors')
+        if file_content.get('fktable_store'):
+            SETUPFIT_FIXED_CONFIG['actions_'].append(
+                'datacuts::theory::fitting write_fktable_store_action'
+            )
         if file_content.get('positivity_bound') is not None:
             SETUPFIT_FIXED_CONFIG['actions_'].append('positivity_bound check_unpolarized_bc')
         for k, v in SETUPFIT_DEFAULTS.items():
@@ -28,6 +28,7 @@
     be used instead.
 """
 
+from bisect import bisect_right
 import logging
 
 import numpy as np
@@ -59,6 +60,9 @@ def parse_ndata(all_data):
             dictionary of {'exp' : ndata}
         `pos_set`: list of the names of the positivity sets
 
+    The number of points can also be given per replica (as an array),
+    when the replicas are not fitted to the same data (e.g., k-folds trained concurrently).
+
     Note: if there is no validation (total number of val points == 0)
     then vl_ndata will point to tr_ndata
     """
@@ -70,9 +74,9 @@ def parse_ndata(all_data):
         if dictionary.get("count_chi2"):
             tr_ndata = dictionary["ndata"]
             vl_ndata = dictionary["ndata_vl"]
-            if tr_ndata:
+            if np.any(tr_ndata):
                 tr_ndata_dict[exp_name] = tr_ndata
-            if vl_ndata:
+            if np.any(vl_ndata):
                 vl_ndata_dict[exp_name] = vl_ndata
         if dictionary.get("positivity") and not dictionary.get("integrability"):
             pos_set.append(exp_name)
@@ -120,7 +124,9 @@ def parse_losses(history_object, data, suffix="loss"):
     total_loss = 0
     for exp_name, npoints in data.items():
         loss = np.array(hobj[exp_name + f"_{suffix}"])
-        dict_chi2[exp_name] = loss / npoints
+        # With a number of points per replica, some replicas might not see the experiment
+        with np.errstate(divide="ignore", invalid="ignore"):
+            dict_chi2[exp_name] = loss / npoints
         total_points += npoints
         total_loss += loss
 
@@ -248,6 +254,7 @@ class FitState:
 class FitHistory:
     """
     Keeps a list of FitState items holding the full chi2 history of the fit.
+    If the validation is not evaluated at every epoch, only the evaluated epochs are stored.
 
     Parameters
     ----------
@@ -268,24 +275,27 @@ class FitHistory:
         FitState.vl_ndata = vl_ndata
         FitState.vl_suffix = vl_suffix
 
-        # Save a list of status for the entire fit
+        # Save a list of status for the entire fit, and the epochs to which they correspond
         self._history = []
+        self._epochs = []
         self.final_epoch = None
 
     def get_state(self, epoch):
-        """Get the FitState of the system for a given epoch"""
-        try:
-            return self._history[epoch]
-        except IndexError as e:
+        """Get the FitState of the system for a given epoch,
+        i.e., the last state saved at or before ``epoch``"""
+        index = bisect_right(self._epochs, epoch) - 1
+        if index < 0 or epoch > self.final_epoch:
             raise ValueError(
                 f"Tried to get obtain the state for epoch {epoch} when only {len(self._history)} epochs have been saved"
-            ) from e
+            )
+        return self._history[index]
 
     def register(self, epoch, fitstate):
         """Save the current fitstate and the associated epoch
         and set the current epoch as the final one should the fit end now
         """
         self.final_epoch = epoch
+        self._epochs.append(epoch)
         self._history.append(fitstate)
 
 
@@ -354,11 +364,12 @@ class Stopping:
         self.stopping_patience = stopping_patience
         self.total_epochs = total_epochs
 
-        self._stop_epochs = [total_epochs - 1] * self._n_replicas
-        self._best_epochs = [None] * self._n_replicas
-        self.positivity_statuses = [POS_BAD] * self._n_replicas
-        self._best_weights = [None] * self._n_replicas
-        self._best_val_chi2s = [INITIAL_CHI2] * self._n_replicas
+        self._last_epoch = -1
+        self._stop_epochs = np.full(self._n_replicas, total_epochs - 1)
+        self._best_epochs = np.zeros(self._n_replicas, dtype=int)
+        # Replicas with a best epoch, for which a copy of the weights is saved in the pdf model
+        self._has_best_weights = np.zeros(self._n_replicas, dtype=bool)
+        self._best_val_chi2s = np.full(self._n_replicas, INITIAL_CHI2)
 
     @property
     def vl_chi2(self):
@@ -367,20 +378,45 @@ class Stopping:
         fitstate = FitState(None, validation_info)
         return fitstate.vl_chi2
 
+    @property
+    def last_vl_chi2(self):
+        """Validation chi2 per replica of the last epoch in which it was monitored.
+        None if it has not been monitored yet"""
+        final_epoch = self._history.final_epoch
+        if final_epoch is None:
+            return None
+        return np.atleast_1d(self._history.get_state(final_epoch).vl_chi2)
+
     @property
     def e_best_chi2(self):
         """Epoch of the best chi2, if there is no best epoch, return last"""
-        best_or_last_epochs = [
-            best if best is not None else last
-            for best, last in zip(self._best_epochs, self._stop_epochs)
-        ]
-        return best_or_last_epochs
+        best_or_last_epochs = np.where(self._has_best_weights, self._best_epochs, self._stop_epochs)
+        return best_or_last_epochs.tolist()
 
     @property
     def stop_epoch(self):
         """Epoch in which the fit is stopped"""
         return -1 if self._history.final_epoch is None else self._history.final_epoch + 1
 
+    @property
+    def epochs_to_stop(self):
+        """Number of epochs without improvement after which the first of the
+        replicas still being trained would be stopped. None if no replica is counting yet"""
+        counting = (self._counts == 1) & self._dont_stop_me_now
+        if not counting.any():
+            return None
+        return int(np.min(self.stopping_patience + 1 - self._stopping_degrees[counting]))
+
+    @property
+    def active_replicas(self):
+        """Boolean array with the replicas that have not been stopped yet"""
+        return self._dont_stop_me_now.copy()
+
+    @property
+    def positivity_statuses(self):
+        """By definition, if a replica has a best epoch then positivity passed"""
+        return [POS_OK if i else POS_BAD for i in self._has_best_weights]
+
     @property
     def positivity_status(self):
         """Returns POS_PASS if positivity passes or veto if it doesn't
@@ -407,7 +443,8 @@ class Stopping:
 
     def monitor_chi2(self, training_info, epoch, print_stats=False):
         """
-        Function to be called at the end of every epoch.
+        Function to be called at the end of every epoch
+        (or every few epochs, if the validation is not to be evaluated at every epoch).
         Stores the total chi2 of the training set as well as the
         total chi2 of the validation set.
         If the training chi2 is below a certain threshold,
@@ -415,6 +452,10 @@ class Stopping:
         as well as the epoch in which occurred
         If the epoch is a multiple of save_all_each then we also save the per-exp chi2
 
+        The stopping degree of the replicas is increased by the number of epochs
+        since the last call, so the stopping epochs are found within the granularity
+        with which this function is called.
+
         Returns True if the run seems ok and False if a NaN is found
 
         Parameters
@@ -450,32 +491,30 @@ class Stopping:
         #         this means improving vl_chi2 and passing positivity
         # Don't start counting until the chi2 of the validation goes below a certain threshold
         # once we start counting, don't bother anymore
-        passes = self._counts | (fitstate.vl_chi2 < self._threshold_chi2)
+        passes = (self._counts == 1) | (fitstate.vl_chi2 < self._threshold_chi2)
         passes &= fitstate.vl_loss < self._best_val_chi2s
         # And the ones that pass positivity
         passes &= self._positivity(fitstate)
         # Stop replicas that are ok being stopped (because they are finished or otherwise)
         passes &= self._dont_stop_me_now
 
-        self._stopping_degrees += self._counts
-
-        # Step 5. loop over the valid indices to check whether the vl improved
-        for i_replica in np.where(passes)[0]:
-            self._best_epochs[i_replica] = epoch
-            # By definition, if we have a ``best_epoch`` then positivity passed
-            self.positivity_statuses[i_replica] = POS_OK
-
-            self._best_val_chi2s[i_replica] = self._history.get_state(epoch).vl_loss[i_replica]
-            self._best_weights[i_replica] = self._pdf_model.get_replica_weights(i_replica)
+        self._stopping_degrees += self._counts * (epoch - self._last_epoch)
+        self._last_epoch = epoch
 
-            self._stopping_degrees[i_replica] = 0
-            self._counts[i_replica] = 1
+        # Step 5. Save the state of the replicas for which the vl improved
+        # the weights are copied within the pdf model, for all replicas at once
+        if passes.any():
+            self._best_epochs[passes] = epoch
+            self._best_val_chi2s[passes] = fitstate.vl_loss[passes]
+            self._stopping_degrees[passes] = 0
+            self._counts[passes] = 1
+            self._has_best_weights |= passes
+            self._pdf_model.snapshot_replica_weights(passes)
 
-        stop_replicas = self._counts & (self._stopping_degrees > self.stopping_patience)
-        for i_replica in np.where(stop_replicas)[0]:
-            self._stop_epochs[i_replica] = epoch
-            self._counts[i_replica] = 0
-            self._dont_stop_me_now[i_replica] = False
+        stop_replicas = (self._counts == 1) & (self._stopping_degrees > self.stopping_patience)
+        self._stop_epochs[stop_replicas] = epoch
+        self._counts[stop_replicas] = 0
+        self._dont_stop_me_now[stop_replicas] = False
 
         # By using the stopping degree we only stop when none of the replicas are improving anymore
         if min(self._stopping_degrees) > self.stopping_patience:
@@ -490,9 +529,8 @@ class Stopping:
         self._restore_best_weights()
 
     def _restore_best_weights(self):
-        for i_replica, weights in enumerate(self._best_weights):
-            if weights is not None:
-                self._pdf_model.set_replica_weights(weights, i_replica)
+        if self._has_best_weights.any():
+            self._pdf_model.restore_replica_weights(self._has_best_weights)
 
     def print_current_stats(self, epoch, fitstate):
         """
@@ -545,7 +583,11 @@ class Stopping:
         json_dict = {}
 
         for epoch in range(log_each - 1, final_epoch + 1, log_each):
-            fitstate = self._history.get_state(epoch)
+            try:
+                fitstate = self._history.get_state(epoch)
+            except ValueError:
+                # The validation was not yet evaluated at this point
+                continue
             # Get the training and validation losses
             tmp = {"training_loss": fitstate.tr_loss, "validation_loss": fitstate.vl_loss.tolist()}
 
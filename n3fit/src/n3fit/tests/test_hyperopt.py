@@ -2,18 +2,26 @@
     Test hyperoptimization features
 """
 import json
+import os
 import pathlib
 import shutil
 import subprocess as sp
 import tarfile
 import time
 
+import hyperopt
 import numpy as np
 from numpy.testing import assert_approx_equal
+import pandas as pd
 import pytest
 
+from n3fit.hyper_optimization import filetrials
+from n3fit.hyper_optimization.poolfiletrials import PoolFileTrials
+from n3fit.hyper_optimization.pruning import HyperPruner
 from n3fit.hyper_optimization.rewards import HyperLoss
 from n3fit.model_gen import generate_pdf_model
+from validphys import hyperoptplot
+from validphys.hyperoptplot import HyperoptTrial, load_trials
 from validphys.loader import Loader
 
 
@@ -103,6 +111,263 @@ def test_loss_reduce_over_folds():
     assert_approx_equal(loss_std.reduce_over_folds(losses), 0.816496580927726)
 
 
+def test_hyper_pruner():
+    """Check the pruning decisions of the implemented methods at the rungs of each fold"""
+    previous_trials = [
+        [(0, 10, loss), (0, 30, loss / 2), (1, 10, 2 * loss)] for loss in range(1, 7)
+    ]
+
+    median = HyperPruner(method="median", min_epochs=10, reduction_factor=3, min_trials=3)
+    assert median.rungs(100) == [10, 30, 90]
+    median.start_trial()
+    # Not enough trials yet
+    assert not median.report(0, 10, 100.0)
+    for reports in previous_trials:
+        median.add_reports(reports)
+    median.start_trial()
+    assert not median.report(0, 10, 3.0)
+    assert median.report(0, 30, 2.0)
+    # The reports of the trial are added to the history when it ends
+    assert median.end_trial() == [(0, 10, 3.0), (0, 30, 2.0)]
+    median.start_trial()
+    assert median.report(1, 10, np.nan)
+    median.end_trial()
+    assert not median.report(1, 10, 7.0)
+
+    asha = HyperPruner(method="asha", min_epochs=10, reduction_factor=3, min_trials=3)
+    for reports in previous_trials:
+        asha.add_reports(reports)
+    asha.start_trial()
+    # Only the best 7 // 3 = 2 losses survive the rung
+    assert not asha.report(0, 10, 1.5)
+    assert asha.report(0, 10, 2.5)
+
+    with pytest.raises(ValueError):
+        HyperPruner(method="hyperband")
+
+
+def test_file_trials_log(tmp_path, monkeypatch):
+    """Check that ``FileTrials`` appends the finished trials to the trial log, compacts it
+    periodically into ``tries.json`` and that ``load_trials`` reads both files"""
+    monkeypatch.setattr(filetrials, "MIN_COMPACTION_TRIALS", 2)
+    space = {"x": hyperopt.hp.uniform("x", -1.0, 1.0)}
+    stored = []
+
+    def objective(params):
+        json_trials = load_data(tmp_path / "tries.json")
+        stored.append((len(json_trials), len(load_trials(tmp_path / "tries.json"))))
+        return {"loss": params["x"] ** 2, "status": "ok"}
+
+    trials = filetrials.FileTrials(tmp_path, parameters=space)
+    (tmp_path / "tries.json").write_text("[]")
+    hyperopt.fmin(
+        objective,
+        space,
+        algo=hyperopt.tpe.suggest,
+        max_evals=7,
+        trials=trials,
+        rstate=np.random.default_rng(42),
+        show_progressbar=False,
+    )
+    # Every trial sees all the previous ones, the log is compacted after 2 and 4 trials
+    # but not after 6, as it is then smaller than the json file
+    assert [n for _, n in stored] == list(range(7))
+    assert [n for n, _ in stored] == [0, 0, 2, 2, 4, 4, 4]
+    # At the end of the scan everything is in the json file
+    assert not (tmp_path / "tries.jsonl").exists()
+    json_trials = load_data(tmp_path / "tries.json")
+    assert [t["tid"] for t in json_trials] == list(range(7))
+    assert all("x" in t["misc"]["space_vals"] for t in json_trials)
+
+    # Trials in both files are read only once
+    with open(tmp_path / "tries.jsonl", "w") as f:
+        f.writelines(json.dumps(t) + "\n" for t in json_trials[5:])
+        f.write('{"tid": 7, "incomplete')
+    assert load_trials(tmp_path / "tries.json") == json_trials
+
+
+def test_trial_table(tmp_path, monkeypatch):
+    """Check that the trial table gives the same trials as parsing the json files
+    and that only the new trials are parsed when it is read again"""
+    space = {
+        "optimizer": hyperopt.hp.choice("optimizer", ["Adam", "Nadam"]),
+        "epochs": hyperopt.hp.choice("epochs", [100, 200]),
+        "stopping_patience": 0.1,
+        "positivity": {"initial": 1.0},
+        "nodes_per_layer": hyperopt.hp.choice("nodes_per_layer", [[10, 8], [15, 10, 8]]),
+        "activation_per_layer": "tanh",
+        "layer_type": "dense",
+        "initializer": "glorot_normal",
+        "dropout": hyperopt.hp.uniform("dropout", 0.0, 0.2),
+    }
+
+    def objective(params):
+        loss = params["dropout"] + len(params["nodes_per_layer"])
+        kfold_meta = {"hyper_losses": [loss, 2 * loss], "validation_losses": [[loss]]}
+        status = "ok" if params["dropout"] < 0.15 else "fail"
+        return {"loss": loss, "validation_loss": loss, "status": status, "kfold_meta": kfold_meta}
+
+    def run_scan(max_evals, trials):
+        hyperopt.fmin(
+            objective,
+            space,
+            algo=hyperopt.tpe.suggest,
+            max_evals=max_evals,
+            trials=trials,
+            rstate=np.random.default_rng(42),
+            show_progressbar=False,
+        )
+
+    trials = filetrials.FileTrials(tmp_path, parameters=space)
+    run_scan(4, trials)
+    parse_calls = []
+    original_parse_trial = hyperoptplot.parse_trial
+
+    def counting_parse_trial(trial):
+        parse_calls.append(trial["tid"])
+        return original_parse_trial(trial)
+
+    monkeypatch.setattr(hyperoptplot, "parse_trial", counting_parse_trial)
+
+    def check_table():
+        """Compare the trials read through the table with the ones parsed from the files"""
+        ref = []
+        for trial in load_trials(trials._json_file):
+            trial_dict = original_parse_trial(trial)
+            hyperoptplot.evaluate_trial(trial_dict, 0.5, 10.0, "average")
+            trial_dict["iteration"] = trial["tid"]
+            ref.append(trial_dict)
+        res = hyperoptplot.generate_dictionary(tmp_path, "average")
+        pd.testing.assert_frame_equal(pd.DataFrame(res), pd.DataFrame(ref))
+
+    check_table()
+    assert parse_calls == [0, 1, 2, 3]
+    assert (tmp_path / hyperoptplot.TRIAL_TABLE_NAME / "index.json").exists()
+
+    # Reading it again doesn't parse anything
+    check_table()
+    assert parse_calls == [0, 1, 2, 3]
+
+    # New trials in the trial log and, after the compaction, in the json file
+    # the new part of the table is merged with the previous one
+    monkeypatch.setattr(hyperoptplot, "MAX_TABLE_PARTS", 1)
+    run_scan(7, trials)
+    log_lines = [json.dumps(t, default=str) + "\n" for t in trials.trials[4:]]
+    (tmp_path / "tries.jsonl").write_text("".join(log_lines))
+    (tmp_path / "tries.json").write_text(json.dumps(trials.trials[:4], default=str))
+    check_table()
+    assert parse_calls == [0, 1, 2, 3, 4, 5, 6]
+    assert len(list((tmp_path / hyperoptplot.TRIAL_TABLE_NAME).glob("*.npz"))) == 1
+    trials.compact()
+    check_table()
+    assert parse_calls == [0, 1, 2, 3, 4, 5, 6]
+
+    rewards = [HyperoptTrial(t).reward for t in trials.trials]
+    table_trials = hyperoptplot.load_trial_table(trials._json_file)["_trial"]
+    assert [HyperoptTrial(t).reward for t in table_trials] == rewards
+
+
+def test_hyperopt_dataframe_combine(tmp_path):
+    """Check that the trials of several replicas get different ids when they are combined,
+    even if some trials didn't finish, and that only the trial files are read"""
+    space = {
+        "optimizer": hyperopt.hp.choice("optimizer", ["Adam", "Nadam"]),
+        "epochs": 100,
+        "stopping_patience": 0.1,
+        "positivity": {"initial": 1.0},
+        "nodes_per_layer": [10, 8],
+        "activation_per_layer": "tanh",
+        "layer_type": "dense",
+        "initializer": "glorot_normal",
+        "dropout": hyperopt.hp.uniform("dropout", 0.0, 0.2),
+    }
+
+    def objective(params):
+        loss = params["dropout"]
+        kfold_meta = {"hyper_losses": [loss], "validation_losses": [[loss]]}
+        return {"loss": loss, "validation_loss": loss, "status": "ok", "kfold_meta": kfold_meta}
+
+    replica_path = tmp_path / "nnfit" / "replica_1"
+    replica_path.mkdir(parents=True)
+    trials = filetrials.FileTrials(replica_path, parameters=space)
+    hyperopt.fmin(
+        objective,
+        space,
+        algo=hyperopt.tpe.suggest,
+        max_evals=4,
+        trials=trials,
+        rstate=np.random.default_rng(42),
+        show_progressbar=False,
+    )
+    # One of the trials of each replica didn't finish
+    all_trials = json.loads((replica_path / "tries.json").read_text())
+    all_trials[1]["state"] = hyperopt.JOB_STATE_ERROR
+    (replica_path / "tries.json").write_text(json.dumps(all_trials))
+    (replica_path / "tries.json.tmp").write_text("not a trial file")
+    other_path = tmp_path / "nnfit" / "replica_2"
+    other_path.mkdir()
+    shutil.copy(replica_path / "tries.json", other_path / "tries.json")
+
+    args = {
+        "hyperopt_folder": tmp_path,
+        "debug": False,
+        "filter": [],
+        "loss_target": "average",
+        "val_multiplier": 0.5,
+        "threshold": 10.0,
+        "combine": True,
+        "autofilter": [],
+        "include_failures": True,
+    }
+    dataframe, _ = hyperoptplot.hyperopt_dataframe(args)
+    assert len(dataframe) == 6
+    assert dataframe["iteration"].is_unique
+
+
+def test_pool_file_trials(tmp_path):
+    """Check that ``PoolFileTrials`` evaluates every trial in a new process,
+    writes the ``tries.json`` file and can be restarted from its pickle file"""
+    space = {"x": hyperopt.hp.uniform("x", -1.0, 1.0)}
+
+    def objective(params):
+        return {"loss": params["x"] ** 2, "status": "ok", "pid": os.getpid()}
+
+    results = []
+
+    def run_scan(max_evals, restart=False):
+        trials = PoolFileTrials(
+            tmp_path, num_workers=2, parameters=space, result_callback=results.append
+        )
+        trials.rstate = np.random.default_rng(42)
+        if restart:
+            trials.load_history(trials.pkl_file)
+        hyperopt.fmin(
+            objective,
+            space,
+            algo=hyperopt.tpe.suggest,
+            max_evals=max_evals,
+            trials=trials,
+            rstate=trials.rstate,
+            show_progressbar=False,
+            trials_save_file=trials.pkl_file,
+        )
+        return trials
+
+    trials = run_scan(4)
+    assert [t["state"] for t in trials.trials] == [hyperopt.JOB_STATE_DONE] * 4
+    pids = {t["result"]["pid"] for t in trials.trials}
+    assert len(pids) == 4 and os.getpid() not in pids
+    assert sorted(r["pid"] for r in results) == sorted(pids)
+    assert len(load_data(tmp_path / "tries.json")) == 4
+
+    restarted = run_scan(6, restart=True)
+    assert sorted(t["tid"] for t in restarted.trials) == list(range(6))
+    assert [t["misc"]["vals"] for t in restarted.trials[:4]] == [
+        t["misc"]["vals"] for t in trials.trials
+    ]
+    assert len(load_data(tmp_path / "tries.json")) == 6
+
+
 REGRESSION_FOLDER = pathlib.Path(__file__).with_name("regressions")
 QUICKNAME = "quickcard"
 EXE = "n3fit"
@@ -6,6 +6,7 @@
 import dataclasses
 
 import numpy as np
+import pytest
 
 from n3fit.backends import operations as op
 import n3fit.layers as layers
@@ -209,6 +210,90 @@ def test_DY():
         assert np.allclose(result, reference, THRESHOLD)
 
 
+def test_observables_many_replicas():
+    """Check that the multi-replica implementation of the observables (which takes only the active
+    flavours of the PDF) agrees with the single replica implementation"""
+    replicas = 3
+    kwargs = dict(PARAMS, operation_name="ADD")
+    pdf = np.random.rand(1, replicas, XSIZE, FLAVS)
+    # DY tables with less active flavours in either of the PDFs
+    had_tables = []
+    for comb in [[0, 0], [0, 1], [0, 2]], [[0, 0], [1, 0], [2, 0]]:
+        fk = np.random.rand(NDATA, len(comb), XSIZE, XSIZE)
+        fktable = _fake_FKTableData(fk, np.array(comb), np.ones((1, XSIZE)), ("UnpolPDF",) * 2)
+        had_tables.append([fktable, fktable])
+    for fktables in [generate_DIS(2)] + had_tables:
+        fks = [i.fktable for i in fktables]
+        layer_type = layers.DIS if len(fktables[0].convolution_types) == 1 else layers.DY
+        many_replicas = layer_type(fktables, fks, n_replicas=replicas, **kwargs)
+        one_replica = layer_type(fktables, fks, **kwargs)
+        result = op.evaluate(many_replicas(op.numpy_to_tensor(pdf)))
+        for i in range(replicas):
+            reference = op.evaluate(one_replica(op.numpy_to_tensor(pdf[:, i : i + 1])))
+            np.testing.assert_allclose(result[:, i : i + 1], reference, rtol=THRESHOLD)
+
+
+def test_stacked_observables():
+    """Check that the observables computed by a ``StackedObservable`` agree with the
+    observables computed separately"""
+    for replicas in [1, 3]:
+        pdf = op.numpy_to_tensor(np.random.rand(1, replicas, XSIZE, FLAVS))
+        # DIS observables with their own set of active flavours
+        # and DY observables with the same luminosity channels
+        had_fktables = generate_had(3)
+        for fktable in had_fktables[1:]:
+            fktable.luminosity_mapping = had_fktables[0].luminosity_mapping
+        for fktables in [generate_DIS(3), had_fktables]:
+            observables = []
+            for fktable in fktables:
+                layer_type = layers.DIS if len(fktable.convolution_types) == 1 else layers.DY
+                obs = layer_type([fktable], [fktable.fktable], n_replicas=replicas, **PARAMS)
+                assert obs.stackable
+                observables.append(obs)
+            stacked = layers.StackedObservable(observables)
+            results = stacked(pdf)
+            assert len(results) == len(observables)
+            for obs, result in zip(observables, results):
+                reference = op.evaluate(obs(pdf))
+                np.testing.assert_allclose(op.evaluate(result), reference, rtol=THRESHOLD)
+
+    # Observables with operations cannot be stacked
+    fktables = generate_DIS(2)
+    obs = layers.DIS(fktables, [i.fktable for i in fktables], **dict(PARAMS, operation_name="ADD"))
+    assert not obs.stackable
+
+    # Nor DY observables with different luminosity channels
+    fk = np.random.rand(NDATA, 1, XSIZE, XSIZE)
+    observables = []
+    for comb in [0, 0], [0, 1]:
+        fktable = _fake_FKTableData(fk, np.array(comb), np.ones((1, XSIZE)), ("UnpolPDF",) * 2)
+        observables.append(layers.DY([fktable], [fk], **PARAMS))
+    with pytest.raises(ValueError):
+        layers.StackedObservable(observables)
+
+
+def test_memory_mapped_observables(tmp_path):
+    """Check that the observables computed directly from memory-mapped fktables (as read from
+    the fktable store) agree with the ones computed from the padded fktables"""
+    kwargs = dict(PARAMS, operation_name="ADD")
+    for replicas in [1, 3]:
+        pdf = op.numpy_to_tensor(np.random.rand(1, replicas, XSIZE, FLAVS))
+        for fktables in [generate_DIS(2), generate_had(2)]:
+            mapped_fks = []
+            for i, fktable in enumerate(fktables):
+                path = tmp_path / f"fktable_{i}.npy"
+                np.save(path, fktable.fktable.astype(np.float32))
+                mapped_fks.append(np.load(path, mmap_mode="c"))
+            layer_type = layers.DIS if len(fktables[0].convolution_types) == 1 else layers.DY
+            mapped = layer_type(fktables, mapped_fks, n_replicas=replicas, **kwargs)
+            padded = layer_type(fktables, mapped_fks, n_replicas=replicas, **kwargs)
+            padded.memory_mapped = False
+            assert mapped.memory_mapped and not mapped.stackable
+            np.testing.assert_allclose(
+                op.evaluate(mapped(pdf)), op.evaluate(padded(pdf)), rtol=THRESHOLD
+            )
+
+
 def test_rotation_flavour():
     # Input dictionary to build the rotation matrix using vp2 functions
     flav_info = [
@@ -20,6 +20,37 @@ def test_l_invcovmat():
     reference = np.dot(y, tmp)
     are_equal(result, reference, threshold=1e-4)
 
+    # Several replicas, each with its own mask (as when the folds are trained concurrently)
+    nrep = 3
+    masks = np.random.rand(nrep, DIM) > 0.3
+    preds = np.random.rand(1, nrep, DIM)
+    loss_f = losses.LossInvcovmat(INVCOVMAT, ARR1, mask=masks)
+    ys = (ARR1 - preds[0]) * masks
+    reference = np.einsum("ri, ij, rj -> r", ys, INVCOVMAT, ys)
+    are_equal(loss_f(preds), reference, threshold=1e-4)
+
+
+def test_l_cholesky():
+    covmat = C @ C.T + np.eye(DIM)
+    invcovmat = np.linalg.inv(covmat)
+    loss_f = losses.LossCholesky(covmat, ARR1)
+    result = loss_f(np.expand_dims(ARR2, [0, 1]))
+    y = ARR1 - ARR2
+    are_equal(result, y @ invcovmat @ y, threshold=1e-4)
+
+    # Several replicas sharing the same covmat, with a mask applied to the residuals
+    nrep = 3
+    mask = np.random.rand(DIM) > 0.3
+    preds = np.random.rand(1, nrep, DIM)
+    loss_f = losses.LossCholesky(covmat, ARR1, mask=mask)
+    ys = (ARR1 - preds[0]) * mask
+    reference = np.einsum("ri, ij, rj -> r", ys, invcovmat, ys)
+    are_equal(loss_f(preds), reference, threshold=1e-4)
+
+    # And with one covmat per replica
+    loss_f = losses.LossCholesky(np.stack([covmat * (i + 1) for i in range(nrep)]), ARR1, mask)
+    are_equal(loss_f(preds), reference / np.arange(1, nrep + 1), threshold=1e-4)
+
 
 def test_l_positivity():
     alpha = 1e-7
@@ -1,5 +1,10 @@
+from dataclasses import dataclass, field
+
 import numpy as np
+import pytest
 
+from n3fit.backends import Input, MetaModel
+from n3fit.layers import DIS, Mask, losses
 from n3fit.model_gen import generate_pdf_model
 
 
@@ -36,3 +41,101 @@ def test_replica_split():
     output_split_stacked = np.stack(output_split, axis=replica_axis)
 
     np.testing.assert_allclose(output_full, output_split_stacked, rtol=1e-5)
+
+
+@dataclass
+class _fake_FKTableData:
+    """Fake validphys.coredata.FKTableData for a DIS observable"""
+
+    xgrid: np.ndarray
+    luminosity_mapping: np.ndarray = field(default_factory=lambda: np.array([1, 2, 3, 9]))
+    convolution_types: tuple = ("UnpolPDF",)
+
+
+def test_replica_mask():
+    """Check that the frozen replicas are not computed in the training step
+    while they are still computed outside of the training"""
+    num_replicas, ndata, xsize = 3, 6, 5
+    fake_fl = [
+        {"fl": i, "largex": [0.5, 1.5], "smallx": [1.5, 2.5]}
+        for i in ["u", "ubar", "d", "dbar", "c", "g", "s", "sbar"]
+    ]
+    pdf_model = generate_pdf_model(
+        nodes=[8, 8],
+        activations=["tanh", "linear"],
+        seed=[1, 2, 3],
+        flav_info=fake_fl,
+        fitbasis="FLAVOUR",
+        num_replicas=num_replicas,
+        impose_sumrule=False,
+    )
+    rng = np.random.default_rng(seed=3)
+    xgrid = np.linspace(0.1, 0.9, xsize)
+    fktable = rng.random((ndata, 4, xsize))
+    observable = DIS([_fake_FKTableData(xgrid)], [fktable], "dis", n_replicas=num_replicas)
+    # A different training mask for each replica, with the same number of points
+    trmask = np.stack([np.roll(np.arange(ndata) < 4, i) for i in range(num_replicas)])
+    data = rng.random((1, num_replicas, 4))
+    invcovmat = np.stack([np.eye(4) * (i + 1) for i in range(num_replicas)])
+
+    x = Input(shape=(xsize, 1), batch_size=1)
+    predictions = Mask(trmask)(observable(pdf_model({"pdf_input": x})))
+    loss = losses.LossInvcovmat(invcovmat, data)(predictions)
+    model = MetaModel({"x": x}, loss, input_values={"x": xgrid.reshape(1, xsize, 1)})
+    model.compile(optimizer_name="SGD", learning_rate=1e-4, freezable_pdf_model=pdf_model)
+
+    def replica_weights(i_replica):
+        weights = pdf_model.get_replica_weights(i_replica)
+        return [w.numpy() for layer_weights in weights.values() for w in layer_weights]
+
+    replica_mask = np.array([True, False, True])
+    model.set_replica_mask(replica_mask)
+    initial_losses = model.compute_losses()["loss"]
+    initial = [replica_weights(i) for i in range(num_replicas)]
+    history = model.perform_fit(epochs=1, verbose=False)
+    final = [replica_weights(i) for i in range(num_replicas)]
+
+    # The loss of the training step includes only the active replicas
+    np.testing.assert_allclose(history["loss"][0], initial_losses[replica_mask].sum(), rtol=1e-5)
+    # but all the replicas are still computed outside of the training
+    assert model.compute_losses()["loss"].shape == (num_replicas,)
+    for w_initial, w_final in zip(initial[1], final[1]):
+        np.testing.assert_allclose(w_initial, w_final, rtol=1e-6)
+    for i in [0, 2]:
+        assert not all(np.allclose(a, b) for a, b in zip(initial[i], final[i]))
+
+
+@pytest.mark.parametrize("layer_type", ["multidense", "dense"])
+def test_replica_weights_snapshot(layer_type):
+    """Check that the weights saved in the snapshot are restored only for the selected replicas"""
+    fake_fl = [
+        {"fl": i, "largex": [0.5, 1.5], "smallx": [1.5, 2.5]}
+        for i in ["u", "ubar", "d", "dbar", "c", "g", "s", "sbar"]
+    ]
+    pdf_model = generate_pdf_model(
+        nodes=[8, 8],
+        activations=["tanh", "linear"],
+        layer_type=layer_type,
+        seed=[3, 4, 5],
+        flav_info=fake_fl,
+        fitbasis="FLAVOUR",
+        num_replicas=3,
+    )
+
+    def replica_weights(i_replica):
+        weights = pdf_model.get_replica_weights(i_replica)
+        return [w.numpy() for layer_weights in weights.values() for w in layer_weights]
+
+    initial = [replica_weights(i) for i in range(3)]
+    pdf_model.snapshot_replica_weights([True, True, False])
+    for w in pdf_model.trainable_weights:
+        w.assign(w + 1.0)
+    pdf_model.snapshot_replica_weights([False, True, False])
+    modified = [replica_weights(i) for i in range(3)]
+
+    pdf_model.restore_replica_weights([True, True, True])
+    for final, expected in zip(
+        [replica_weights(i) for i in range(3)], [initial[0], modified[1], initial[2]]
+    ):
+        for w_final, w_expected in zip(final, expected):
+            np.testing.assert_allclose(w_final, w_expected)
@@ -0,0 +1,74 @@
+"""
+Test the stopping algorithm with a validation chi2 evaluated at different frequencies
+"""
+
+from types import SimpleNamespace
+
+import numpy as np
+
+from n3fit.backends.keras_backend.callbacks import StoppingCallback
+from n3fit.stopping import Stopping
+
+PATIENCE = 10
+# Epochs at which the validation loss of each replica stops improving
+LAST_IMPROVEMENT = np.array([20, 40])
+
+
+class FakeValidation:
+    """Validation model whose loss decreases until ``LAST_IMPROVEMENT`` and is flat afterwards"""
+
+    def __init__(self):
+        self.epoch = 0
+        self.calls = 0
+
+    def compute_losses(self):
+        self.calls += 1
+        loss = 1.0 / (1.0 + np.minimum(self.epoch, LAST_IMPROVEMENT))
+        return {"loss": loss, "exp_val_loss": loss}
+
+
+def run_stopping(validation_frequency, adaptive_validation=False, epochs=200):
+    validation = FakeValidation()
+    pdf_model = SimpleNamespace(
+        num_replicas=2,
+        snapshot_replica_weights=lambda mask: None,
+        restore_replica_weights=lambda mask: None,
+    )
+    all_data = [{"name": "exp", "count_chi2": True, "ndata": 1, "ndata_vl": 1}]
+    stopping = Stopping(
+        validation, all_data, pdf_model, total_epochs=epochs, stopping_patience=PATIENCE
+    )
+    callback = StoppingCallback(
+        stopping, validation_frequency=validation_frequency, adaptive_validation=adaptive_validation
+    )
+    model = SimpleNamespace(stop_training=False)
+    callback.set_model(model)
+    for epoch in range(epochs):
+        validation.epoch = epoch
+        callback.on_step_end(epoch, {"loss": 1.0})
+        if model.stop_training:
+            break
+    callback.on_train_end()
+    return stopping, validation.calls
+
+
+def test_validation_frequency():
+    stopping, calls = run_stopping(1)
+    np.testing.assert_equal(stopping.e_best_chi2, LAST_IMPROVEMENT)
+    assert stopping.stop_epoch == LAST_IMPROVEMENT[-1] + PATIENCE + 2
+    assert calls == stopping.stop_epoch
+
+    frequency = 7
+    sparse_stopping, sparse_calls = run_stopping(frequency)
+    best_epochs = np.array(sparse_stopping.e_best_chi2)
+    assert np.all(np.abs(best_epochs - LAST_IMPROVEMENT) < frequency)
+    assert np.all((best_epochs + 1) % frequency == 0)
+    assert sparse_calls < calls / (frequency - 1)
+    # The history is available at all epochs for the logs
+    assert len(sparse_stopping.chi2exps_json(log_each=10)) == sparse_stopping.stop_epoch // 10
+
+    # With adaptive validation the fit stops as soon as the patience is exhausted
+    adaptive_stopping, adaptive_calls = run_stopping(frequency, adaptive_validation=True)
+    np.testing.assert_equal(adaptive_stopping.e_best_chi2, best_epochs)
+    assert adaptive_stopping.stop_epoch == best_epochs[-1] + PATIENCE + 2
+    assert adaptive_calls < calls / 2
@@ -0,0 +1 @@
+__version__ = "0.0.0.post1.dev0+a81f237.dirty"
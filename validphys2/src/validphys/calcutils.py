@@ -12,6 +12,8 @@ import numpy as np
 import pandas as pd
 import scipy.linalg as la
 
+from validphys.covmats_utils import BlockLowRankCovmat, DiagonalLowRankCovmat
+
 log = logging.getLogger(__name__)
 
 
@@ -24,6 +26,9 @@ def calc_chi2(sqrtcov, diffs):
     sqrtcov : matrix
         A lower tringular matrix corresponding to the lower part of
         the Cholesky decomposition of the covariance matrix.
+        It can also be a :py:class:`validphys.covmats_utils.BlockLowRankCovmat`,
+        in which case the χ² is computed with the Woodbury identity
+        without building the dense matrix.
     diffs : array
         A vector of differences (e.g. between data and theory).
         The first dimenssion must match the shape of `sqrtcov`.
@@ -61,6 +66,8 @@ def calc_chi2(sqrtcov, diffs):
     # handle empty data
     if not diffs.size:
         return np.full(diffs.shape[1:], np.nan)
+    if isinstance(sqrtcov, BlockLowRankCovmat):
+        return sqrtcov.chi2(diffs)
     # Note la.cho_solve doesn't really improve things here
     # NOTE: Do not enable check_finite. The upper triangular part is not
     # guaranteed to make any sense.
@@ -70,6 +77,54 @@ def calc_chi2(sqrtcov, diffs):
     return np.einsum('i...,i...->...', vec, vec)
 
 
+def woodbury_is_cheaper(ndata, nsys):
+    """Return whether the χ² for a covmat which is a diagonal plus ``nsys`` correlated
+    systematics is cheaper to compute with the Woodbury identity, which costs
+    O(ndata nsys²), than from the Cholesky decomposition of the dense
+    (ndata x ndata) covmat, which costs O(ndata³).
+
+    This is always used by :py:func:`calc_chi2_from_systematics`, while ``covariance_matrix``
+    (and so ``results`` and ``abs_chi2_data``) only uses it when ``structured_covmat`` is set,
+    since many of its consumers need the covmat as a dense array."""
+    return 3 * nsys**2 < ndata**2
+
+
+def calc_chi2_from_systematics(stat_errors, sys_errors, diffs):
+    """Compute the χ² for the covmat built by
+    :py:func:`validphys.covmats_utils.construct_covmat` from the statistical errors
+    and the dataframe of systematics (e.g. ``CommonData.systematic_errors()``).
+    The uncorrelated errors form the diagonal and the correlated systematics a low rank
+    term so that, when it is cheaper (see :py:func:`woodbury_is_cheaper`), the χ² is
+    computed with the Woodbury identity without building the covmat
+    (see :py:class:`validphys.covmats_utils.DiagonalLowRankCovmat`).
+
+    Like :py:func:`calc_chi2`, the computation is broadcast over the
+    dimensions of ``diffs`` after the first one, e.g. over replicas.
+
+    Examples
+    --------
+
+    >>> import numpy as np
+    >>> import pandas as pd
+    >>> from validphys.calcutils import calc_chi2_from_systematics
+    >>> from validphys.covmats_utils import construct_covmat
+    >>> rng = np.random.default_rng(0)
+    >>> stat = rng.random(10)
+    >>> sys = pd.DataFrame(rng.random((10, 2)), columns=["CORR", "UNCORR"])
+    >>> diffs = rng.random((10, 3))
+    >>> chi2 = calc_chi2_from_systematics(stat, sys, diffs)
+    >>> cov = construct_covmat(stat, sys)
+    >>> np.allclose(chi2, np.einsum("ir, ij, jr -> r", diffs, np.linalg.inv(cov), diffs))
+    True
+    """
+    if not diffs.size:
+        return np.full(diffs.shape[1:], np.nan)
+    covmat = DiagonalLowRankCovmat.from_systematics(stat_errors, sys_errors)
+    if not woodbury_is_cheaper(*covmat.lowrank.shape):
+        return calc_chi2(la.cholesky(covmat.todense(), lower=True), diffs)
+    return covmat.chi2(diffs)
+
+
 def all_chi2(results):
     """Return the chi² for all elements in the result, regardless of the Stats class
     Note that the interpretation of the result will depend on the PDF error type"""
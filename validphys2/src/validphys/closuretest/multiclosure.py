@@ -80,11 +80,10 @@ def internal_multiclosure_dataset_loader(
     typically used in these studies.
 
     """
-    fits_dataset_predictions = [
-        ThPredictionsResult.from_convolution(pdf, dataset) for pdf in fits_pdf
-    ]
-    fits_underlying_predictions = ThPredictionsResult.from_convolution(
-        multiclosure_underlyinglaw, dataset
+    *fits_dataset_predictions, fits_underlying_predictions = (
+        ThPredictionsResult.from_batched_convolution(
+            [*fits_pdf, multiclosure_underlyinglaw], dataset
+        )
     )
 
     sqrt_covmat = la.cholesky(t0_covmat_from_systematics, lower=True)
@@ -783,24 +783,39 @@ class CoreConfig(configparser.Config):
         return tmp.reindex(index=bb, columns=bb, level=0).values
 
     @configparser.explicit_node
-    def produce_covmat_t0_considered(self, use_t0: bool = False):
+    def produce_covmat_t0_considered(self, use_t0: bool = False, structured_covmat: bool = False):
         """Modifies which action is used as covariance_matrix depending on
-        the flag `use_t0`
+        the flag `use_t0`.
+        If `structured_covmat` is True the covmat of each dataset is kept as a diagonal
+        plus low rank matrix whenever that makes the computation of the chi2 cheaper.
         """
         from validphys import covmats
 
+        if structured_covmat:
+            if use_t0:
+                return covmats.t0_structured_covmat_from_systematics
+            return covmats.structured_covmat_from_systematics
         if use_t0:
             return covmats.t0_covmat_from_systematics
         else:
             return covmats.covmat_from_systematics
 
     @configparser.explicit_node
-    def produce_dataset_inputs_covmat_t0_considered(self, use_t0: bool = False):
+    def produce_dataset_inputs_covmat_t0_considered(
+        self, use_t0: bool = False, structured_covmat: bool = False
+    ):
         """Modifies which action is used as experiment_covariance_matrix
-        depending on the flag `use_t0`
+        depending on the flag `use_t0`.
+        If `structured_covmat` is True the covmat is kept as a block diagonal
+        plus low rank matrix (see :py:class:`validphys.covmats_utils.BlockLowRankCovmat`)
+        which is used to compute the chi2 without building the dense matrix.
         """
         from validphys import covmats
 
+        if structured_covmat:
+            if use_t0:
+                return covmats.dataset_inputs_t0_structured_covmat_from_systematics
+            return covmats.dataset_inputs_structured_covmat_from_systematics
         if use_t0:
             return covmats.dataset_inputs_t0_covmat_from_systematics
         else:
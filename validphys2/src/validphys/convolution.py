@@ -43,6 +43,7 @@ import operator
 import numpy as np
 import pandas as pd
 
+from validphys.fkparser import load_fktables_parallel
 from validphys.pdfbases import evolution
 
 FK_FLAVOURS = evolution.to_known_elements(
@@ -66,6 +67,10 @@ FK_FLAVOURS = evolution.to_known_elements(
 
 NFK = len(FK_FLAVOURS)
 
+# Maximum size (in bytes) of the PDF values contracted at once with an FKTable
+# in :py:func:`batched_predictions`
+BATCH_MEMORY_LIMIT = 2**28
+
 
 def _asy(a, b):
     return (a - b) / (a + b)
@@ -148,13 +153,7 @@ class PredictionsRequireCutsError(Exception):
     pass
 
 
-def _predictions(dataset, pdf, fkfunc):
-    """Combine data on all the FKTables in the database according to the
-    reduction operation defined therein. Dispatch the kind of predictions (for
-    all replicas, central, etc) according to the provided ``fkfunc``, which
-    should have the same interface as e.g. ``fk_predictions``.
-    """
-    opfunc = OP[dataset.op]
+def _check_cuts(dataset):
     if dataset.cuts is None:
         raise PredictionsRequireCutsError(
             "FKTables do not always generate predictions for some datapoints "
@@ -162,11 +161,12 @@ def _predictions(dataset, pdf, fkfunc):
             "therefore produce predictions whose shape doesn't match the uncut "
             "commondata and is not supported."
         )
-    cuts = dataset.cuts
-    all_predictions = []
-    for fk in dataset.fkspecs:
-        fk_w_cuts = fk.load_with_cuts(cuts)
-        all_predictions.append(fkfunc(fk_w_cuts, pdf))
+
+
+def _combine_predictions(dataset, all_predictions):
+    """Combine the predictions of all the FKTables of the dataset according to
+    the reduction operation defined therein."""
+    opfunc = OP[dataset.op]
     # Old fktables repeated values to make DEN and NUM sizes match in RATIO operations
     # pineappl tables instead just contain the one value used
     # The code below works for both situation while keeping `true_div` as the operation
@@ -175,6 +175,19 @@ def _predictions(dataset, pdf, fkfunc):
     return opfunc(*all_predictions)
 
 
+def _predictions(dataset, pdf, fkfunc):
+    """Combine data on all the FKTables in the database according to the
+    reduction operation defined therein. Dispatch the kind of predictions (for
+    all replicas, central, etc) according to the provided ``fkfunc``, which
+    should have the same interface as e.g. ``fk_predictions``.
+    """
+    _check_cuts(dataset)
+    # Datasets with several tables (e.g., COMPOUND) get them loaded concurrently
+    (fktables,) = load_fktables_parallel([dataset])
+    all_predictions = [fkfunc(fk_w_cuts, pdf) for fk_w_cuts in fktables]
+    return _combine_predictions(dataset, all_predictions)
+
+
 def predictions(dataset, pdf):
     """ "Compute theory predictions for a given PDF and dataset. Information
     regading the dataset, on cuts, CFactors and combinations of FKTables is
@@ -248,6 +261,121 @@ def linear_predictions(dataset, pdf):
     return _predictions(dataset, pdf, linear_fk_predictions)
 
 
+def batched_predictions(datasets, pdfs, central_only=False):
+    """Compute the predictions of several datasets for several PDFs at once.
+    The result is the same as calling :py:func:`predictions`
+    (or :py:func:`central_predictions` if ``central_only`` is True) for
+    every combination of dataset and PDF, but:
+
+        - the FKTables of all datasets are loaded only once, concurrently.
+        - each PDF is evaluated only once for each Q0, in the union of the x-grids
+          of all FKTables.
+        - each FKTable is contracted with all PDFs in a single sparse product
+          (or as many as allowed by ``BATCH_MEMORY_LIMIT``).
+
+    so that the cost scales with the number of tables rather than with the number of
+    tables times the number of PDFs.
+
+    Parameters
+    ----------
+    datasets : list(validphys.core.DatasetSpec)
+        The datasets for which to compute the predictions.
+    pdfs : list(validphys.core.PDF)
+        The PDF sets to use for the convolutions.
+    central_only: bool
+        Compute only the predictions for the central member of the PDFs.
+
+    Returns
+    -------
+    predictions: list(list(pandas.DataFrame))
+        For each PDF, a list with the predictions for each dataset, with the same format
+        as the output of :py:func:`predictions`.
+
+    Examples
+    --------
+    >>> from validphys.loader import Loader
+    >>> from validphys.convolution import batched_predictions
+    >>> l = Loader()
+    >>> datasets = [l.check_dataset(i, theoryid=399) for i in ("ATLASTTBARTOT", "H1HERAF2B")]
+    >>> pdfs = [l.check_pdf(i) for i in ("NNPDF40_nnlo_as_01180", "NNPDF40_nlo_as_01180")]
+    >>> (nnlo_ttbar, nnlo_dis), (nlo_ttbar, nlo_dis) = batched_predictions(datasets, pdfs)
+    """
+    for dataset in datasets:
+        _check_cuts(dataset)
+    all_fktables = load_fktables_parallel(datasets)
+
+    # All PDFs are evaluated only once per Q0 in the union of the x-grids of all tables
+    xgrids = {}
+    for fktables in all_fktables:
+        for fk in fktables:
+            xgrids[fk.Q0] = np.union1d(xgrids.get(fk.Q0, []), fk.xgrid)
+
+    gvfunc = evolution.central_grid_values if central_only else evolution.grid_values
+    pdf_grids = {}
+
+    def pdf_grid(pdf, Q):
+        # PDF and PDFcv compare equal, use also the type as part of the key
+        key = (type(pdf), pdf, Q)
+        if key not in pdf_grids:
+            # Squeeze to remove the dimension over Q.
+            gv = gvfunc(pdf, qmat=[Q], vmat=FK_FLAVOURS, xmat=xgrids[Q])
+            pdf_grids[key] = gv.squeeze(-1)
+        return pdf_grids[key]
+
+    all_predictions = [[] for _ in pdfs]
+    for dataset, fktables in zip(datasets, all_fktables):
+        fk_predictions_per_pdf = [[] for _ in pdfs]
+        for fk in fktables:
+            xpos = np.searchsorted(xgrids[fk.Q0], fk.xgrid)
+            # Contract as many PDFs at once as allowed by BATCH_MEMORY_LIMIT
+            batch = []
+            for i, pdf in enumerate(pdfs):
+                grids = [pdf_grid(p, fk.Q0)[:, :, xpos] for p in fk.determine_pdfs(pdf)]
+                batch.append((i, _fk_pdf_values(fk, *grids)))
+                batch_size = sum(values.nbytes for _, values in batch)
+                if i == len(pdfs) - 1 or batch_size > BATCH_MEMORY_LIMIT:
+                    results = _batched_convolution(fk, [values for _, values in batch])
+                    for (j, _), res in zip(batch, results):
+                        fk_predictions_per_pdf[j].append(res)
+                    batch = []
+
+        for i, fk_preds in enumerate(fk_predictions_per_pdf):
+            all_predictions[i].append(_combine_predictions(dataset, fk_preds))
+
+    return all_predictions
+
+
+def _batched_convolution(loaded_fk, pdf_values):
+    """Contract the FKTable with a list of PDF values (as returned by :py:func:`_fk_pdf_values`)
+    in a single product, return a list with the predictions for each of them."""
+    nmembers = [i.shape[0] for i in pdf_values]
+    if loaded_fk.sigma.empty:
+        res = pd.DataFrame(columns=range(sum(nmembers)))
+    else:
+        res = _sparse_convolution(loaded_fk, np.concatenate(pdf_values))
+    splits = np.cumsum([0] + nmembers)
+    return [
+        res.iloc[:, start:end].set_axis(range(end - start), axis=1)
+        for start, end in zip(splits[:-1], splits[1:])
+    ]
+
+
+def _fk_pdf_values(loaded_fk, gv1, gv2=None):
+    """Given the PDF grids in the evolution basis with shape ``(nmembers, NFK, nx)``,
+    return the values to be contracted with the FKTable in the channels
+    of ``loaded_fk.sigma``, see :py:func:`_sparse_convolution`."""
+    fm = loaded_fk.sigma.columns
+    if not loaded_fk.hadronic:
+        return gv1[:, fm, :]
+    if gv2 is None:
+        gv2 = gv1
+    # See _gv_hadron_predictions for the meaning of the column indices
+    all_fl_indices_1, all_fl_indices_2 = np.indices((NFK, NFK))
+    fl1 = all_fl_indices_1.ravel()[fm]
+    fl2 = all_fl_indices_2.ravel()[fm]
+    return gv1[:, fl1, :, np.newaxis] * gv2[:, fl2, np.newaxis, :]
+
+
 def fk_predictions(loaded_fk, pdf):
     """Low level function to compute predictions from a
     FKTable.
@@ -367,16 +495,7 @@ def _gv_hadron_predictions(loaded_fk, gv1func, gv2func=None):
     # Create a luminosity tensor holding the value f1(x1)*f2(x2) for all
     # possible x1-x2 combinations (f1, f2, x1, x2)
     luminosity = np.einsum("ijk, ijl->ijkl", expanded_gv1, expanded_gv2)
-
-    def appl(df):
-        # x1 and x2 are encoded as the first and second index levels.
-        xx1 = df.index.get_level_values(1)
-        xx2 = df.index.get_level_values(2)
-        # take the active combinations from the luminosity tensor
-        partial_lumi = luminosity[..., xx1, xx2]
-        return pd.Series(np.einsum("ijk,kj->i", partial_lumi, df.values))
-
-    return sigma.groupby(level=0).apply(appl)
+    return _sparse_convolution(loaded_fk, luminosity)
 
 
 def _gv_dis_predictions(loaded_fk, gvfunc):
@@ -392,12 +511,22 @@ def _gv_dis_predictions(loaded_fk, gvfunc):
     if sigma.empty:
         return pd.DataFrame(columns=range(gv.shape[0]))
 
-    def appl(df):
-        # x is encoded as the first index level.
-        xind = df.index.get_level_values(1)
-        return pd.Series(np.einsum("ijk,kj->i", gv[:, :, xind], df.values))
+    return _sparse_convolution(loaded_fk, gv)
 
-    return sigma.groupby(level=0).apply(appl)
+
+def _sparse_convolution(loaded_fk, pdf_values):
+    """Contract the sparse representation of the FKTable
+    (see :py:meth:`validphys.coredata.FKTableData.get_sparse_fktable`) with
+    ``pdf_values``, of shape ``(nmembers, nbasis, nx)`` for DIS and
+    ``(nmembers, nbasis, nx, nx)`` for hadronic tables, where the basis
+    corresponds to the columns of ``sigma``.
+    Only the non-zero entries of the table enter the computation.
+    """
+    fktable = loaded_fk.get_sparse_fktable()
+    nmembers = pdf_values.shape[0]
+    res = fktable @ pdf_values.reshape(nmembers, -1).T
+    data_idx = pd.Index(np.unique(loaded_fk.sigma.index.get_level_values(0)), name="data")
+    return pd.DataFrame(res, index=data_idx)
 
 
 def hadron_predictions(loaded_fk, pdf):
@@ -6,7 +6,6 @@ import dataclasses
 import enum
 import functools
 import inspect
-import json
 import logging
 from pathlib import Path
 import re
@@ -22,8 +21,8 @@ from reportengine.compat import yaml
 # Maybe move the cuts logic to its own module?
 from validphys import filters, lhaindex
 from validphys.commondataparser import get_plot_kinlabels, load_commondata, peek_commondata_metadata
-from validphys.fkparser import load_fktable, parse_cfactor
-from validphys.hyperoptplot import HyperoptTrial
+from validphys.fkparser import load_fktable, load_fktable_with_cuts, parse_cfactor
+from validphys.hyperoptplot import HyperoptTrial, load_trial_table
 from validphys.lhapdfset import LHAPDFSet
 from validphys.tableloader import parse_exp_mat
 from validphys.utils import experiments_to_dataset_inputs
@@ -564,10 +563,15 @@ class FKTableSpec(TupleComp):
 
     The metadata of the FKTable for the given dataset is stored as an attribute to this function.
     This is transitional, eventually it will be held by the associated CommonData in the new format.
+
+    If ``cache_path`` is given, the parsed FKTable will be stored in (and read from)
+    a binary cache in that folder, see :py:func:`validphys.fkparser.load_fktable`.
+    The cache path does not enter the comparison between specs.
     """
 
-    def __init__(self, fkpath, cfactors, metadata=None):
+    def __init__(self, fkpath, cfactors, metadata=None, cache_path=None):
         self.cfactors = cfactors if cfactors is not None else []
+        self.cache_path = cache_path
 
         self.legacy = False
 
@@ -602,8 +606,9 @@ class FKTableSpec(TupleComp):
 
     @functools.lru_cache
     def load_with_cuts(self, cuts):
-        """Load the fktable and apply cuts immediately. Returns a FKTableData"""
-        return load_fktable(self).with_cuts(cuts)
+        """Load the fktable and apply cuts immediately. Returns a FKTableData.
+        See :py:func:`validphys.fkparser.load_fktable_with_cuts`"""
+        return load_fktable_with_cuts(self, cuts)
 
 
 class LagrangeSetSpec(DataSetSpec):
@@ -750,7 +755,10 @@ class HyperscanSpec(FitSpec):
 
     @property
     def tries_files(self):
-        """Return a dictionary with all tries.json files mapped to their replica number"""
+        """Return a dictionary with all tries.json files mapped to their replica number.
+        During a scan a replica might have only the trial log (``tries.jsonl``),
+        the files are to be read with :py:func:`validphys.hyperoptplot.load_trials`
+        or :py:func:`validphys.hyperoptplot.load_trial_table`"""
         if self._tries_files is None:
             re_idx = re.compile(r"(?<=replica_)\d+$")
             get_idx = lambda x: int(re_idx.findall(x.as_posix())[-1])
@@ -759,13 +767,14 @@ class HyperscanSpec(FitSpec):
             tries = {}
             for idx in sorted(all_rep):
                 test_path = self.path / f"nnfit/replica_{idx}/tries.json"
-                if test_path.exists():
+                if test_path.exists() or test_path.with_suffix(".jsonl").exists():
                     tries[idx] = test_path
             self._tries_files = tries
         return self._tries_files
 
     def get_all_trials(self, base_params=None):
-        """Read all trials from all tries files.
+        """Read all finished trials from all tries files, through the trial table
+        of each replica (see :py:func:`validphys.hyperoptplot.load_trial_table`).
         If there are original runcard-based parameters, a reference to them can be passed
         to the trials so that a full hyperparameter dictionary can be defined
 
@@ -773,11 +782,10 @@ class HyperscanSpec(FitSpec):
         """
         all_trials = []
         for trial_file in self.tries_files.values():
-            with open(trial_file) as tf:
-                run_trials = []
-                for trial in json.load(tf):
-                    trial = HyperoptTrial(trial, base_params=base_params, linked_trials=run_trials)
-                    run_trials.append(trial)
+            run_trials = []
+            for trial in load_trial_table(trial_file).get("_trial", []):
+                trial = HyperoptTrial(trial, base_params=base_params, linked_trials=run_trials)
+                run_trials.append(trial)
             all_trials += run_trials
         return all_trials
 
@@ -189,6 +189,56 @@ class FKTableData:
 
         return fktable
 
+    def get_sparse_fktable(self):
+        """Returns the fktable as a sparse matrix in CSR format, with one row per data point
+        and the columns blocked by luminosity channel. Only the non-zero entries of ``sigma``
+        are stored, so the dense tensor is never materialised.
+
+        The return shape is:
+            (ndata, nbasis*nx) for DIS
+            (ndata, nbasis*nx*nx) for hadronic
+        such that ``get_sparse_fktable().toarray()`` is equal to
+        ``get_np_fktable().reshape(ndata, -1)``.
+        The data points are ordered as the (sorted) data index of ``sigma``.
+        """
+        # This is imported here for performance reasons.
+        from scipy import sparse
+
+        nx = len(self.xgrid)
+        nbasis = self.sigma.shape[1]
+        index = self.sigma.index
+
+        # Map the data index (which might have gaps due to cuts) to rows of the matrix
+        data_idx, rows = np.unique(index.get_level_values(0), return_inverse=True)
+        x1 = index.get_level_values(1).to_numpy()
+        if self.hadronic:
+            nxx = nx * nx
+            xpos = x1 * nx + index.get_level_values(2).to_numpy()
+        else:
+            nxx = nx
+            xpos = x1
+
+        values = self.sigma.to_numpy()
+        nonzero_rows, channels = np.nonzero(values)
+        return sparse.csr_array(
+            (
+                values[nonzero_rows, channels],
+                (rows[nonzero_rows], channels * nxx + xpos[nonzero_rows]),
+            ),
+            shape=(len(data_idx), nbasis * nxx),
+        )
+
+    def without_empty_channels(self):
+        """Return a copy of the FKTable where the luminosity channels which are zero
+        for all (cut) data points have been removed from ``sigma``.
+        This reduces the size of both the dense and sparse representations of the table,
+        and ``luminosity_mapping`` will only contain the active channels.
+        """
+        active = (self.sigma != 0).any(axis=0)
+        if active.all() or not active.any():
+            return self
+        return dataclasses.replace(self, sigma=self.sigma.loc[:, active])
+
     def determine_pdfs(self, pdf):
         """Determine the PDF (or PDFs) that should be used to be convoluted with this fktable.
         Uses the `convolution_types` key to decide the PDFs.
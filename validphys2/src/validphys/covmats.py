@@ -11,7 +11,7 @@ import scipy.linalg as la
 
 from reportengine import collect
 from reportengine.table import table
-from validphys.calcutils import regularize_covmat
+from validphys.calcutils import regularize_covmat, woodbury_is_cheaper
 from validphys.checks import (
     check_cuts_considered,
     check_norm_threshold,
@@ -19,7 +19,12 @@ from validphys.checks import (
     check_speclabels_different,
 )
 from validphys.convolution import central_predictions
-from validphys.covmats_utils import construct_covmat, systematics_matrix
+from validphys.covmats_utils import (
+    BlockLowRankCovmat,
+    DiagonalLowRankCovmat,
+    construct_covmat,
+    systematics_matrix,
+)
 
 log = logging.getLogger(__name__)
 
@@ -32,6 +37,7 @@ def covmat_from_systematics(
     use_weights_in_covmat=True,
     norm_threshold=None,
     _central_values=None,
+    _structured=False,
 ):
     """Take the statistical uncertainty and systematics table from
     a :py:class:`validphys.coredata.CommonData` object and
@@ -89,6 +95,10 @@ def covmat_from_systematics(
         default this is None, and the experimental central values are used. However, this
         can be used to calculate, for example, the t0 covariance matrix by
         using the predictions from the central member of the t0 pdf.
+    _structured: bool
+        If True and the chi2 is cheaper to compute that way
+        (see :py:func:`validphys.calcutils.woodbury_is_cheaper`), the covmat is returned as a
+        :py:class:`validphys.covmats_utils.DiagonalLowRankCovmat` instead of a dense matrix.
 
     Returns
     -------
@@ -111,10 +121,17 @@ def covmat_from_systematics(
     (28, 28)
 
     """
-    covmat = construct_covmat(
-        loaded_commondata_with_cuts.stat_errors.to_numpy(),
-        loaded_commondata_with_cuts.systematic_errors(_central_values),
-    )
+    stat_errors = loaded_commondata_with_cuts.stat_errors.to_numpy()
+    sys_errors = loaded_commondata_with_cuts.systematic_errors(_central_values)
+    if _structured and norm_threshold is None:
+        covmat = DiagonalLowRankCovmat.from_systematics(stat_errors, sys_errors)
+        # The Woodbury identity needs the inverse of the diagonal
+        if woodbury_is_cheaper(*covmat.lowrank.shape) and np.all(covmat.diagonal_part > 0):
+            if use_weights_in_covmat:
+                covmat = covmat.rescale(np.full(covmat.shape[0], np.sqrt(dataset_input.weight)))
+            return covmat
+
+    covmat = construct_covmat(stat_errors, sys_errors)
     if use_weights_in_covmat:
         covmat = covmat / dataset_input.weight
     if norm_threshold is not None:
@@ -122,6 +139,23 @@ def covmat_from_systematics(
     return covmat
 
 
+def structured_covmat_from_systematics(
+    loaded_commondata_with_cuts, dataset_input, use_weights_in_covmat=True, norm_threshold=None
+):
+    """Like :py:func:`covmat_from_systematics` except the covmat is returned as a
+    :py:class:`validphys.covmats_utils.DiagonalLowRankCovmat` when the chi2 is cheaper to
+    compute from the systematics than from the dense covmat. This is used as
+    ``covariance_matrix`` when ``structured_covmat`` is set in the runcard.
+    """
+    return covmat_from_systematics(
+        loaded_commondata_with_cuts,
+        dataset_input,
+        use_weights_in_covmat,
+        norm_threshold=norm_threshold,
+        _structured=True,
+    )
+
+
 def dataset_inputs_covmat_from_systematics(
     dataset_inputs_loaded_cd_with_cuts,
     data_input,
@@ -129,6 +163,7 @@ def dataset_inputs_covmat_from_systematics(
     norm_threshold=None,
     _list_of_central_values=None,
     _only_additive=False,
+    _structured=False,
 ):
     """Given a list containing :py:class:`validphys.coredata.CommonData` s,
     construct the full covariance matrix.
@@ -158,6 +193,12 @@ def dataset_inputs_covmat_from_systematics(
         combined with the multiplicative errors to calculate their absolute
         contribution. By default this is None and the experimental central
         values are used.
+    _structured: bool
+        If True, the covmat is returned as a
+        :py:class:`validphys.covmats_utils.BlockLowRankCovmat` which stores
+        only the block diagonal and the special systematics instead of the dense matrix.
+        Since the regularisation needs the dense matrix, it is not compatible
+        with ``norm_threshold``.
 
     Returns
     -------
@@ -210,6 +251,14 @@ def dataset_inputs_covmat_from_systematics(
     # non-overlapping systematics are set to NaN by concat, fill with 0 instead.
     special_sys.fillna(0, inplace=True)
 
+    if _structured:
+        if norm_threshold is not None:
+            raise ValueError("The regularisation of the covmat requires a dense covmat")
+        covmat = BlockLowRankCovmat(block_diags, special_sys.to_numpy())
+        if use_weights_in_covmat:
+            covmat = covmat.rescale(np.sqrt(np.concatenate(weights)))
+        return covmat
+
     diag = la.block_diag(*block_diags)
     covmat = diag + special_sys.to_numpy() @ special_sys.to_numpy().T
     if use_weights_in_covmat:
@@ -291,6 +340,27 @@ def t0_covmat_from_systematics(
     )
 
 
+def t0_structured_covmat_from_systematics(
+    loaded_commondata_with_cuts,
+    *,
+    dataset_input,
+    use_weights_in_covmat=True,
+    norm_threshold=None,
+    dataset_t0_predictions,
+):
+    """Like :py:func:`structured_covmat_from_systematics` but using the t0 predictions,
+    see :py:func:`t0_covmat_from_systematics`.
+    """
+    return covmat_from_systematics(
+        loaded_commondata_with_cuts,
+        dataset_input,
+        use_weights_in_covmat,
+        norm_threshold=norm_threshold,
+        _central_values=dataset_t0_predictions,
+        _structured=True,
+    )
+
+
 dataset_inputs_t0_predictions = collect("dataset_t0_predictions", ("data",))
 
 
@@ -333,6 +403,45 @@ def dataset_inputs_t0_covmat_from_systematics(
     )
 
 
+def dataset_inputs_structured_covmat_from_systematics(
+    dataset_inputs_loaded_cd_with_cuts, data_input, use_weights_in_covmat=True, norm_threshold=None
+):
+    """Like :py:func:`dataset_inputs_covmat_from_systematics` except the covmat is
+    returned as a :py:class:`validphys.covmats_utils.BlockLowRankCovmat`, the
+    block diagonal contributions of each dataset plus the special systematics which
+    are correlated across datasets. This is used instead of the dense covmat for the
+    computation of the chi2 when ``structured_covmat`` is set in the runcard.
+    """
+    return dataset_inputs_covmat_from_systematics(
+        dataset_inputs_loaded_cd_with_cuts,
+        data_input,
+        use_weights_in_covmat,
+        norm_threshold=norm_threshold,
+        _structured=True,
+    )
+
+
+def dataset_inputs_t0_structured_covmat_from_systematics(
+    dataset_inputs_loaded_cd_with_cuts,
+    *,
+    data_input,
+    use_weights_in_covmat=True,
+    norm_threshold=None,
+    dataset_inputs_t0_predictions,
+):
+    """Like :py:func:`dataset_inputs_structured_covmat_from_systematics` but using the
+    t0 predictions, see :py:func:`dataset_inputs_t0_covmat_from_systematics`.
+    """
+    return dataset_inputs_covmat_from_systematics(
+        dataset_inputs_loaded_cd_with_cuts,
+        data_input,
+        use_weights_in_covmat,
+        norm_threshold=norm_threshold,
+        _list_of_central_values=dataset_inputs_t0_predictions,
+        _structured=True,
+    )
+
+
 def dataset_inputs_t0_total_covmat_separate(
     dataset_inputs_t0_exp_covmat_separate, loaded_theory_covmat
 ):
@@ -550,6 +659,10 @@ def sqrt_covmat(covariance_matrix):
 
     The lower triangular is useful for efficient calculation of the :math:`\chi^2`
 
+    If the covmat is a :py:class:`validphys.covmats_utils.BlockLowRankCovmat` it is
+    returned unchanged, since it holds its own (structured) Cholesky decomposition
+    which is used by :py:func:`validphys.calcutils.calc_chi2`.
+
     Example
     -------
     >>> import numpy as np
@@ -574,6 +687,9 @@ def sqrt_covmat(covariance_matrix):
     True
 
     """
+    if isinstance(covariance_matrix, BlockLowRankCovmat):
+        return covariance_matrix
+
     dimensions = covariance_matrix.shape
 
     if covariance_matrix.size == 0:
@@ -713,8 +829,14 @@ def pdferr_plus_covmat(results_without_covmat, pdf, covmat_t0_considered):
     True
     """
     _, th = results_without_covmat
+    # The structured covmat is kept as such by adding the PDF error as a low rank term
+    structured = isinstance(covmat_t0_considered, BlockLowRankCovmat)
 
     if pdf.error_type == 'replicas':
+        if structured:
+            nrep = th.error_members.shape[1]
+            X = th.error_members - th.error_members.mean(axis=1, keepdims=True)
+            return covmat_t0_considered.add_lowrank(X / np.sqrt(nrep - 1))
         pdf_cov = np.cov(th.error_members, rowvar=True)
 
     elif pdf.error_type == 'symmhessian':
@@ -727,6 +849,8 @@ def pdferr_plus_covmat(results_without_covmat, pdf, covmat_t0_considered):
         X = hessian_eigenvectors - central_predictions.reshape((central_predictions.shape[0], 1))
         # need to rescale the Hessian eigenvectors in case the eigenvector confidence interval is not 68%
         X = X / rescale_fac
+        if structured:
+            return covmat_t0_considered.add_lowrank(X)
         pdf_cov = X @ X.T
 
     elif pdf.error_type == 'hessian':
@@ -737,6 +861,8 @@ def pdferr_plus_covmat(results_without_covmat, pdf, covmat_t0_considered):
         X = (hessian_eigenvectors[:, 0::2] - hessian_eigenvectors[:, 1::2]) * 0.5
         # need to rescale the Hessian eigenvectors in case the eigenvector confidence interval is not 68%
         X = X / rescale_fac
+        if structured:
+            return covmat_t0_considered.add_lowrank(X)
         pdf_cov = X @ X.T
 
     return pdf_cov + covmat_t0_considered
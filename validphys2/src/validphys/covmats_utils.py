@@ -6,8 +6,13 @@ Leveraged by :py:mod:`validphys.covmats` which contains relevant
 actions/providers.
 
 """
+from collections import OrderedDict
+import functools
+import hashlib
+
 import numpy as np
 import pandas as pd
+import scipy.linalg as la
 
 
 def systematics_matrix(stat_errors: np.array, sys_errors: pd.DataFrame):
@@ -86,3 +91,352 @@ def construct_covmat(stat_errors: np.array, sys_errors: pd.DataFrame):
 
     corr_sys_mat = sys_errors.loc[:, ~is_uncorr].to_numpy()
     return np.diag(diagonal) + corr_sys_mat @ corr_sys_mat.T
+
+
+class BlockLowRankCovmat:
+    """Covariance matrix with the structure
+
+    .. math::
+
+        C = D + U U^T
+
+    where :math:`D` is block diagonal (one block per dataset, containing the
+    uncertainties which are only correlated within the dataset) and :math:`U`
+    is a (N_data x N_sys) matrix of the systematics which are correlated across
+    datasets. Only the blocks and :math:`U` are stored, so that the memory
+    needed is much smaller than that of the dense N_data x N_data matrix.
+
+    The inverse and the determinant are computed from the Cholesky
+    decomposition of the blocks and the Woodbury identity
+
+    .. math::
+
+        C^{-1} = D^{-1} - D^{-1} U (1 + U^T D^{-1} U)^{-1} U^T D^{-1}
+
+    so that only matrices of the size of the blocks and of N_sys x N_sys
+    are ever factorised.
+
+    The dense matrix can be obtained with :py:meth:`todense` (or ``np.array``)
+    for functions which do not support this class.
+
+    Parameters
+    ----------
+    blocks: list[np.array]
+        the square blocks of the diagonal
+    lowrank: np.array
+        the (N_data x N_sys) matrix :math:`U`, if not given the covmat is block diagonal
+
+    Example
+    -------
+    >>> import numpy as np
+    >>> from validphys.covmats_utils import BlockLowRankCovmat
+    >>> cov = BlockLowRankCovmat([np.eye(2), 2 * np.eye(3)], np.ones((5, 1)))
+    >>> cov.shape
+    (5, 5)
+    >>> np.allclose(cov.solve(cov @ np.arange(5.0)), np.arange(5.0))
+    True
+    """
+
+    # Make numpy defer to the operators of this class, e.g. for ``ndarray + covmat``
+    __array_ufunc__ = None
+
+    def __init__(self, blocks, lowrank=None):
+        self.blocks = [np.atleast_2d(block) for block in blocks]
+        self._offsets = np.cumsum([0] + [block.shape[0] for block in self.blocks])
+        ndata = self._offsets[-1]
+        if lowrank is None:
+            lowrank = np.zeros((ndata, 0))
+        self.lowrank = np.asarray(lowrank, dtype=float).reshape(ndata, -1)
+
+    @property
+    def shape(self):
+        return (self._offsets[-1], self._offsets[-1])
+
+    @property
+    def size(self):
+        return self._offsets[-1] ** 2
+
+    @property
+    def ndim(self):
+        return 2
+
+    def _block_slices(self):
+        for start, end in zip(self._offsets[:-1], self._offsets[1:]):
+            yield slice(start, end)
+
+    def _blockwise(self, func, x):
+        """Apply ``func(block_index, x[block])`` to each of the blocks of the
+        first axis of ``x`` and concatenate the results"""
+        if not self.blocks:
+            return np.zeros_like(x, dtype=float)
+        return np.concatenate([func(i, x[sl]) for i, sl in enumerate(self._block_slices())])
+
+    def diagonal(self):
+        """Return the diagonal of the covmat without building the dense matrix"""
+        block_diagonal = np.concatenate([np.diag(block) for block in self.blocks] or [[]])
+        return block_diagonal + np.einsum("ij, ij -> i", self.lowrank, self.lowrank)
+
+    def todense(self):
+        """Return the covmat as a dense numpy array"""
+        return la.block_diag(*self.blocks) + self.lowrank @ self.lowrank.T
+
+    def __array__(self, dtype=None, copy=None):
+        dense = self.todense()
+        return dense if dtype is None else dense.astype(dtype)
+
+    def __add__(self, other):
+        if isinstance(other, BlockLowRankCovmat):
+            if not np.array_equal(self._offsets, other._offsets):
+                raise ValueError("Cannot add covmats with different block structures")
+            blocks = [a + b for a, b in zip(self.blocks, other.blocks)]
+            return BlockLowRankCovmat(blocks, np.concatenate([self.lowrank, other.lowrank], axis=1))
+        # Anything else (e.g. a theory covmat) is dense in general
+        return self.todense() + other
+
+    __radd__ = __add__
+
+    def add_lowrank(self, factor):
+        """Return a new covmat with ``factor @ factor.T`` added to this one"""
+        return BlockLowRankCovmat(self.blocks, np.concatenate([self.lowrank, factor], axis=1))
+
+    def rescale(self, scale):
+        """Return the covmat with elements ``C_ij / (scale_i * scale_j)``"""
+        blocks = [
+            block / scale[sl, np.newaxis] / scale[sl]
+            for block, sl in zip(self.blocks, self._block_slices())
+        ]
+        return BlockLowRankCovmat(blocks, self.lowrank / scale[:, np.newaxis])
+
+    def matvec(self, x):
+        """Multiply the covmat by ``x``, which can have any number of dimensions
+        after the first one"""
+        x = np.asarray(x)
+        out = self._blockwise(lambda i, xi: np.tensordot(self.blocks[i], xi, axes=1), x)
+        return out + np.tensordot(self.lowrank, np.tensordot(self.lowrank.T, x, axes=1), axes=1)
+
+    __matmul__ = matvec
+
+    @functools.cached_property
+    def block_cholesky(self):
+        """Lower triangular Cholesky decomposition of each of the blocks"""
+        return [la.cholesky(block, lower=True) for block in self.blocks]
+
+    def _whiten(self, x):
+        """Compute ``L_D^{-1} x`` where ``L_D`` is the Cholesky decomposition of ``D``"""
+        return self._blockwise(
+            lambda i, xi: la.solve_triangular(
+                self.block_cholesky[i], xi, lower=True, check_finite=False
+            ),
+            x,
+        )
+
+    @functools.cached_property
+    def _whitened_lowrank(self):
+        return self._whiten(self.lowrank)
+
+    @functools.cached_property
+    def _capacitance_cholesky(self):
+        """Cholesky decomposition of the (N_sys x N_sys) matrix ``1 + U^T D^{-1} U``"""
+        wu = self._whitened_lowrank
+        return la.cholesky(np.eye(wu.shape[1]) + wu.T @ wu, lower=True)
+
+    def solve(self, b):
+        """Return ``C^{-1} b``"""
+        b = np.asarray(b, dtype=float)
+        wu = self._whitened_lowrank
+        w = self._whiten(b)
+        correction = la.cho_solve((self._capacitance_cholesky, True), np.tensordot(wu.T, w, axes=1))
+        return self._unwhiten(w - np.tensordot(wu, correction, axes=1))
+
+    def _unwhiten(self, w):
+        """Compute ``L_D^{-T} w``"""
+        return self._blockwise(
+            lambda i, wi: la.solve_triangular(
+                self.block_cholesky[i], wi, lower=True, trans="T", check_finite=False
+            ),
+            w,
+        )
+
+    def _logdet_blocks(self):
+        return 2 * sum(np.log(np.diag(factor)).sum() for factor in self.block_cholesky)
+
+    def logdet(self):
+        """Return the logarithm of the determinant of the covmat"""
+        logdet_capacitance = 2 * np.log(np.diag(self._capacitance_cholesky)).sum()
+        return self._logdet_blocks() + logdet_capacitance
+
+    def chi2(self, diffs):
+        """Compute ``diffs^T C^{-1} diffs`` broadcasting over all dimensions
+        of ``diffs`` after the first one, like :py:func:`validphys.calcutils.calc_chi2`"""
+        diffs = np.asarray(diffs, dtype=float)
+        w = self._whiten(diffs)
+        t = la.solve_triangular(
+            self._capacitance_cholesky,
+            np.tensordot(self._whitened_lowrank.T, w, axes=1),
+            lower=True,
+            check_finite=False,
+        )
+        return np.einsum("i...,i...->...", w, w) - np.einsum("i...,i...->...", t, t)
+
+
+class DiagonalLowRankCovmat(BlockLowRankCovmat):
+    """Like :py:class:`BlockLowRankCovmat` for a diagonal :math:`D`,
+
+    .. math::
+
+        C = diag(d) + U U^T
+
+    which is the structure of the covmat of a single dataset, see
+    :py:meth:`from_systematics`. The diagonal is stored as a 1-D array
+    and all the operations on :math:`D` are elementwise.
+
+    Parameters
+    ----------
+    diagonal: np.array
+        1-D array with the diagonal :math:`d`
+    lowrank: np.array
+        the (N_data x N_sys) matrix :math:`U`
+    """
+
+    def __init__(self, diagonal, lowrank=None):
+        self.diagonal_part = np.asarray(diagonal, dtype=float)
+        ndata = self.diagonal_part.size
+        self._offsets = np.array([0, ndata])
+        if lowrank is None:
+            lowrank = np.zeros((ndata, 0))
+        self.lowrank = np.asarray(lowrank, dtype=float).reshape(ndata, -1)
+
+    @classmethod
+    def from_systematics(cls, stat_errors: np.array, sys_errors: pd.DataFrame):
+        """Build the covmat of :py:func:`construct_covmat` from the statistical
+        errors and the dataframe of systematics without expanding the correlated
+        systematics into a dense matrix"""
+        is_uncorr = sys_errors.columns.isin(("UNCORR", "THEORYUNCORR"))
+        diagonal = stat_errors**2 + (sys_errors.loc[:, is_uncorr].to_numpy() ** 2).sum(axis=1)
+        return cls(diagonal, sys_errors.loc[:, ~is_uncorr].to_numpy())
+
+    @property
+    def blocks(self):
+        return [np.diag(self.diagonal_part)]
+
+    def _scale_rows(self, x, scale):
+        return x * scale.reshape(-1, *([1] * (x.ndim - 1)))
+
+    def diagonal(self):
+        return self.diagonal_part + np.einsum("ij, ij -> i", self.lowrank, self.lowrank)
+
+    def todense(self):
+        return np.diag(self.diagonal_part) + self.lowrank @ self.lowrank.T
+
+    def __add__(self, other):
+        if isinstance(other, DiagonalLowRankCovmat):
+            return DiagonalLowRankCovmat(
+                self.diagonal_part + other.diagonal_part,
+                np.concatenate([self.lowrank, other.lowrank], axis=1),
+            )
+        return super().__add__(other)
+
+    __radd__ = __add__
+
+    def add_lowrank(self, factor):
+        return DiagonalLowRankCovmat(
+            self.diagonal_part, np.concatenate([self.lowrank, factor], axis=1)
+        )
+
+    def rescale(self, scale):
+        return DiagonalLowRankCovmat(
+            self.diagonal_part / scale**2, self.lowrank / scale[:, np.newaxis]
+        )
+
+    def matvec(self, x):
+        x = np.asarray(x)
+        lowrank_part = np.tensordot(self.lowrank, np.tensordot(self.lowrank.T, x, axes=1), axes=1)
+        return self._scale_rows(x, self.diagonal_part) + lowrank_part
+
+    __matmul__ = matvec
+
+    @functools.cached_property
+    def block_cholesky(self):
+        return [np.diag(np.sqrt(self.diagonal_part))]
+
+    def _whiten(self, x):
+        return self._scale_rows(x, 1.0 / np.sqrt(self.diagonal_part))
+
+    _unwhiten = _whiten
+
+    def _logdet_blocks(self):
+        return np.log(self.diagonal_part).sum()
+
+    @functools.cached_property
+    def _dense_cholesky(self):
+        """Cholesky decomposition of the dense covmat when the diagonal has entries which
+        are not positive (e.g. datapoints without uncorrelated uncertainties), since then
+        the Woodbury identity cannot be used. None otherwise."""
+        if np.all(self.diagonal_part > 0):
+            return None
+        return la.cholesky(self.todense(), lower=True)
+
+    def solve(self, b):
+        if self._dense_cholesky is None:
+            return super().solve(b)
+        return la.cho_solve((self._dense_cholesky, True), np.asarray(b, dtype=float))
+
+    def logdet(self):
+        if self._dense_cholesky is None:
+            return super().logdet()
+        return 2 * np.log(np.diag(self._dense_cholesky)).sum()
+
+    def chi2(self, diffs):
+        if self._dense_cholesky is None:
+            return super().chi2(diffs)
+        w = la.solve_triangular(
+            self._dense_cholesky, np.asarray(diffs, dtype=float), lower=True, check_finite=False
+        )
+        return np.einsum("i...,i...->...", w, w)
+
+
+class CovmatCache:
+    """Least-recently-used cache of the output of ``function``, which takes a covariance
+    matrix as its only argument (for instance a factorisation of the covmat),
+    such that it is computed only once for all the replicas generated or fitted
+    in the same process.
+
+    The entries are identified by the content of the covmat and, as for
+    :py:class:`validphys.lhapdfset.GridValuesCache`, they are evicted once their total size
+    is above ``max_bytes``. The size of an entry is taken to be ``size_factor``
+    times the size of the covmat.
+    """
+
+    def __init__(self, function, max_bytes, size_factor=1):
+        self.function = function
+        self.max_bytes = max_bytes
+        self.size_factor = size_factor
+        self._entries = OrderedDict()
+        self._nbytes = 0
+
+    @staticmethod
+    def make_key(covmat):
+        return (covmat.shape, covmat.dtype.str, hashlib.sha256(covmat.view(np.uint8)).hexdigest())
+
+    def __call__(self, covmat):
+        covmat = np.ascontiguousarray(covmat)
+        key = self.make_key(covmat)
+        if key in self._entries:
+            self._entries.move_to_end(key)
+            return self._entries[key][0]
+        value = self.function(covmat)
+        nbytes = self.size_factor * covmat.nbytes
+        if nbytes <= self.max_bytes:
+            self._entries[key] = (value, nbytes)
+            self._nbytes += nbytes
+            while self._nbytes > self.max_bytes:
+                _, (_, evicted) = self._entries.popitem(last=False)
+                self._nbytes -= evicted
+        return value
+
+    def clear(self):
+        self._entries.clear()
+        self._nbytes = 0
+
+    def __len__(self):
+        return len(self._entries)
@@ -16,12 +16,30 @@ CFactors applied.
     l = Loader()
     fk = l.check_fktable(setname="ATLASTTBARTOT", theoryID=53, cfac=('QCD',))
     res = load_fktable(fk)
+
+Parsing a pineappl grid (or a legacy text table) involves decompressing it and building
+the ``sigma`` dataframe, which can dominate the start-up time of short jobs. When the
+:py:class:`validphys.core.FKTableSpec` carries a ``cache_path`` (set by the
+loader according to the ``fktable_cache`` key in the nnprofile) the resulting
+:py:class:`validphys.coredata.FKTableData` is stored there in a binary format
+the first time it is loaded and memory-mapped from disk afterwards.
+The cache entries are keyed by the paths, size and modification time of the
+grids and cfactors, and by the theory metadata, so that they get automatically
+invalidated when any of the sources changes.
 """
 
+from concurrent.futures import ThreadPoolExecutor
 import dataclasses
 import functools
+import hashlib
 import io
+import logging
+import os
+import pathlib
+import pickle
+import shutil
 import tarfile
+import tempfile
 
 import numpy as np
 import pandas as pd
@@ -29,6 +47,11 @@ import pandas as pd
 from validphys.coredata import CFactorData, FKTableData
 from validphys.pineparser import pineappl_reader
 
+log = logging.getLogger(__name__)
+
+# Bump this number whenever the layout of the cache entries changes
+FKTABLE_CACHE_VERSION = 1
+
 
 class BadCFactorError(Exception):
     """Exception raised when an CFactor cannot be parsed correctly"""
@@ -53,8 +76,52 @@ def load_fktable(spec):
     """Load the data corresponding to a FKSpec object. The cfactors
     will be applied to the grid.
     If we have a new-type fktable, call directly `load()`, otherwise
-    fallback to the old parser
+    fallback to the old parser.
+
+    If the spec defines a ``cache_path``, the table will be read from
+    (or written to) the binary cache in that folder. This is also the case for
+    legacy tables, which are then only parsed (and decompressed) the first time.
     """
+    if spec.cache_path is None:
+        return _load_fktable(spec)
+
+    entry = pathlib.Path(spec.cache_path) / fktable_cache_key(spec)
+    if entry.exists():
+        try:
+            return read_fktable_cache(entry)
+        except Exception as e:
+            log.warning(f"Could not read cached FKTable from {entry}, parsing the grids again: {e}")
+
+    tabledata = _load_fktable(spec)
+    write_fktable_cache(tabledata, entry)
+    return tabledata
+
+
+def load_fktable_with_cuts(spec, cuts):
+    """Load the data corresponding to a FKSpec object keeping only the data points in ``cuts``,
+    equivalent to ``load_fktable(spec).with_cuts(cuts)``.
+
+    If the table is already in the binary cache only the rows of the selected data points
+    are read from the memory-mapped entry, so that the full table is never
+    materialised (nor kept in memory by the cache of :py:func:`load_fktable`).
+    """
+    if hasattr(cuts, "load"):
+        cuts = cuts.load()
+    if cuts is None or spec.cache_path is None:
+        return load_fktable(spec).with_cuts(cuts)
+
+    entry = pathlib.Path(spec.cache_path) / fktable_cache_key(spec)
+    if entry.exists():
+        try:
+            return read_fktable_cache(entry, cuts=cuts)
+        except Exception as e:
+            log.warning(f"Could not read cached FKTable from {entry}, parsing the grids again: {e}")
+    # The first time the full table needs to be parsed (and written to the cache)
+    return load_fktable(spec).with_cuts(cuts)
+
+
+def _load_fktable(spec):
+    """Parse the FKTable (and cfactors) pointed to by ``spec`` from the original files"""
     if spec.legacy:
         with open_fkpath(spec.fkpath) as handle:
             tabledata = parse_fktable(handle)
@@ -74,6 +141,163 @@ def load_fktable(spec):
     return tabledata.with_cfactor(cfprod)
 
 
+def _file_signature(path):
+    """Return the information used to detect whether a file has changed"""
+    path = pathlib.Path(path)
+    stat = path.stat()
+    return (path.absolute().as_posix(), stat.st_size, stat.st_mtime_ns)
+
+
+def fktable_cache_key(spec):
+    """Return the name of the cache entry for a given :py:class:`validphys.core.FKTableSpec`.
+
+    The key is a hash of the paths, size and modification time of all the grids and
+    cfactors that enter the table, together with its theory metadata,
+    so that a modification of any of them results in a different entry.
+    """
+    fkpaths = spec.fkpath if isinstance(spec.fkpath, (tuple, list)) else [spec.fkpath]
+    # For pineappl tables the cfactors are given as one list per grid
+    cfpaths = []
+    for cf in spec.cfactors:
+        cfpaths.extend(cf if isinstance(cf, (tuple, list)) else [cf])
+
+    to_be_hashed = [
+        FKTABLE_CACHE_VERSION,
+        [_file_signature(i) for i in fkpaths],
+        [_file_signature(i) for i in cfpaths],
+        repr(spec.metadata),
+    ]
+    return hashlib.sha256(repr(to_be_hashed).encode()).hexdigest()
+
+
+def write_fktable_cache(tabledata, entry):
+    """Write an :py:class:`validphys.coredata.FKTableData` into the folder ``entry``.
+
+    The ``sigma`` values and the codes of its index are stored as ``.npy`` files so that they
+    can be memory-mapped when read back, all other information is pickled.
+    The folder is first written to a temporary location and then moved in place,
+    such that several processes can populate the cache at the same time.
+    Failing to write the cache is not an error, but a warning is printed.
+    """
+    entry = pathlib.Path(entry)
+    sigma = tabledata.sigma
+    index = sigma.index
+    info = {
+        "hadronic": tabledata.hadronic,
+        "Q0": tabledata.Q0,
+        "ndata": tabledata.ndata,
+        "convolution_types": tabledata.convolution_types,
+        "metadata": tabledata.metadata,
+        "protected": tabledata.protected,
+        "index_names": list(index.names),
+        "index_levels": [np.asarray(level) for level in index.levels],
+        "columns": sigma.columns.to_numpy(),
+    }
+    try:
+        entry.parent.mkdir(parents=True, exist_ok=True)
+        tmp = pathlib.Path(tempfile.mkdtemp(dir=entry.parent, prefix=f".{entry.name}_"))
+        np.save(tmp / "sigma.npy", np.ascontiguousarray(sigma.to_numpy()))
+        np.save(tmp / "codes.npy", np.array(index.codes))
+        np.save(tmp / "xgrid.npy", np.asarray(tabledata.xgrid))
+        with open(tmp / "info.pkl", "wb") as f:
+            pickle.dump(info, f)
+    except Exception as e:
+        log.warning(f"Could not write FKTable cache to {entry.parent}: {e}")
+        return
+
+    try:
+        os.rename(tmp, entry)
+    except OSError:
+        # Most likely another process has already written the very same entry
+        shutil.rmtree(tmp, ignore_errors=True)
+
+
+def read_fktable_cache(entry, cuts=None):
+    """Read an :py:class:`validphys.coredata.FKTableData` written by
+    :py:func:`write_fktable_cache`. The ``sigma`` values are memory-mapped.
+
+    If ``cuts`` (a list of data indices) is given, only the rows of those data points
+    are read from the memory map. The result is then equal to
+    ``read_fktable_cache(entry).with_cuts(cuts)``.
+    """
+    entry = pathlib.Path(entry)
+    with open(entry / "info.pkl", "rb") as f:
+        info = pickle.load(f)
+    codes = np.load(entry / "codes.npy")
+    values = np.load(entry / "sigma.npy", mmap_mode="r")
+    ndata = info["ndata"]
+
+    if cuts is not None and not info["protected"]:
+        rows = _rows_for_data(info["index_levels"][0], codes[0], cuts)
+        codes = codes[:, rows]
+        # Fancy indexing copies only the selected rows out of the memory map
+        values = values[rows]
+        ndata = len(cuts)
+
+    index = pd.MultiIndex(
+        levels=info["index_levels"],
+        codes=list(codes),
+        names=info["index_names"],
+        verify_integrity=False,
+    )
+    sigma = pd.DataFrame(values, index=index, columns=info["columns"], copy=False)
+    return FKTableData(
+        hadronic=info["hadronic"],
+        Q0=info["Q0"],
+        ndata=ndata,
+        xgrid=np.load(entry / "xgrid.npy"),
+        sigma=sigma,
+        convolution_types=info["convolution_types"],
+        metadata=info["metadata"],
+        protected=info["protected"],
+    )
+
+
+def _rows_for_data(data_labels, data_codes, cuts):
+    """Return the positions of the rows with data index in ``cuts``, in the order of ``cuts``.
+    ``data_labels`` and ``data_codes`` are the level and codes of the data index of ``sigma``.
+    Raise a ``KeyError`` if any of the data points is not in the table.
+    """
+    label_codes = pd.Index(data_labels).get_indexer(np.asarray(cuts))
+    if (label_codes == -1).any():
+        raise KeyError(f"Data points not in the FKTable: {np.asarray(cuts)[label_codes == -1]}")
+    order = np.argsort(data_codes, kind="stable")
+    sorted_codes = data_codes[order]
+    starts = np.searchsorted(sorted_codes, label_codes, side="left")
+    ends = np.searchsorted(sorted_codes, label_codes, side="right")
+    return np.concatenate([order[i:j] for i, j in zip(starts, ends)] + [np.array([], dtype=int)])
+
+
+def load_fktables_parallel(dataset_specs, max_workers=None):
+    """Load the FKTables of all ``dataset_specs`` with their cuts applied using a pool of
+    ``max_workers`` threads (by default the :py:class:`concurrent.futures.ThreadPoolExecutor`
+    default). This is equivalent to calling ``fk.load_with_cuts(ds.cuts)``
+    for every ``fk`` in ``ds.fkspecs`` for every dataset, which is what each of the threads does,
+    so that the in-memory caches of the specs are populated as well.
+    Tables shared by several datasets (with the same cuts) are only loaded once.
+
+    Parameters
+    ----------
+    dataset_specs: list(validphys.core.DataSetSpec)
+        Datasets for which to load the fktables
+    max_workers: int
+        Maximum number of threads, if 1 the tables are loaded sequentially
+
+    Returns
+    -------
+    fktables: list(list(validphys.coredata.FKTableData))
+        For each dataset, the list of its FKTables with cuts
+    """
+    tasks = {(fk, ds.cuts): None for ds in dataset_specs for fk in ds.fkspecs}
+    if max_workers == 1 or len(tasks) <= 1:
+        loaded = {key: key[0].load_with_cuts(key[1]) for key in tasks}
+    else:
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            futures = {key: executor.submit(key[0].load_with_cuts, key[1]) for key in tasks}
+            loaded = {key: future.result() for key, future in futures.items()}
+    return [[loaded[(fk, ds.cuts)] for fk in ds.fkspecs] for ds in dataset_specs]
+
+
 def _get_compressed_buffer(path):
     archive = tarfile.open(path)
     members = archive.getmembers()
@@ -174,25 +398,26 @@ def _parse_xgrid(buf):
 # This used a different interface from segment parser because we want it to
 # be fast.
 # We assume it is going to be the last section.
-def _parse_hadronic_fast_kernel(f):
-    """Parse the FastKernel secrion of an hadronic FKTable into a DataFrame.
-    ``f`` should be a stream containing only the section"""
-    # Note that we need the slower whitespace here because it turns out
-    # that there are fktables where space and tab are used as separators
-    # within the same table.
-    df = pd.read_csv(f, sep=r'\s+', header=None, index_col=(0, 1, 2))
-    df.columns = list(range(14 * 14))
-    df.index.names = ['data', 'x1', 'x2']
-    return df
-
-
-def _parse_dis_fast_kernel(f):
-    """Parse the FastKernel section of a DIS FKTable into a DataFrame.
-    ``f`` should be a stream containing only the section"""
-    df = pd.read_csv(f, sep=r'\s+', header=None, index_col=(0, 1))
-    df.columns = list(range(14))
-    df.index.names = ['data', 'x']
-    return df
+def _parse_fast_kernel(f, hadronic, flavour_map):
+    """Parse the FastKernel section of an FKTable into a DataFrame with one column
+    per active flavour combination in ``flavour_map``.
+    ``f`` should be a stream containing only the section.
+
+    The section is read directly into a numpy array by the (chunked) C reader of
+    :py:func:`numpy.loadtxt`, converting only the columns of the active flavours and
+    without going through an intermediate DataFrame.
+    """
+    index_names = ['data', 'x1', 'x2'] if hadronic else ['data', 'x']
+    nindex = len(index_names)
+    flavours = np.flatnonzero(flavour_map.ravel())
+    # Note that whitespace is used as separator because there are fktables
+    # where space and tab are used within the same table.
+    try:
+        values = np.loadtxt(f, usecols=[*range(nindex), *(flavours + nindex)], ndmin=2)
+    except ValueError as e:
+        raise BadFKTableError(f"Could not parse the FastKernel section: {e}") from e
+    index = pd.MultiIndex.from_arrays(values[:, :nindex].astype(int).T, names=index_names)
+    return pd.DataFrame(values[:, nindex:], index=index, columns=flavours)
 
 
 def _parse_gridinfo(line_and_stream):
@@ -218,12 +443,8 @@ def _parse_header(lineno, header):
 
 
 def _build_sigma(f, res):
-    gi = res["GridInfo"]
-    fm = res["FlavourMap"]
-    table = _parse_hadronic_fast_kernel(f) if gi.hadronic else _parse_dis_fast_kernel(f)
-    # Filter out empty flavour indices
-    table = table.loc[:, fm.ravel()]
-    return table
+    # Empty flavour indices are filtered out while parsing
+    return _parse_fast_kernel(f, res["GridInfo"].hadronic, res["FlavourMap"])
 
 
 _KNOWN_SEGMENTS = {
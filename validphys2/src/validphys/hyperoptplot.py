@@ -9,6 +9,7 @@
 
 
 import glob
+import io
 import json
 import logging
 import os
@@ -29,6 +30,12 @@ log = logging.getLogger(__name__)
 regex_op = re.compile(r"[^\w^\.]+")
 regex_not_op = re.compile(r"[\w\.]+")
 
+# Columnar store of the parsed trials of a replica, see ``load_trial_table``
+TRIAL_TABLE_NAME = "tries_table"
+MAX_TABLE_PARTS = 8
+# State of the finished trials, as ``hyperopt.JOB_STATE_DONE``
+JOB_STATE_DONE = 2
+
 
 class HyperoptTrial:
     """
@@ -319,6 +326,12 @@ def parse_statistics(trial):
     # dict_out["std"] = std
     dict_out["hlosses"] = results["kfold_meta"]["hyper_losses"]
     dict_out["vlosses"] = results["kfold_meta"]["validation_losses"]
+
+    # Early termination of the trial, not available for older runs
+    dict_out["pruned"] = bool(results["kfold_meta"].get("pruned", False))
+    trained_epochs = results["kfold_meta"].get("trained_epochs")
+    dict_out["trained_epochs"] = np.nan if trained_epochs is None else np.sum(trained_epochs)
+    dict_out["max_epochs"] = results["kfold_meta"].get("max_epochs", np.nan)
     return dict_out
 
 
@@ -328,7 +341,7 @@ def parse_trial(trial):
     The goal of this function is to separate said branching so we can create hierarchies
     """
     # Is this a true trial?
-    if trial["state"] != 2:
+    if trial["state"] != JOB_STATE_DONE:
         return None
 
     data_dict = {}
@@ -367,6 +380,270 @@ def evaluate_trial(trial_dict, validation_multiplier, fail_threshold, loss_targe
     trial_dict["loss"] = loss
 
 
+def load_trials(json_path):
+    """
+    Reads the trials stored by ``n3fit`` in a ``tries.json`` file together with the ones appended,
+    since the file was last written, to the trial log (one trial per line) ``tries.jsonl``
+    in the same folder. Any of the two files can be missing.
+    Trials found in both files are read only once and the trials are returned sorted by ``tid``.
+
+    # Arguments:
+        - `json_path`: path of the ``tries.json`` file
+
+    # Returns:
+        - `trials`: list of trial dictionaries
+    """
+    json_path = str(json_path)
+    trials = {}
+    if os.path.exists(json_path):
+        with open(json_path, "r") as jlist:
+            for trial in json.load(jlist):
+                trials[trial["tid"]] = trial
+    log_path = os.path.splitext(json_path)[0] + ".jsonl"
+    if os.path.exists(log_path):
+        with open(log_path, "r") as jlines:
+            for line in jlines:
+                # A line can be incomplete if the scan was killed while writing it
+                try:
+                    trial = json.loads(line)
+                except json.JSONDecodeError:
+                    log.warning("Skipping an incomplete line of %s", log_path)
+                    continue
+                trials[trial["tid"]] = trial
+    return [trials[tid] for tid in sorted(trials)]
+
+
+def _column_array(values):
+    """Numpy array with the values of a column of the trial table,
+    columns which are not purely numerical are stored as arrays of objects"""
+    if all(isinstance(v, (bool, int, float, np.number, np.bool_)) for v in values):
+        return np.array(values)
+    column = np.empty(len(values), dtype=object)
+    column[:] = values
+    return column
+
+
+def _file_signature(path):
+    """Modification time and size of a file, None if it doesn't exist"""
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return [stat.st_mtime_ns, stat.st_size]
+
+
+def _table_row(trial):
+    """Row of the trial table for a finished ``trial``: the parsed information (as given by
+    ``parse_trial``), the ``tid`` and the minimal trial dictionary needed by ``HyperoptTrial``.
+    Trials which cannot be parsed only keep the latter"""
+    row = {
+        "_tid": trial["tid"],
+        "_trial": {
+            "misc": {"space_vals": trial["misc"].get("space_vals")},
+            "result": trial["result"],
+        },
+        "_parsed": False,
+    }
+    try:
+        row.update(parse_trial(trial))
+        row["_parsed"] = True
+    except (KeyError, TypeError) as e:
+        log.warning("Trial %s could not be parsed: %s", trial["tid"], e)
+    return row
+
+
+def _json_default(obj):
+    """Convert the numpy scalars which can appear in the parsed trials for ``json.dumps``"""
+    if isinstance(obj, np.generic):
+        return obj.item()
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+def _save_table_part(f, columns):
+    """Save the columns of a part of the trial table in the ``npz`` format,
+    the columns of objects are written at once as a JSON list, stored as an array of bytes,
+    so that the table can be read without unpickling"""
+    arrays = {}
+    for key, values in columns.items():
+        if values.dtype == object:
+            encoded = json.dumps(values.tolist(), default=_json_default).encode()
+            arrays[f"{key}.json"] = np.frombuffer(encoded, dtype=np.uint8)
+        else:
+            arrays[key] = values
+    np.savez(f, **arrays)
+
+
+def _read_table_part(path, exclude=()):
+    """Read the columns of a part of the trial table (see ``_save_table_part``)
+    but those in ``exclude``"""
+    with open(path, "rb") as f:
+        data = io.BytesIO(f.read())
+    columns = {}
+    with np.load(data, allow_pickle=False) as part:
+        for name in part.files:
+            key = name.removesuffix(".json")
+            if key in exclude:
+                continue
+            if name.endswith(".json"):
+                columns[key] = _column_array(json.loads(part[name].tobytes()))
+            else:
+                columns[key] = part[name]
+    return columns
+
+
+def _write_atomic(path, write):
+    """Write a file by calling ``write`` on a temporary file which is then moved to ``path``"""
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "wb") as f:
+        write(f)
+    os.replace(tmp_path, path)
+
+
+def _concatenate_parts(parts):
+    """Concatenate the columns of several parts of the trial table,
+    filling with None the columns missing in some of them"""
+    keys = list(dict.fromkeys(key for part in parts for key in part))
+    columns = {}
+    for key in keys:
+        values = []
+        for part in parts:
+            if key in part:
+                values.append(part[key])
+            else:
+                values.append(_column_array([None] * len(part["_tid"])))
+        if len({v.dtype for v in values}) == 1:
+            columns[key] = np.concatenate(values)
+        else:
+            columns[key] = _column_array([x for v in values for x in v.tolist()])
+    return columns
+
+
+def _first_trial(trials):
+    """Book time of the first trial of a scan, used to identify it"""
+    if not trials:
+        return None
+    return str(min(trials, key=lambda t: t["tid"]).get("book_time"))
+
+
+def load_trial_table(json_path, exclude=()):
+    """
+    Reads the finished trials of a ``tries.json`` file (and its trial log, see ``load_trials``)
+    into a columnar table with one entry per column: all the information given by
+    ``parse_trial`` and the internal columns ``_tid``, ``_parsed`` (whether ``parse_trial``
+    succeeded) and ``_trial`` (the slim trial dictionary accepted by ``HyperoptTrial``).
+
+    The table is stored in a ``tries_table`` folder next to the json file as a number of ``npz``
+    parts, together with an index of the files already ingested, so that later calls only parse
+    the trials added since (the lines appended to the trial log or, when the json file changed,
+    the trials of the json file not already in the table) and store them in a new part.
+    The parts are merged into one when there are more than ``MAX_TABLE_PARTS``.
+    Failing to write the table is not an error, but a warning is printed.
+
+    # Arguments:
+        - `json_path`: path of the ``tries.json`` file
+        - `exclude`: columns which are not to be read (``_tid`` is always read)
+
+    # Returns:
+        - `columns`: dictionary of numpy arrays, sorted by ``_tid``
+    """
+    json_path = str(json_path)
+    log_path = os.path.splitext(json_path)[0] + ".jsonl"
+    table_path = os.path.join(os.path.dirname(json_path), TRIAL_TABLE_NAME)
+    index_path = os.path.join(table_path, "index.json")
+    empty_index = {"json": None, "log_offset": 0, "first_trial": None, "parts": []}
+
+    stored_index = empty_index
+    parts = []
+    if os.path.exists(index_path):
+        try:
+            with open(index_path, "r") as f:
+                stored_index = json.load(f)
+            for part in stored_index["parts"]:
+                parts.append(_read_table_part(os.path.join(table_path, part), exclude))
+        except Exception as e:
+            log.warning(
+                "Could not read the trial table %s, parsing the trials again: %s", table_path, e
+            )
+            stored_index = empty_index
+            parts = []
+    index = dict(stored_index)
+    known_tids = {tid for part in parts for tid in part["_tid"].tolist()}
+
+    new_trials = []
+    json_signature = _file_signature(json_path)
+    if json_signature != index["json"]:
+        # The json file changed (or the trial log was compacted into it)
+        # so the log needs to be read again from the start
+        json_trials = []
+        if json_signature is not None:
+            with open(json_path, "r") as jlist:
+                json_trials = json.load(jlist)
+        # If the json file belongs to a different scan, start the table anew
+        first_trial = _first_trial(json_trials)
+        if index["first_trial"] is not None and first_trial != index["first_trial"]:
+            index = dict(empty_index)
+            parts = []
+            known_tids = set()
+        new_trials += json_trials
+        index.update(json=json_signature, log_offset=0)
+    if os.path.exists(log_path):
+        with open(log_path, "rb") as jlines:
+            jlines.seek(index["log_offset"])
+            for line in jlines:
+                # Stop at a line which is still being written
+                if not line.endswith(b"\n"):
+                    break
+                index["log_offset"] += len(line)
+                new_trials.append(json.loads(line))
+
+    new_rows = {}
+    for trial in new_trials:
+        if (
+            trial["state"] != JOB_STATE_DONE
+            or trial["tid"] in known_tids
+            or trial["tid"] in new_rows
+        ):
+            continue
+        new_rows[trial["tid"]] = _table_row(trial)
+    if new_rows and index["first_trial"] is None:
+        index["first_trial"] = _first_trial(new_trials)
+
+    if new_rows:
+        keys = list(dict.fromkeys(key for row in new_rows.values() for key in row))
+        new_part = {key: _column_array([row.get(key) for row in new_rows.values()]) for key in keys}
+        parts.append({key: values for key, values in new_part.items() if key not in exclude})
+    if new_rows or index != stored_index:
+        try:
+            os.makedirs(table_path, exist_ok=True)
+            part_names = list(index["parts"])
+            if new_rows:
+                part_names.append(f"part_{len(known_tids)}.npz")
+                part_path = os.path.join(table_path, part_names[-1])
+                _write_atomic(part_path, lambda f: _save_table_part(f, new_part))
+            # Merge all parts into one when there are too many of them
+            if len(part_names) > MAX_TABLE_PARTS:
+                all_parts = [_read_table_part(os.path.join(table_path, p)) for p in part_names]
+                merged = _concatenate_parts(all_parts)
+                part_names = [f"merged_{len(merged['_tid'])}.npz"]
+                _write_atomic(
+                    os.path.join(table_path, part_names[0]), lambda f: _save_table_part(f, merged)
+                )
+            index["parts"] = part_names
+            _write_atomic(index_path, lambda f: f.write(json.dumps(index).encode()))
+            # Remove the parts which are no longer in the index
+            for name in set(os.listdir(table_path)) - set(part_names) - {"index.json"}:
+                if name.endswith(".npz"):
+                    os.remove(os.path.join(table_path, name))
+        except OSError as e:
+            log.warning("Could not write the trial table %s: %s", table_path, e)
+
+    if not parts:
+        return {}
+    columns = _concatenate_parts(parts)
+    order = np.argsort(columns["_tid"], kind="stable")
+    return {key: values[order] for key, values in columns.items()}
+
+
 def generate_dictionary(
     replica_path,
     loss_target,
@@ -387,20 +664,22 @@ def generate_dictionary(
     """
     filename = "{0}/{1}".format(replica_path, json_name)
 
-    # Open the file and reads it as a json
-    with open(filename, "r") as jlist:
-        input_trials = json.load(jlist)
-
-    # Read all trials and create a list of dictionaries
-    # which can be turn into a dataframe
+    # Read the trials (already parsed) from the trial table
+    columns = load_trial_table(filename, exclude=("_trial",))
+    if not columns:
+        return []
+    parsed = columns["_parsed"].astype(bool)
+    public_columns = {k: v[parsed].tolist() for k, v in columns.items() if not k.startswith("_")}
+    # Keep track of the maximum number of layers as parse_architecture does
+    if public_columns.get(KEYWORDS["nl"]):
+        KEYWORDS["max_layers"] = max(KEYWORDS["max_layers"], *public_columns[KEYWORDS["nl"]])
+
+    # Create a list of dictionaries which can be turn into a dataframe
     all_trials = []
-    for tid, trial in enumerate(input_trials):
-        index = starting_index + tid
-        trial_dict = parse_trial(trial)
-        if trial_dict is None:
-            continue
+    for tid, values in zip(columns["_tid"][parsed].tolist(), zip(*public_columns.values())):
+        trial_dict = dict(zip(public_columns, values))
         evaluate_trial(trial_dict, val_multiplier, fail_threshold, loss_target)
-        trial_dict[KEYWORDS["id"]] = index
+        trial_dict[KEYWORDS["id"]] = starting_index + tid
         all_trials.append(trial_dict)
 
     return all_trials
@@ -477,8 +756,10 @@ def hyperopt_dataframe(commandline_args):
 
     filter_functions = [filter_by_string(filter_me) for filter_me in args.filter]
 
-    search_str = f"{args.hyperopt_folder}/nnfit/replica_*/tries.json"
-    all_json = glob.glob(search_str)
+    # Look for both the json files and the trial logs, the latter can be alone during a scan
+    replicas_str = f"{args.hyperopt_folder}/nnfit/replica_*"
+    found = glob.glob(f"{replicas_str}/tries.json") + glob.glob(f"{replicas_str}/tries.jsonl")
+    all_json = sorted({os.path.join(os.path.dirname(path), "tries.json") for path in found})
     starting_index = 0
     all_replicas = []
     for i, json_path in enumerate(all_json):
@@ -495,7 +776,9 @@ def hyperopt_dataframe(commandline_args):
         # Check if we are playing combinations,
         # if we do keep reading json until we consume all of them
         if args.combine:
-            starting_index += len(dictionaries)
+            # The ids are offset by the tids, which can skip the trials that didn't finish
+            if dictionaries:
+                starting_index = max(d[KEYWORDS["id"]] for d in dictionaries) + 1
             all_replicas += dictionaries
             # If this is not the last one, continue
             if (i + 1) == len(all_json):
@@ -590,6 +873,27 @@ def hyperopt_table(hyperopt_dataframe):
     return dataframe
 
 
+@table
+def pruning_table(hyperopt_dataframe):
+    """
+    Generates a table with the number of trials and epochs trained for the trials which were
+    completed and the ones which were pruned, together with the fraction of the maximum number
+    of epochs (all epochs for all folds) that was actually trained.
+    Pruned trials are failures, so they are only included with ``--include_failures``.
+    """
+    dataframe, _ = hyperopt_dataframe
+    rows = {}
+    for name, selection in [("completed", ~dataframe["pruned"]), ("pruned", dataframe["pruned"])]:
+        trials = dataframe[selection]
+        rows[name] = {
+            "trials": len(trials),
+            "trained epochs": trials["trained_epochs"].sum(),
+            "fraction of epochs trained": trials["trained_epochs"].sum()
+            / trials["max_epochs"].sum(),
+        }
+    return pd.DataFrame(rows).T
+
+
 @figure
 def plot_iterations(hyperopt_dataframe):
     """
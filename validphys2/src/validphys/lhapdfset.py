@@ -26,15 +26,86 @@
     5: 6.922722705177504e-05,
     21: 0.007604124516892057}
 """
+from collections import OrderedDict
 import logging
+import os
 
 import numpy as np
 
+from validphys.lhaindex import infofilename
 from validphys.lhapdf_compatibility import make_pdf
 
 log = logging.getLogger(__name__)
 
 
+class GridValuesCache:
+    """Least-recently-used cache for the output of :py:meth:`LHAPDFSet.grid_values`,
+    shared by all sets. The entries are evicted once the total size of the cached
+    arrays is above ``max_bytes``. Setting ``max_bytes`` to 0 disables the cache.
+
+    Since almost all FKTables in a theory share the same x-grid and Q0, this ensures that
+    LHAPDF is only called once per distinct grid when computing predictions for many datasets.
+    """
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._nbytes = 0
+
+    @staticmethod
+    def make_key(name, version, error_type, flavors, xgrid, qgrid):
+        """The arrays are included in the key as raw bytes, together with their dtype.
+        The ``version`` of the set (see :py:func:`set_version`) tells apart sets
+        with the same name written to disk within the same process"""
+        return (
+            name,
+            version,
+            error_type,
+            tuple(flavors),
+            (xgrid.dtype.str, xgrid.tobytes()),
+            (qgrid.dtype.str, qgrid.tobytes()),
+        )
+
+    def get(self, key):
+        """Return a copy of the cached array, or None if it is not in the cache"""
+        try:
+            value = self._entries[key]
+        except KeyError:
+            return None
+        self._entries.move_to_end(key)
+        return value.copy()
+
+    def put(self, key, value):
+        if key in self._entries or value.nbytes > self.max_bytes:
+            return
+        self._entries[key] = value.copy()
+        self._nbytes += value.nbytes
+        while self._nbytes > self.max_bytes:
+            _, evicted = self._entries.popitem(last=False)
+            self._nbytes -= evicted.nbytes
+
+    def clear(self):
+        self._entries.clear()
+        self._nbytes = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+
+# Evaluations of grid_values are kept in memory up to 1 GB
+grid_values_cache = GridValuesCache(max_bytes=2**30)
+
+
+def set_version(name):
+    """Modification time and size of the info file of the set ``name``,
+    or None if it cannot be found"""
+    try:
+        stat = os.stat(infofilename(name))
+    except OSError:
+        return None
+    return (stat.st_mtime_ns, stat.st_size)
+
+
 class LHAPDFSet:
     """Wrapper for the lhapdf python interface.
 
@@ -96,6 +167,10 @@ class LHAPDFSet:
         flavours, points in x and pointx in q
         The return shape is
             (members, flavors, xgrid, qgrid)
+
+        The results are memoised in ``grid_values_cache``, keyed by the name, version on disk
+        and error type of the set together with the flavours and grids requested.
+
         Return
         ------
             ndarray of shape (members, flavors, xgrid, qgrid)
@@ -110,9 +185,19 @@ class LHAPDFSet:
         >>> flavs[4] = 21
         >>> results = pdf.grid_values(flavs, xgrid, qgrid)
         """
+        # The version is read at every call since the set can be written again to disk
+        version = set_version(self._name)
+        key = grid_values_cache.make_key(
+            self._name, version, self._error_type, flavors, xgrid, qgrid
+        )
+        if (cached := grid_values_cache.get(key)) is not None:
+            return cached
+
         # Create an array of x and q of equal length for LHAPDF
         xarr, qarr = (g.ravel() for g in np.meshgrid(xgrid, qgrid))
         # Ask LHAPDF for the values and swap the flavours and xgrid-qgrid axes
         raw = np.array([member.xfxQ(flavors, xarr, qarr) for member in self.members]).swapaxes(1, 2)
         # Unroll the xgrid-qgrid axes
-        return raw.reshape(self.n_members, len(flavors), len(xgrid), len(qgrid))
+        ret = raw.reshape(self.n_members, len(flavors), len(xgrid), len(qgrid))
+        grid_values_cache.put(key, ret)
+        return ret
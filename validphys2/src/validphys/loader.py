@@ -275,6 +275,18 @@ class LoaderBase:
                 raise LoaderError("Could not create the cache directory " f"at {vpcache}") from e
         return vpcache
 
+    def _fktable_cache(self):
+        """Return the folder where parsed FKTables are cached, within the vp-cache.
+        Returns None if the cache has been disabled with ``fktable_cache: false``
+        in the nnprofile or if the vp-cache is not available."""
+        if not self.nnprofile.get("fktable_cache", True):
+            return None
+        try:
+            return self._vp_cache() / "fktables"
+        except (KeyError, LoaderError) as e:
+            log.warning(f"The FKTable cache will not be used: {e}")
+            return None
+
 
 # TODO: Deprecate get methods?
 class Loader(LoaderBase):
@@ -555,7 +567,7 @@ In order to upgrade it you need to use the script `vp-rebuild-data` with a versi
             )
 
         cfactors = self.check_cfactor(theoryID, setname, cfac)
-        return FKTableSpec(fkpath, cfactors)
+        return FKTableSpec(fkpath, cfactors, cache_path=self._fktable_cache())
 
     def check_fk_from_theory_metadata(self, theory_metadata, theoryID, cfac=None):
         """Load a pineappl fktable in the new commondata forma
@@ -568,9 +580,10 @@ In order to upgrade it you need to use the script `vp-rebuild-data` with a versi
         theory = self.check_theoryID(theoryID)
         fklist = theory_metadata.fktables_to_paths(theory.path / "fastkernel")
         op = theory_metadata.operation
+        cache_path = self._fktable_cache()
 
         if not cfac or cfac is None:
-            fkspecs = [FKTableSpec(i, None, theory_metadata) for i in fklist]
+            fkspecs = [FKTableSpec(i, None, theory_metadata, cache_path) for i in fklist]
             return fkspecs, op
 
         cfactors = []
@@ -578,7 +591,7 @@ In order to upgrade it you need to use the script `vp-rebuild-data` with a versi
             tmp = [self.check_cfactor(theoryID, fkname, cfac) for fkname in operand]
             cfactors.append(tuple(tmp))
 
-        fkspecs = [FKTableSpec(i, c, theory_metadata) for i, c in zip(fklist, cfactors)]
+        fkspecs = [FKTableSpec(i, c, theory_metadata, cache_path) for i, c in zip(fklist, cfactors)]
         return fkspecs, theory_metadata.operation
 
     def check_compound(self, theoryID, setname, cfac):
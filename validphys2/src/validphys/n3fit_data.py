@@ -12,11 +12,17 @@ import logging
 
 import numpy as np
 import pandas as pd
+import scipy.linalg as la
 
 from reportengine import collect
 from reportengine.table import table
 from validphys.core import IntegrabilitySetSpec, TupleComp
-from validphys.n3fit_data_utils import validphys_group_extractor
+from validphys.covmats_utils import CovmatCache
+from validphys.n3fit_data_utils import (
+    FKTABLE_STORE_FOLDER,
+    validphys_group_extractor,
+    write_fktable_store,
+)
 
 log = logging.getLogger(__name__)
 
@@ -51,6 +57,16 @@ def replica_mcseed(replica, mcseed, genrep):
     return res
 
 
+def replica_mcseeds(replicas, mcseed, genrep):
+    """Generates the ``mcseed`` for all ``replicas`` at once, the result is the same as
+    calling :py:func:`replica_mcseed` for each of them."""
+    if not genrep:
+        return None
+    np.random.seed(seed=mcseed)
+    seeds = [np.random.randint(0, pow(2, 31)) for _ in range(max(replicas, default=0))]
+    return [seeds[replica - 1] for replica in replicas]
+
+
 def replica_luxseed(replica, luxseed):
     """Generate the ``luxseed`` for a ``replica``.
     Identical to replica_nnseed but used for a different purpose.
@@ -180,14 +196,85 @@ def kfold_masks(kpartitions, data):
     return list_folds
 
 
+class CovmatFactorization:
+    """Factorisations of a covariance matrix which are shared by all the replicas
+    of a fit: the inverse, the eigendecomposition and the inverses of the submatrices
+    selected by the training/validation masks.
+    All of them are computed lazily, only once and then cached.
+
+    The inverse of a (large) submatrix is obtained from the inverse of the full covmat,
+    ``P = C^{-1}``, as the Schur complement ``P_SS - P_SR P_RR^{-1} P_RS`` where ``R``
+    is the complement of the selection ``S``, so that only the (small) block ``P_RR``
+    needs to be factorised.
+    """
+
+    # Number of masked inverses to keep, with the same trvlseed for all replicas only one is needed
+    max_masked_inverses = 4
+
+    def __init__(self, covmat):
+        self.covmat = covmat
+        self._masked_inverses = {}
+
+    @functools.cached_property
+    def inverse(self):
+        return np.linalg.inv(self.covmat)
+
+    @functools.cached_property
+    def eigh(self):
+        return np.linalg.eigh(self.covmat)
+
+    def masked_inverse(self, mask):
+        """Return the inverse of ``covmat[mask].T[mask]``"""
+        key = mask.tobytes()
+        if key not in self._masked_inverses:
+            if len(self._masked_inverses) >= self.max_masked_inverses:
+                self._masked_inverses.pop(next(iter(self._masked_inverses)))
+            self._masked_inverses[key] = self._compute_masked_inverse(mask)
+        return self._masked_inverses[key]
+
+    def _compute_masked_inverse(self, mask):
+        ndata = np.count_nonzero(mask)
+        # If the selection is small it is cheaper to invert it directly
+        if ndata <= mask.size - ndata:
+            return np.linalg.inv(self.covmat[np.ix_(mask, mask)])
+        inverse = self.inverse
+        rest = ~mask
+        p_ss = inverse[np.ix_(mask, mask)]
+        if ndata == mask.size:
+            return p_ss
+        p_rs = inverse[np.ix_(rest, mask)]
+        # P_RR is positive definite, being a diagonal block of the inverse of the covmat
+        p_rr_factor = la.cho_factor(inverse[np.ix_(rest, rest)])
+        return p_ss - p_rs.T @ la.cho_solve(p_rr_factor, p_rs)
+
+
+# Factorisations of the covariance matrices used in the fit, each of them holds at most
+# the covmat, its inverse, its eigenvectors and the masked inverses
+_covmat_factorizations = CovmatCache(
+    CovmatFactorization, max_bytes=2**31, size_factor=3 + CovmatFactorization.max_masked_inverses
+)
+
+
+def covmat_factorization(covmat):
+    """Return the (cached) :py:class:`CovmatFactorization` of ``covmat``.
+    The factorisation is identified by the content of the covmat so that it is shared
+    by all the replicas fitted in the same process, either in parallel or sequentially.
+    """
+    return _covmat_factorizations(covmat)
+
+
 @functools.lru_cache
-def fittable_datasets_masked(data, tr_masks):
+def fittable_datasets_masked(data, tr_masks, maxcores=None, fktable_store_path=None):
     """Generate a list of :py:class:`validphys.n3fit_data_utils.FittableDataSet`
-    from a group of dataset and the corresponding training/validation masks
+    from a group of dataset and the corresponding training/validation masks.
+    The fktables are loaded concurrently by up to ``maxcores`` threads.
+    If ``fktable_store_path`` is given, the fktable tensors are memory-mapped from there.
     """
     # This is separated from fitting_data_dict so that we can cache the result
     # when the trvlseed is the same for all replicas (great for parallel replicas)
-    return validphys_group_extractor(data.datasets, tr_masks.masks)
+    return validphys_group_extractor(
+        data.datasets, tr_masks.masks, max_workers=maxcores, store_path=fktable_store_path
+    )
 
 
 def fitting_data_dict(
@@ -199,10 +286,16 @@ def fitting_data_dict(
     kfold_masks,
     fittable_datasets_masked,
     diagonal_basis=None,
+    cholesky_loss=False,
 ):
     """
     Provider which takes  the information from validphys ``data``.
 
+    If ``cholesky_loss`` is set, the covariance matrices are not inverted here,
+    instead the chi2 of the fit is computed from their Cholesky factor
+    (see :py:class:`n3fit.layers.losses.LossCholesky`) and all the inverse
+    covariance matrices in the output are None.
+
     Returns
     -------
     all_dict_out: dict
@@ -221,6 +314,8 @@ def fitting_data_dict(
             inverse of the covmat (non-replica)
         'trmask'
             mask for the training data
+        'covmat_tr'
+            covmat for the training data
         'invcovmat'
             inverse of the covmat for the training data
         'ndata'
@@ -229,6 +324,8 @@ def fitting_data_dict(
             experimental data (replica'd) for training
         'vlmask'
             (same as above for validation)
+        'covmat_vl'
+            (same as above for validation)
         'invcovmat_vl'
             (same as above for validation)
         'ndata_vl'
@@ -239,6 +336,8 @@ def fitting_data_dict(
             bool - is this a positivity set?
         'count_chi2'
             should this be counted towards the chi2
+        'cholesky_loss'
+            bool - whether the chi2 should be computed from the Cholesky factor of the covmats
     """
     # TODO: Plug in the python data loading when available. Including but not
     # limited to: central values, ndata, replica generation, covmat construction
@@ -247,12 +346,14 @@ def fitting_data_dict(
     expdata = make_replica
     tr_masks = tr_masks.masks
     covmat = dataset_inputs_fitting_covmat  # t0 covmat, or theory covmat or whatever was decided by the runcard
-    inv_true = np.linalg.inv(covmat)
     fittable_datasets = fittable_datasets_masked
 
+    # The factorisations of the covmat are shared by all replicas, only the masks change
+    factorization = covmat_factorization(covmat)
+
     if diagonal_basis:
         log.info("working in diagonal basis.")
-        eig, v = np.linalg.eigh(covmat)
+        eig, v = factorization.eigh
         dt_trans = v.T
     else:
         dt_trans = None
@@ -266,20 +367,27 @@ def fitting_data_dict(
         expdata = np.matmul(dt_trans, expdata)
         # make a 1d array of the diagonal
         covmat_tr = eig[tr_mask]
-        invcovmat_tr = 1.0 / covmat_tr
-
         covmat_vl = eig[vl_mask]
-        invcovmat_vl = 1.0 / covmat_vl
 
         # prepare a masking rotation
         dt_trans_tr = dt_trans[tr_mask]
         dt_trans_vl = dt_trans[vl_mask]
     else:
         covmat_tr = covmat[tr_mask].T[tr_mask]
-        invcovmat_tr = np.linalg.inv(covmat_tr)
-
         covmat_vl = covmat[vl_mask].T[vl_mask]
-        invcovmat_vl = np.linalg.inv(covmat_vl)
+
+    if cholesky_loss:
+        inv_true = invcovmat_tr = invcovmat_vl = None
+    else:
+        inv_true = factorization.inverse
+        if diagonal_basis:
+            invcovmat_tr = 1.0 / covmat_tr
+            invcovmat_vl = 1.0 / covmat_vl
+        else:
+            invcovmat_tr = factorization.masked_inverse(tr_mask)
+            invcovmat_vl = factorization.masked_inverse(vl_mask)
+        # The covmats of the training and validation are only needed by the Cholesky loss
+        covmat_tr = covmat_vl = None
 
     ndata_tr = np.count_nonzero(tr_mask)
     expdata_tr = expdata[tr_mask].reshape(1, ndata_tr)
@@ -307,15 +415,18 @@ def fitting_data_dict(
         "invcovmat_true": inv_true,
         "covmat": covmat,
         "trmask": tr_mask,
+        "covmat_tr": covmat_tr,
         "invcovmat": invcovmat_tr,
         "ndata": ndata_tr,
         "expdata": expdata_tr,
         "vlmask": vl_mask,
+        "covmat_vl": covmat_vl,
         "invcovmat_vl": invcovmat_vl,
         "ndata_vl": ndata_vl,
         "expdata_vl": expdata_vl,
         "positivity": False,
         "count_chi2": True,
+        "cholesky_loss": cholesky_loss,
         "folds": folds,
         "data_transformation_tr": dt_trans_tr,
         "data_transformation_vl": dt_trans_vl,
@@ -342,13 +453,13 @@ def replica_nnseed_fitting_data_dict(replica, exps_fitting_data_dict, replica_nn
 
 
 replicas_nnseed_fitting_data_dict = collect("replica_nnseed_fitting_data_dict", ("replicas",))
-groups_replicas_indexed_make_replica = collect(
-    "indexed_make_replica", ("replicas", "group_dataset_inputs_by_experiment")
+groups_indexed_make_replicas = collect(
+    "indexed_make_replicas", ("group_dataset_inputs_by_experiment",)
 )
 
 
 @table
-def pseudodata_table(groups_replicas_indexed_make_replica, replicas):
+def pseudodata_table(groups_indexed_make_replicas, replicas):
     """Creates a pandas DataFrame containing the generated pseudodata. The
     index is :py:func:`validphys.results.experiments_index` and the columns
     are the replica numbers.
@@ -360,20 +471,10 @@ def pseudodata_table(groups_replicas_indexed_make_replica, replicas):
     replicas are fitted one at a time. The table can be found in the replica
     folder i.e. <fit dir>/nnfit/replica_*/
     """
-    # groups_replicas_indexed_make_replica is collected over both replicas and dataset_input groups,
-    # in that order. What this means is that groups_replicas_indexed_make_replica is a list of size
-    # number_of_replicas x number_of_data_groups. Where the ordering inside the list is as follows:
-    # [data1_rep1, data2_rep1, ..., datan_rep1, ..., data1_repn, data2_repn, ..., datan_repn].
-
-    # To correctly put this into a single dataframe, we first need to know the number of
-    # dataset_input groups there are for each replica
-    groups_per_replica = len(groups_replicas_indexed_make_replica) // len(replicas)
-    # then we make a list of pandas dataframes, each containing the pseudodata of all datasets
-    # generated for a single replica
-    df = [
-        pd.concat(groups_replicas_indexed_make_replica[i : i + groups_per_replica])
-        for i in range(0, len(groups_replicas_indexed_make_replica), groups_per_replica)
-    ]
+    # groups_indexed_make_replicas contains, for each dataset_input group, the list of
+    # the pseudodata of all replicas, which are generated at once for each group.
+    # First we concatenate the groups for each replica
+    df = [pd.concat(replica_groups) for replica_groups in zip(*groups_indexed_make_replicas)]
     # then we concatentate the pseudodata of all replicas into a single dataframe
     df = pd.concat(df, axis=1)
     # and finally we add as column titles the replica name
@@ -519,7 +620,7 @@ def training_mask(replicas_training_mask):
     return pd.concat(replicas_training_mask, axis=1)
 
 
-def _fitting_lagrange_dict(lambdadataset):
+def _fitting_lagrange_dict(lambdadataset, fktable_store_path=None):
     """Loads a generic lambda dataset, often used for positivity and integrability datasets
     For more information see :py:func:`validphys.n3fit_data_utils.positivity_reader`.
 
@@ -527,6 +628,8 @@ def _fitting_lagrange_dict(lambdadataset):
     ----------
     lambdadataset: validphys.core.LagrangeSetSpec
         Positivity (or integrability) set which is to be loaded.
+    fktable_store_path: pathlib.Path
+        fktable store from which the tensors are memory-mapped, if any
 
     Examples
     --------
@@ -536,13 +639,21 @@ def _fitting_lagrange_dict(lambdadataset):
     >>> len(pos)
     9
     """
+    positivity_datasets = validphys_group_extractor(
+        [lambdadataset], [], store_path=fktable_store_path
+    )
+    return _lagrange_dict(lambdadataset, positivity_datasets[0])
+
+
+def _lagrange_dict(lambdadataset, fittable_dataset):
+    """Dictionary of a lambda dataset, as returned by :py:func:`_fitting_lagrange_dict`,
+    for its already loaded :py:class:`validphys.n3fit_data_utils.FittableDataSet`"""
     integrability = isinstance(lambdadataset, IntegrabilitySetSpec)
     mode = "integrability" if integrability else "positivity"
     log.info("Loading %s dataset %s", mode, lambdadataset)
-    positivity_datasets = validphys_group_extractor([lambdadataset], [])
-    ndata = positivity_datasets[0].ndata
+    ndata = fittable_dataset.ndata
     return {
-        "datasets": positivity_datasets,
+        "datasets": [fittable_dataset],
         "trmask": np.ones(ndata, dtype=bool),
         "name": lambdadataset.name,
         "expdata": np.zeros((1, ndata)),
@@ -554,7 +665,7 @@ def _fitting_lagrange_dict(lambdadataset):
     }
 
 
-def posdatasets_fitting_pos_dict(posdatasets=None):
+def posdatasets_fitting_pos_dict(posdatasets=None, maxcores=None, fktable_store_path=None):
     """Loads all positivity datasets. It is not allowed to be empty.
 
     Parameters
@@ -563,15 +674,23 @@ def posdatasets_fitting_pos_dict(posdatasets=None):
         list containing the settings for the positivity sets. Examples of
         these can be found in the runcards located in n3fit/runcards. They have
         a format similar to ``dataset_input``.
+    maxcores: int
+        maximum number of threads used to load the fktables
+    fktable_store_path: pathlib.Path
+        fktable store from which the tensors are memory-mapped, if any
     """
     if posdatasets is not None:
-        return [_fitting_lagrange_dict(i) for i in posdatasets]
+        # Load the tables of all the sets at once
+        fittable_datasets = validphys_group_extractor(
+            posdatasets, [], max_workers=maxcores, store_path=fktable_store_path
+        )
+        return [_lagrange_dict(i, fd) for i, fd in zip(posdatasets, fittable_datasets)]
     log.warning("Not using any positivity datasets.")
     return None
 
 
 # can't use collect here because integdatasets might not exist.
-def integdatasets_fitting_integ_dict(integdatasets=None):
+def integdatasets_fitting_integ_dict(integdatasets=None, maxcores=None, fktable_store_path=None):
     """Loads the integrability datasets. Calls same function as
     :py:func:`fitting_pos_dict`, except on each element of
     ``integdatasets`` if ``integdatasets`` is not None.
@@ -582,6 +701,10 @@ def integdatasets_fitting_integ_dict(integdatasets=None):
         list containing the settings for the integrability sets. Examples of
         these can be found in the runcards located in n3fit/runcards. They have
         a format similar to ``dataset_input``.
+    maxcores: int
+        maximum number of threads used to load the fktables
+    fktable_store_path: pathlib.Path
+        fktable store from which the tensors are memory-mapped, if any
 
     Examples
     --------
@@ -596,6 +719,22 @@ def integdatasets_fitting_integ_dict(integdatasets=None):
 
     """
     if integdatasets is not None:
-        return [_fitting_lagrange_dict(i) for i in integdatasets]
+        fittable_datasets = validphys_group_extractor(
+            integdatasets, [], max_workers=maxcores, store_path=fktable_store_path
+        )
+        return [_lagrange_dict(i, fd) for i, fd in zip(integdatasets, fittable_datasets)]
     log.warning("Not using any integrability datasets.")
     return None
+
+
+def write_fktable_store_action(
+    output_path, data, posdatasets=None, integdatasets=None, maxcores=None
+):
+    """Write the dense fktable tensors of all the datasets used in the fit to the
+    ``fktables`` folder of the fit, see :py:func:`validphys.n3fit_data_utils.write_fktable_store`.
+    This is run by ``vp-setupfit`` when ``fktable_store`` is set to true in the runcard,
+    the replicas of the fit will then memory-map the tensors instead of computing them.
+    """
+    store_path = output_path / FKTABLE_STORE_FOLDER
+    datasets = list(data.datasets) + list(posdatasets or []) + list(integdatasets or [])
+    write_fktable_store(store_path, datasets, max_workers=maxcores)
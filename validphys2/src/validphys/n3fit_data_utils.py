@@ -6,12 +6,55 @@ and extracts the relevant information into :py:class:`validphys.n3fit_data_utils
 
 The ``validphys_group_extractor`` will loop over every dataset of a given group
 loading their fktables (and applying any necessary cuts).
+
+The dense fktable tensors can also be written once to a folder of ``.npy`` files
+with :py:func:`write_fktable_store` (this is done by ``vp-setupfit`` when
+``fktable_store`` is set in the runcard). All fits reading from the store memory-map
+the tensors copy-on-write and, since the tensors are never modified, the n3fit layers
+running on CPU use the mapped memory directly, so that parallel processes
+share the same physical pages.
 """
 import dataclasses
+import hashlib
 from itertools import zip_longest
+import logging
+import os
+import pathlib
+import tempfile
 
 import numpy as np
 
+from validphys.fkparser import load_fktables_parallel
+
+log = logging.getLogger(__name__)
+
+FKTABLE_STORE_FOLDER = "fktables"
+
+
+def fktable_store_file(store_path, dataset_name, index, kind="fktable"):
+    """Path of the ``index``-th fktable tensor of ``dataset_name`` within the store.
+    With ``kind="key"`` return instead the path of the content key of the table
+    (see :py:func:`fktable_content_key`).
+    """
+    suffix = "" if kind == "fktable" else f"_{kind}"
+    return pathlib.Path(store_path) / f"{dataset_name}_{index}{suffix}.npy"
+
+
+def fktable_content_key(fkdata):
+    """Hash of the content of a :py:class:`validphys.coredata.FKTableData`
+    (with cuts and cfactors already applied), which determines its dense tensor.
+    Unlike :py:func:`validphys.fkparser.fktable_cache_key` it does not depend on where
+    or when the table was read, so that the same store can be used from any node.
+    """
+    sigma = fkdata.sigma
+    key = hashlib.sha256()
+    key.update(repr((fkdata.hadronic, sigma.shape, list(sigma.columns))).encode())
+    key.update(np.ascontiguousarray(fkdata.xgrid, dtype=float))
+    for level in range(sigma.index.nlevels):
+        key.update(np.ascontiguousarray(sigma.index.get_level_values(level), dtype=np.int64))
+    key.update(np.ascontiguousarray(sigma.to_numpy(), dtype=float))
+    return key.hexdigest()
+
 
 @dataclasses.dataclass
 class FittableDataSet:
@@ -31,6 +74,11 @@ class FittableDataSet:
             fraction of the data to enter the training set
         training_mask: bool
             training mask to apply to the fktable
+        store_path: pathlib.Path
+            folder written by :py:func:`write_fktable_store` from which the fktable
+            tensors are memory-mapped, if None they are computed from ``fktables_data``.
+            The entries of the store are only used if their content key
+            (see :py:func:`fktable_content_key`) is the one of ``fktables_data``
     """
 
     name: str
@@ -40,14 +88,19 @@ class FittableDataSet:
     operation: str = "NULL"
     frac: float = 1.0
     training_mask: np.ndarray = None  # boolean array
+    store_path: pathlib.Path = None
 
     def __post_init__(self):
-        self._tr_mask = None
-        self._vl_mask = None
+        self._tr_rows = None
+        self._vl_rows = None
+        self._fktables = None
         if self.training_mask is not None:
+            # Positions of the training and validation points in the rows of the fktable
+            # tensors, which are sorted by data index
             data_idx = self.fktables_data[0].sigma.index.get_level_values(0).unique()
-            self._tr_mask = data_idx[self.training_mask].values
-            self._vl_mask = data_idx[~self.training_mask].values
+            sorted_idx = np.sort(data_idx.values)
+            self._tr_rows = np.searchsorted(sorted_idx, np.sort(data_idx[self.training_mask]))
+            self._vl_rows = np.searchsorted(sorted_idx, np.sort(data_idx[~self.training_mask]))
 
     @property
     def ndata(self):
@@ -60,23 +113,104 @@ class FittableDataSet:
         return self.fktables_data[0].hadronic
 
     def fktables(self):
-        """Return the list of fktable tensors for the dataset"""
-        return [fk.get_np_fktable() for fk in self.fktables_data]
+        """Return the list of fktable tensors for the dataset.
+        If the dataset has a ``store_path`` the tensors are copy-on-write memory maps.
+        The tensors are computed only once, so they must not be modified.
+        """
+        if self._fktables is None:
+            if self.store_path is None:
+                self._fktables = [fk.get_np_fktable() for fk in self.fktables_data]
+            else:
+                self._fktables = [
+                    self._stored_fktable(i, fk) for i, fk in enumerate(self.fktables_data)
+                ]
+        return self._fktables
+
+    def _stored_fktable(self, index, fkdata):
+        """Memory-map the ``index``-th fktable tensor from the store, falling back to
+        computing it if the files are missing or do not correspond to ``fkdata``"""
+        path = fktable_store_file(self.store_path, self.name, index)
+        try:
+            # Copy-on-write, so that the mapped memory can be used by the n3fit layers
+            fktable = np.load(path, mmap_mode="c")
+            key = str(np.load(fktable_store_file(self.store_path, self.name, index, "key")))
+        except (OSError, ValueError) as e:
+            log.warning(f"Could not read {path} from the fktable store: {e}")
+            return fkdata.get_np_fktable()
+        if key != fktable_content_key(fkdata):
+            log.warning(
+                f"The fktable store entry {path} does not correspond to the loaded fktable, "
+                "ignoring it. Rerun vp-setupfit to update the store."
+            )
+            return fkdata.get_np_fktable()
+        return fktable
+
+    def _masked_fktables(self, rows):
+        """Select the given ``rows`` of the fktable tensors.
+        As in :py:meth:`validphys.coredata.FKTableData.with_cuts`, protected tables
+        (such as the one-point normalisation of a RATIO dataset) are not masked,
+        and neither is any tensor which doesn't have one row per datapoint"""
+        masked = []
+        for fk, fkdata in zip(self.fktables(), self.fktables_data):
+            if fkdata.protected or fk.shape[0] != self.ndata:
+                masked.append(fk)
+            else:
+                masked.append(fk[rows])
+        return masked
 
     def training_fktables(self):
         """Return the fktable tensors for the trainig data"""
-        if self._tr_mask is not None:
-            return [fk.with_cuts(self._tr_mask).get_np_fktable() for fk in self.fktables_data]
+        if self._tr_rows is not None:
+            return self._masked_fktables(self._tr_rows)
         return self.fktables()
 
     def validation_fktables(self):
         """Return the fktable tensors for the validation data"""
-        if self._vl_mask is not None:
-            return [fk.with_cuts(self._vl_mask).get_np_fktable() for fk in self.fktables_data]
+        if self._vl_rows is not None:
+            return self._masked_fktables(self._vl_rows)
         return self.fktables()
 
 
-def validphys_group_extractor(datasets, tr_masks):
+def _save_atomically(target, array):
+    """Save ``array`` to a temporary file and move it to ``target``"""
+    with tempfile.NamedTemporaryFile(dir=target.parent, suffix=".npy", delete=False) as f:
+        np.save(f, array)
+    os.replace(f.name, target)
+
+
+def write_fktable_store(store_path, datasets, max_workers=None):
+    """Write the dense fktable tensors (with cuts) of ``datasets`` to ``store_path``
+    as ``.npy`` files that can be read by :py:meth:`FittableDataSet.fktables`,
+    together with their content keys (see :py:func:`fktable_content_key`),
+    used to check that the entries of the store correspond to the loaded tables.
+    The tensors are written in single precision (the default precision of ``n3fit``)
+    and C order, which is the layout the n3fit layers can use directly from the memory map.
+    Each file is written to a temporary location first and then moved in place,
+    so that processes reading the store never see a partially written table.
+
+    Parameters
+    ----------
+        store_path: pathlib.Path
+            folder where the tensors are written, created if it does not exist
+        datasets: list(:py:class:`validphys.core.DataSetSpec`)
+            datasets (or positivity and integrability sets) to write
+        max_workers: int
+            Number of threads used to load the fktables,
+            see :py:func:`validphys.fkparser.load_fktables_parallel`
+    """
+    store_path = pathlib.Path(store_path)
+    store_path.mkdir(parents=True, exist_ok=True)
+    all_fktables = load_fktables_parallel(datasets, max_workers=max_workers)
+    for dspec, fktables in zip(datasets, all_fktables):
+        for i, fkdata in enumerate(fktables):
+            key = np.array(fktable_content_key(fkdata))
+            _save_atomically(fktable_store_file(store_path, dspec.name, i, "key"), key)
+            fktable = np.ascontiguousarray(fkdata.get_np_fktable(), dtype=np.float32)
+            _save_atomically(fktable_store_file(store_path, dspec.name, i), fktable)
+        log.info(f"Written {len(fktables)} fktable(s) for {dspec.name} to {store_path}")
+
+
+def validphys_group_extractor(datasets, tr_masks, max_workers=None, store_path=None):
     """
     Receives a grouping spec from validphys (most likely an experiment)
     and loops over its content extracting and parsing all information required for the fit
@@ -87,16 +221,23 @@ def validphys_group_extractor(datasets, tr_masks):
             List of dataset specs in this group
         tr_masks: list(np.array)
             List of training masks to be set for each dataset
+        max_workers: int
+            Number of threads used to load the fktables,
+            see :py:func:`validphys.fkparser.load_fktables_parallel`
+        store_path: pathlib.Path
+            fktable store written by :py:func:`write_fktable_store`, if any
 
     Returns
     -------
         loaded_obs: list (:py:class:`validphys.n3fit_data_utils.FittableDataSet`)
     """
     loaded_obs = []
+    # Load all fktables with the appropiate cuts
+    all_fktables = load_fktables_parallel(datasets, max_workers=max_workers)
     # Use zip_longest since tr_mask can be (and it is fine) an empty list
-    for dspec, mask in zip_longest(datasets, tr_masks):
-        # Load all fktables with the appropiate cuts
-        fktables = [fk.load_with_cuts(dspec.cuts) for fk in dspec.fkspecs]
+    for dspec, fktables, mask in zip_longest(datasets, all_fktables, tr_masks):
         # And now put them in a FittableDataSet object which
-        loaded_obs.append(FittableDataSet(dspec.name, fktables, dspec.op, dspec.frac, mask))
+        loaded_obs.append(
+            FittableDataSet(dspec.name, fktables, dspec.op, dspec.frac, mask, store_path)
+        )
     return loaded_obs
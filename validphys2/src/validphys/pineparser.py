@@ -122,6 +122,9 @@ def pineappl_reader(fkspec):
         All grids in pineappl are constructed with the exact same xgrid,
         the active channels can vary and so when grids are concatenated for an observable
         the gaps are filled with 0s.
+        Optimized grids can instead have different x-grids, in that case the union of all of them
+        is used. Each grid is scattered directly into a preallocated table with the union of
+        x-points and channels.
 
         The pineappl grids are such that obs = sum_{bins} fk * f (*f) * bin_w
         so in order to use them together with old-style grids (obs = sum_{bins} fk * xf (*xf))
@@ -180,7 +183,8 @@ def pineappl_reader(fkspec):
     xgrid = np.array([])
     for pine in pines:
         xgrid = np.union1d(xgrid, pine.x_grid())
-    xi = np.arange(len(xgrid))
+    nx = len(xgrid)
+    xi = np.arange(nx)
     protected = False
 
     # Process the shifts and normalizations (if any),
@@ -194,16 +198,21 @@ def pineappl_reader(fkspec):
     if cfactors is not None:
         cfactors = dict(zip(fknames, cfactors))
 
-    # fktables in pineapplgrid are for obs = fk * f while previous fktables were obs = fk * xf
-    # prepare the grid all tables will be divided by
-    if hadronic:
-        xdivision = np.prod(np.meshgrid(xgrid, xgrid), axis=0)
-    else:
-        xdivision = xgrid[:, np.newaxis]
+    # For optimized pineappls different grids can potentially have different channels
+    # the columns of the final table are the union of all of them
+    pine_columns = [_pinelumi_to_columns(p.channels(), hadronic) for p in pines]
+    lumi_columns = np.unique(np.concatenate(pine_columns))
+
+    # Each (data, x1, x2) row of the final table for every grid,
+    # the holes (in x or in the channels) are left as 0s
+    nxx = nx * nx if hadronic else nx
+    nrows = sum(p.bin_normalizations().size for p in pines) * nxx
+    ncolumns = len(lumi_columns)
+    sigma_values = np.zeros((nrows, ncolumns))
+    data_labels = []
 
-    partial_fktables = []
     ndata = 0
-    for fkname, p in zip(fknames, pines):
+    for fkname, p, columns in zip(fknames, pines, pine_columns):
         # Start by reading possible cfactors if cfactor is not empty
         cfprod = 1.0
         if cfactors is not None:
@@ -221,35 +230,52 @@ def pineappl_reader(fkspec):
         if normalization_per_fktable is not None:
             raw_fktable = raw_fktable * normalization_per_fktable.get(fkname, 1.0)
 
-        # Add empty points to ensure that all fktables share the same x-grid upon convolution
-        missing_x_points = np.setdiff1d(xgrid, p.x_grid(), assume_unique=True)
-        for x_point in missing_x_points:
-            miss_index = list(xgrid).index(x_point)
-            raw_fktable = np.insert(raw_fktable, miss_index, 0.0, axis=2)
-            if hadronic:
-                raw_fktable = np.insert(raw_fktable, miss_index, 0.0, axis=3)
-        # Check conversion factors and remove the x* from the fktable
+        # fktables in pineapplgrid are for obs = fk * f while previous fktables were obs = fk * xf
+        # check conversion factors and remove the x* from the fktable
+        pine_xgrid = p.x_grid()
+        if hadronic:
+            xdivision = np.outer(pine_xgrid, pine_xgrid)
+        else:
+            xdivision = pine_xgrid[:, np.newaxis]
         raw_fktable *= fkspec.metadata.conversion_factor / xdivision
 
-        # Create the multi-index for the dataframe
-        # for optimized pineappls different grids can potentially have different indices
-        # so they need to be indexed separately and then concatenated only at the end
-        lumi_columns = _pinelumi_to_columns(p.channels(), hadronic)
-        lf = len(lumi_columns)
-        data_idx = np.arange(ndata, ndata + n)
+        # Scatter the table into the rows of this grid with the common x-grid and channels
+        # (data, channel, x1, x2) -> (data, x1, x2, channel)
+        xpos = np.searchsorted(xgrid, pine_xgrid)
+        cpos = np.searchsorted(lumi_columns, columns)
+        offset = len(data_labels) * nxx
+        block = sigma_values[offset : offset + n * nxx]
         if hadronic:
-            idx = pd.MultiIndex.from_product([data_idx, xi, xi], names=["data", "x1", "x2"])
+            block = block.reshape(n, nx, nx, ncolumns)
+            block[:, xpos[:, None, None], xpos[None, :, None], cpos] = raw_fktable.transpose(
+                0, 2, 3, 1
+            )
         else:
-            idx = pd.MultiIndex.from_product([data_idx, xi], names=["data", "x"])
-
-        # Now concatenate (data, x1, x2) and move the flavours to the columns
-        df_fktable = raw_fktable.swapaxes(0, 1).reshape(lf, -1).T
-        partial_fktables.append(pd.DataFrame(df_fktable, columns=lumi_columns, index=idx))
+            block = block.reshape(n, nx, ncolumns)
+            block[:, xpos[:, None], cpos] = raw_fktable[..., 0].transpose(0, 2, 1)
 
+        data_labels.extend(range(ndata, ndata + n))
         ndata += n
 
-    # Finallly concatenate all fktables, sort by flavours and fill any holes
-    sigma = pd.concat(partial_fktables, sort=True, copy=False).fillna(0.0)
+    # Create the multi-index for the dataframe directly from the codes,
+    # this is equivalent to concatenating ``MultiIndex.from_product([data_idx, xi(, xi)])``
+    ntot = len(data_labels)
+    data_codes = np.repeat(np.arange(ntot), nxx)
+    if hadronic:
+        idx = pd.MultiIndex(
+            levels=[data_labels, xi, xi],
+            codes=[data_codes, np.tile(np.repeat(xi, nx), ntot), np.tile(xi, ntot * nx)],
+            names=["data", "x1", "x2"],
+            verify_integrity=False,
+        )
+    else:
+        idx = pd.MultiIndex(
+            levels=[data_labels, xi],
+            codes=[data_codes, np.tile(xi, ntot)],
+            names=["data", "x"],
+            verify_integrity=False,
+        )
+    sigma = pd.DataFrame(sigma_values, columns=lumi_columns, index=idx, copy=False)
 
     # Check whether this is a 1-point normalization fktable and, if that's the case, protect!
     if fkspec.metadata.operation == "RATIO" and len(pines) == 1:
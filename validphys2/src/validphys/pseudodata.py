@@ -17,6 +17,8 @@ from validphys.covmats import (
     dataset_inputs_covmat_from_systematics,
     sqrt_covmat,
 )
+from validphys.covmats_utils import CovmatCache
+from validphys.n3fit_data import replica_mcseeds
 
 log = logging.getLogger(__name__)
 
@@ -187,10 +189,57 @@ def make_replica(
        0.30100351, 0.31781208, 0.30827054, 0.30258217, 0.32116842,
        0.34206012, 0.31866286, 0.2790856 , 0.33257621, 0.33680007,
     """
+    return make_replicas_batch(
+        groups_dataset_inputs_loaded_cd_with_cuts,
+        [replica_mcseed],
+        dataset_inputs_sampling_covmat,
+        sep_mult=sep_mult,
+        genrep=genrep,
+        max_tries=max_tries,
+        resample_negative_pseudodata=resample_negative_pseudodata,
+    )[0]
+
+
+# Square roots of the sampling covmats, kept up to 1 GB
+_sqrt_covmats = CovmatCache(sqrt_covmat, max_bytes=2**30)
+
+
+def _sampling_sqrt_covmat(covmat):
+    """Return the (cached) square root of the sampling covmat, which is shared by all the
+    replicas generated in the same process for a group of data"""
+    return _sqrt_covmats(covmat)
+
+
+def make_replicas_batch(
+    groups_dataset_inputs_loaded_cd_with_cuts,
+    mcseeds,
+    dataset_inputs_sampling_covmat,
+    sep_mult=False,
+    genrep=True,
+    max_tries=int(1e6),
+    resample_negative_pseudodata=True,
+):
+    """Generate the pseudodata replicas for all the seeds in ``mcseeds`` at once.
+    Each replica is drawn from its own random number generator, seeded and used exactly
+    like in :py:func:`make_replica`, so that the replica generated with a given
+    ``replica_mcseed`` is the same regardless of the batch it is generated in.
+
+    The square root of the covmat is computed only once and the shifts of all replicas
+    are computed with a single matrix product. When a replica fails the positivity check
+    only that replica is drawn again.
+
+    See :py:func:`make_replica` for the description of the rest of the parameters.
+
+    Returns
+    -------
+    pseudodata: np.array
+        Numpy array of shape (N_replicas, N_dat) with the pseudodata replicas
+    """
     if not genrep:
-        return np.concatenate(
+        central_values = np.concatenate(
             [cd.central_values for cd in groups_dataset_inputs_loaded_cd_with_cuts]
         )
+        return np.tile(central_values, (len(mcseeds), 1))
     # Seed the numpy RNG with the seed and the name of the datasets in this run
 
     # TODO: to be simplified after the reader is merged, together with an update of the regression tests
@@ -205,10 +254,10 @@ def make_replica(
     name_salt = "-".join(names_for_salt)
 
     name_seed = int(hashlib.sha256(name_salt.encode()).hexdigest(), 16) % 10**8
-    rng = np.random.default_rng(seed=replica_mcseed + name_seed)
+    rngs = [np.random.default_rng(seed=mcseed + name_seed) for mcseed in mcseeds]
     # construct covmat
     covmat = dataset_inputs_sampling_covmat
-    covmat_sqrt = sqrt_covmat(covmat)
+    covmat_sqrt = _sampling_sqrt_covmat(covmat)
     # Loading the data
     pseudodatas = []
     check_positive_masks = []
@@ -238,9 +287,10 @@ def make_replica(
         special_mult_errors = pd.concat(special_mult, axis=0, sort=True).fillna(0).to_numpy()
     all_pseudodata = np.concatenate(pseudodatas, axis=0)
     full_mask = np.concatenate(check_positive_masks, axis=0)
-    # The inner while True loop is for ensuring a positive definite
-    # pseudodata replica
-    for _ in range(max_tries):
+
+    def draw_replica(rng):
+        """Draw the random numbers for one attempt of a replica, in the same order
+        in which they have always been drawn"""
         mult_shifts = []
         # Prepare the per-dataset multiplicative shifts
         for mult_uncorr_errors, mult_corr_errors in nonspecial_mult:
@@ -255,25 +305,92 @@ def make_replica(
 
             mult_shifts.append(mult_shift)
 
+        normals = rng.normal(size=covmat.shape[1])
         # If sep_mult is true then the multiplicative shifts were not included in the covmat
-        shifts = covmat_sqrt @ rng.normal(size=covmat.shape[1])
-        mult_part = 1.0
+        mult_part = np.ones_like(all_pseudodata)
         if sep_mult:
             special_mult = (
                 1 + special_mult_errors * rng.normal(size=(1, special_mult_errors.shape[1])) / 100
             ).prod(axis=1)
             mult_part = np.concatenate(mult_shifts, axis=0) * special_mult
+        return normals, mult_part
+
+    all_replicas = np.empty((len(rngs), all_pseudodata.size))
+    pending = np.arange(len(rngs))
+    # Loop until all replicas have positive definite pseudodata,
+    # drawing again only the replicas which failed
+    for _ in range(max_tries):
+        normals, mult_part = zip(*(draw_replica(rngs[i]) for i in pending))
+        shifts = (covmat_sqrt @ np.stack(normals, axis=1)).T
         # Shifting pseudodata
-        shifted_pseudodata = (all_pseudodata + shifts) * mult_part
+        shifted_pseudodata = (all_pseudodata + shifts) * np.stack(mult_part)
+        all_replicas[pending] = shifted_pseudodata
+        if not resample_negative_pseudodata:
+            return all_replicas
         # positivity control
-        if np.all(shifted_pseudodata[full_mask] >= 0) or not resample_negative_pseudodata:
-            return shifted_pseudodata
+        positive = np.all(shifted_pseudodata[:, full_mask] >= 0, axis=1)
+        pending = pending[~positive]
+        if pending.size == 0:
+            return all_replicas
 
     dfail = " ".join(i.setname for i in groups_dataset_inputs_loaded_cd_with_cuts)
     log.error(f"Error generating replicas for the group: {dfail}")
     raise ReplicaGenerationError(f"No valid replica found after {max_tries} attempts")
 
 
+def make_replicas(
+    groups_dataset_inputs_loaded_cd_with_cuts,
+    replicas,
+    mcseed,
+    dataset_inputs_sampling_covmat,
+    sep_mult=False,
+    genrep=True,
+    max_tries=int(1e6),
+    resample_negative_pseudodata=True,
+):
+    """Generate the pseudodata for all ``replicas`` at once with :py:func:`make_replicas_batch`.
+    The result is a list with one array per replica which is the same as
+    collecting :py:func:`make_replica` over ``replicas``.
+    """
+    mcseeds = replica_mcseeds(replicas, mcseed, genrep)
+    if mcseeds is None:
+        mcseeds = [None] * len(replicas)
+    return list(
+        make_replicas_batch(
+            groups_dataset_inputs_loaded_cd_with_cuts,
+            mcseeds,
+            dataset_inputs_sampling_covmat,
+            sep_mult=sep_mult,
+            genrep=genrep,
+            max_tries=max_tries,
+            resample_negative_pseudodata=resample_negative_pseudodata,
+        )
+    )
+
+
+def fitted_make_replicas(
+    groups_dataset_inputs_loaded_cd_with_cuts,
+    pdfreplicas,
+    mcseed,
+    dataset_inputs_sampling_covmat,
+    sep_mult=False,
+    genrep=True,
+    max_tries=int(1e6),
+    resample_negative_pseudodata=True,
+):
+    """Like :py:func:`make_replicas` for the postfit replicas ``pdfreplicas``"""
+    return make_replicas(
+        groups_dataset_inputs_loaded_cd_with_cuts,
+        pdfreplicas,
+        mcseed,
+        dataset_inputs_sampling_covmat,
+        sep_mult=sep_mult,
+        genrep=genrep,
+        max_tries=max_tries,
+        resample_negative_pseudodata=resample_negative_pseudodata,
+    )
+
+
 def indexed_make_replica(groups_index, make_replica):
     """Index the make_replica pseudodata appropriately"""
 
@@ -429,9 +546,11 @@ _recreate_pdf_pseudodata = collect('_group_recreate_pseudodata', ('pdfreplicas',
 
 fit_tr_masks = collect('replica_training_mask_table', ('fitreplicas', 'fitenvironment'))
 pdf_tr_masks = collect('replica_training_mask_table', ('pdfreplicas', 'fitenvironment'))
-make_replicas = collect('make_replica', ('replicas',))
-fitted_make_replicas = collect('make_replica', ('pdfreplicas',))
-indexed_make_replicas = collect('indexed_make_replica', ('replicas',))
+
+
+def indexed_make_replicas(groups_index, make_replicas):
+    """Like :py:func:`indexed_make_replica` for all the replicas of :py:func:`make_replicas`"""
+    return [indexed_make_replica(groups_index, replica) for replica in make_replicas]
 
 
 def recreate_fit_pseudodata(_recreate_fit_pseudodata, fitreplicas, fit_tr_masks):
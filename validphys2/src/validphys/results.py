@@ -23,8 +23,9 @@ from validphys.checks import (
     check_speclabels_different,
     check_two_dataspecs,
 )
-from validphys.convolution import PredictionsRequireCutsError, central_predictions, predictions
+from validphys.convolution import PredictionsRequireCutsError, batched_predictions, predictions
 from validphys.core import PDF, DataGroupSpec, DataSetSpec, Stats
+from validphys.covmats_utils import BlockLowRankCovmat
 from validphys.plotoptions.core import get_info
 
 log = logging.getLogger(__name__)
@@ -87,6 +88,8 @@ class DataResult(StatsResult):
 
     @property
     def std_error(self):
+        if isinstance(self.covmat, BlockLowRankCovmat):
+            return np.sqrt(self.covmat.diagonal())
         return np.sqrt(np.diag(self.covmat))
 
     @property
@@ -136,6 +139,14 @@ class ThPredictionsResult(StatsResult):
 
     @classmethod
     def from_convolution(cls, pdf, dataset, central_only=False):
+        return cls.from_batched_convolution([pdf], dataset, central_only=central_only)[0]
+
+    @classmethod
+    def from_batched_convolution(cls, pdfs, dataset, central_only=False):
+        """Same as ``from_convolution`` for a list of PDFs, returns a list of results.
+        The predictions are computed with :py:func:`validphys.convolution.batched_predictions`
+        so that each PDF is evaluated only once for all the FKTables of the dataset (or group).
+        """
         # This should work for both single dataset and whole groups
         try:
             datasets = dataset.datasets
@@ -143,21 +154,23 @@ class ThPredictionsResult(StatsResult):
             datasets = (dataset,)
 
         try:
-            if central_only:
-                preds = [central_predictions(d, pdf) for d in datasets]
-            else:
-                preds = [predictions(d, pdf) for d in datasets]
-            th_predictions = pd.concat(preds)
+            all_preds = batched_predictions(datasets, pdfs, central_only=central_only)
         except PredictionsRequireCutsError as e:
             raise PredictionsRequireCutsError(
                 "Predictions from FKTables always require cuts, "
                 "if you want to use the fktable intrinsic cuts set `use_cuts: 'internal'`"
             ) from e
 
-        label = cls.make_label(pdf, dataset)
         thid = dataset.thspec.id
         datasetnames = [i.name for i in datasets]
-        return cls(th_predictions, pdf.stats_class, datasetnames, label, pdf=pdf, theoryid=thid)
+        ret = []
+        for pdf, preds in zip(pdfs, all_preds):
+            th_predictions = pd.concat(preds)
+            label = cls.make_label(pdf, dataset)
+            ret.append(
+                cls(th_predictions, pdf.stats_class, datasetnames, label, pdf=pdf, theoryid=thid)
+            )
+        return ret
 
     @property
     def datasetnames(self):
@@ -643,7 +656,7 @@ def pdf_results(
     """Return a list of results, the first for the data and the rest for
     each of the PDFs."""
 
-    th_results = [ThPredictionsResult.from_convolution(pdf, dataset) for pdf in pdfs]
+    th_results = ThPredictionsResult.from_batched_convolution(pdfs, dataset)
 
     return (DataResult(dataset, covariance_matrix, sqrt_covmat), *th_results)
 
@@ -1,14 +1,17 @@
 import numpy as np
+import pandas as pd
 import scipy.linalg as la
 from hypothesis import given
 from hypothesis.extra.numpy import arrays
 from hypothesis.strategies import floats
 
 from validphys import calcutils
+from validphys.covmats_utils import construct_covmat
 
 sane_floats = floats(min_value=-1, max_value=1, allow_nan=False, allow_infinity=False)
 diffs = arrays(dtype=float, shape=10, elements=sane_floats)
 sqrtcov = arrays(dtype=float, shape=(10, 10), elements=sane_floats)
+systematics = arrays(dtype=float, shape=(10, 4), elements=sane_floats)
 
 
 @given(sqrtcov, diffs)
@@ -23,3 +26,17 @@ def test_calc_chi2(s, d):
     dd = np.repeat(d, 5).reshape(len(d), 5)
     calcdd = calcutils.calc_chi2(chol, dd)
     assert np.allclose(chi2, calcdd)
+
+
+@given(systematics, diffs)
+def test_calc_chi2_from_systematics(sys, d):
+    stat = np.ones(10)
+    sys_errors = pd.DataFrame(sys, columns=["UNCORR", "CORR", "THEORYCORR", "SPECIAL"])
+    cov = construct_covmat(stat, sys_errors)
+    chol = la.cholesky(cov, lower=True)
+    assert np.allclose(
+        calcutils.calc_chi2_from_systematics(stat, sys_errors, d), d @ la.inv(cov) @ d
+    )
+    dd = np.repeat(d, 5).reshape(len(d), 5)
+    calcdd = calcutils.calc_chi2_from_systematics(stat, sys_errors, dd)
+    assert np.allclose(calcdd, calcutils.calc_chi2(chol, dd))
@@ -6,10 +6,14 @@ Tests related to the computation of the covariance matrix and its derivatives
 
 import numpy as np
 import pytest
+import scipy.linalg as la
 
 from validphys.api import API
+from validphys.calcutils import calc_chi2
 from validphys.commondataparser import load_commondata
 from validphys.covmats import dataset_t0_predictions, reorder_thcovmat_as_expcovmat, sqrt_covmat
+from validphys.covmats_utils import BlockLowRankCovmat, CovmatCache, DiagonalLowRankCovmat
+from validphys.n3fit_data import covmat_factorization
 from validphys.tests.conftest import DATA, HESSIAN_PDF, PDF, THEORYID_NEW
 
 # Experiments which have non trivial correlations between their datasets
@@ -101,6 +105,91 @@ def test_sqrt_covmat(data_config):
     np.testing.assert_allclose(cholesky_cov @ cholesky_cov.T, covmat)
 
 
+@pytest.mark.parametrize("use_cuts", ["nocuts", "internal"])
+def test_structured_covmat_from_systematics(data_config, use_cuts):
+    """Check that the structured covmat matches the dense one and gives the same chi2"""
+    config = dict(data_config)
+    config["use_cuts"] = use_cuts
+    config["dataset_inputs"] = CORR_DATA
+    covmat = API.dataset_inputs_covmat_from_systematics(**config)
+    structured = API.dataset_inputs_structured_covmat_from_systematics(**config)
+    assert isinstance(structured, BlockLowRankCovmat)
+    np.testing.assert_allclose(structured.todense(), covmat)
+
+    diffs = np.random.default_rng(0).normal(size=(covmat.shape[0], 3)) * np.sqrt(np.diag(covmat))
+    np.testing.assert_allclose(
+        calc_chi2(sqrt_covmat(structured), diffs), calc_chi2(sqrt_covmat(covmat), diffs)
+    )
+
+
+def test_block_lowrank_covmat():
+    """Test the operations of the block diagonal plus low rank covmat against the dense matrix"""
+    rng = np.random.default_rng(1)
+    blocks = []
+    for ndata in (3, 1, 5):
+        a = rng.random((ndata, ndata))
+        blocks.append(a @ a.T + np.eye(ndata))
+    lowrank = rng.random((9, 4))
+    covmat = BlockLowRankCovmat(blocks, lowrank)
+    dense = la.block_diag(*blocks) + lowrank @ lowrank.T
+    np.testing.assert_allclose(np.array(covmat), dense)
+    np.testing.assert_allclose(covmat.diagonal(), np.diag(dense))
+
+    x = rng.random((9, 2))
+    np.testing.assert_allclose(covmat @ x, dense @ x)
+    np.testing.assert_allclose(covmat.solve(x), la.solve(dense, x))
+    np.testing.assert_allclose(covmat.logdet(), np.linalg.slogdet(dense)[1])
+    np.testing.assert_allclose(covmat.chi2(x[:, 0]), x[:, 0] @ la.solve(dense, x[:, 0]))
+    np.testing.assert_allclose(calc_chi2(covmat, x), calc_chi2(la.cholesky(dense, lower=True), x))
+
+    scale = rng.random(9) + 0.5
+    np.testing.assert_allclose(covmat.rescale(scale).todense(), dense / np.outer(scale, scale))
+    extra = rng.random((9, 2))
+    np.testing.assert_allclose(covmat.add_lowrank(extra).todense(), dense + extra @ extra.T)
+    np.testing.assert_allclose((covmat + covmat).todense(), 2 * dense)
+    # Adding a dense matrix gives back a dense matrix
+    np.testing.assert_allclose(np.eye(9) + covmat, dense + np.eye(9))
+
+
+def test_diagonal_lowrank_covmat():
+    """Test the operations of the diagonal plus low rank covmat against the dense matrix"""
+    rng = np.random.default_rng(2)
+    diagonal = rng.random(7) + 0.1
+    lowrank = rng.random((7, 2))
+    covmat = DiagonalLowRankCovmat(diagonal, lowrank)
+    dense = np.diag(diagonal) + lowrank @ lowrank.T
+    np.testing.assert_allclose(covmat.todense(), dense)
+    np.testing.assert_allclose(covmat.diagonal(), np.diag(dense))
+
+    x = rng.random((7, 3))
+    np.testing.assert_allclose(covmat @ x, dense @ x)
+    np.testing.assert_allclose(covmat.solve(x), la.solve(dense, x))
+    np.testing.assert_allclose(covmat.logdet(), np.linalg.slogdet(dense)[1])
+    np.testing.assert_allclose(calc_chi2(covmat, x), calc_chi2(la.cholesky(dense, lower=True), x))
+    scale = rng.random(7) + 0.5
+    np.testing.assert_allclose(covmat.rescale(scale).todense(), dense / np.outer(scale, scale))
+
+    # With a diagonal which is not positive definite the dense covmat is used instead
+    diagonal[[1, 4]] = 0.0
+    lowrank = rng.random((7, 7))
+    covmat = DiagonalLowRankCovmat(diagonal, lowrank)
+    dense = np.diag(diagonal) + lowrank @ lowrank.T
+    np.testing.assert_allclose(covmat.solve(x), la.solve(dense, x))
+    np.testing.assert_allclose(covmat.logdet(), np.linalg.slogdet(dense)[1])
+    np.testing.assert_allclose(calc_chi2(covmat, x), calc_chi2(la.cholesky(dense, lower=True), x))
+
+
+@pytest.mark.parametrize("use_cuts", ["nocuts", "internal"])
+def test_structured_dataset_covmat(data_config, use_cuts):
+    """Check the per-dataset structured covmat against the dense one"""
+    config = dict(data_config)
+    config["use_cuts"] = use_cuts
+    for dsinp in DATA:
+        covmat = API.covmat_from_systematics(**config, dataset_input=dsinp)
+        structured = API.structured_covmat_from_systematics(**config, dataset_input=dsinp)
+        np.testing.assert_allclose(np.array(structured), covmat)
+
+
 @pytest.mark.parametrize("t0pdfset", [PDF, HESSIAN_PDF])
 @pytest.mark.parametrize("dataset_inputs", [DATA, CORR_DATA])
 def test_python_t0_covmat_matches_variations(data_internal_cuts_config, t0pdfset, dataset_inputs):
@@ -153,3 +242,54 @@ def test_single_datapoint(single_data_single_point_internal_cuts_config):
     # Ensure the dataset is only a single datapoint
     assert ld.ndata == 1
     ld.systematic_errors(t0_predictions)
+
+
+@pytest.mark.parametrize("frac", [0.0, 0.25, 0.75, 1.0])
+def test_covmat_factorization(frac):
+    """Check that the inverses of the masked covmats computed from the cached
+    factorisation of the full covmat match the direct inversion"""
+    rng = np.random.default_rng(seed=int(100 * frac))
+    ndata = 40
+    a = rng.random((ndata, ndata))
+    covmat = a @ a.T + np.eye(ndata)
+    mask = np.zeros(ndata, dtype=bool)
+    mask[: int(frac * ndata)] = True
+    rng.shuffle(mask)
+
+    factorization = covmat_factorization(covmat)
+    # The factorisation is shared by any copy of the same covmat
+    assert covmat_factorization(covmat.copy()) is factorization
+    np.testing.assert_allclose(factorization.inverse @ covmat, np.eye(ndata), atol=1e-8)
+    for m in (mask, ~mask):
+        masked_covmat = covmat[m].T[m]
+        masked_inverse = factorization.masked_inverse(m)
+        np.testing.assert_allclose(masked_inverse @ masked_covmat, np.eye(m.sum()), atol=1e-8)
+        assert factorization.masked_inverse(m.copy()) is masked_inverse
+
+
+def test_covmat_cache():
+    """Check that the cached values are identified by the content of the covmat
+    and evicted, least recently used first, once they are over the size budget"""
+    calls = []
+
+    def function(covmat):
+        calls.append(covmat)
+        return covmat.sum()
+
+    covmats = [np.full((10, 10), float(i)) for i in range(3)]
+    nbytes = covmats[0].nbytes
+    cache = CovmatCache(function, max_bytes=5 * nbytes, size_factor=2)
+    assert cache(covmats[0]) == cache(covmats[0].copy()) == 0
+    assert len(calls) == 1
+    cache(covmats[1])
+    cache(covmats[0])
+    # Only two entries fit in the budget, the least recently used is evicted
+    cache(covmats[2])
+    assert len(cache) == 2
+    cache(covmats[0])
+    assert len(calls) == 3
+    cache(covmats[1])
+    assert len(calls) == 4
+    # Values larger than the budget are not cached
+    cache(np.ones((20, 20)))
+    assert len(cache) == 2
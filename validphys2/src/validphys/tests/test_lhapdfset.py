@@ -0,0 +1,72 @@
+"""
+test_lhapdfset.py
+
+Tests for the in-memory cache of PDF grid evaluations
+"""
+
+import os
+import shutil
+
+import numpy as np
+from numpy.testing import assert_allclose
+
+from validphys.api import API
+from validphys.lhaindex import finddir, infofilename
+from validphys.lhapdfset import GridValuesCache, LHAPDFSet, grid_values_cache
+from validphys.tests.conftest import PDF, temp_lhapdf_path
+
+
+def test_grid_values_cache_eviction():
+    values = np.ones((2, 3, 4, 1))
+    cache = GridValuesCache(max_bytes=2 * values.nbytes)
+    xgrid = np.linspace(0.1, 0.9, 4)
+    keys = [
+        cache.make_key(f"set{i}", None, "replicas", [21], xgrid, np.array([1.65])) for i in range(3)
+    ]
+
+    cache.put(keys[0], values)
+    cache.put(keys[1], 2 * values)
+    # Touch the first entry so that the second one is the least recently used
+    assert_allclose(cache.get(keys[0]), values)
+    cache.put(keys[2], 3 * values)
+    assert len(cache) == 2
+    assert cache.get(keys[1]) is None
+
+    # The cache hands out copies
+    cache.get(keys[2])[:] = 0.0
+    assert_allclose(cache.get(keys[2]), 3 * values)
+
+    # Entries bigger than the budget are never stored
+    cache.put(("big",), np.ones(3 * values.size))
+    assert cache.get(("big",)) is None
+
+
+def test_grid_values_cached(tmp_path):
+    pdfset = API.pdf(pdf=PDF).load()
+    flavors = np.array([1, 2, 21])
+    xgrid = np.geomspace(1e-5, 0.9, 10)
+    qgrid = np.array([1.65, 10.0])
+
+    grid_values_cache.clear()
+    first = pdfset.grid_values(flavors, xgrid, qgrid)
+    assert len(grid_values_cache) == 1
+    second = pdfset.grid_values(flavors, xgrid, qgrid)
+    assert len(grid_values_cache) == 1
+    assert_allclose(first, second)
+
+    # A different grid is a different entry
+    pdfset.grid_values(flavors, xgrid[:5], qgrid)
+    assert len(grid_values_cache) == 2
+
+    # And so is a set with the same name written again to disk,
+    # work on a copy of the set so that the installed one is not modified
+    shutil.copytree(finddir(PDF), tmp_path / PDF)
+    with temp_lhapdf_path(tmp_path):
+        copied_set = LHAPDFSet(PDF, "replicas")
+        copied_set.grid_values(flavors, xgrid, qgrid)
+        info = infofilename(PDF)
+        stat = os.stat(info)
+        os.utime(info, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+        copied_set.grid_values(flavors, xgrid, qgrid)
+    assert len(grid_values_cache) == 4
+    grid_values_cache.clear()
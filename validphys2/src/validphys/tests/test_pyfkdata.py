@@ -4,9 +4,28 @@ import pandas as pd
 import pytest
 
 from validphys.api import API
-from validphys.convolution import central_predictions, linear_predictions, predictions
-from validphys.fkparser import load_fktable
+from validphys.convolution import (
+    batched_predictions,
+    central_predictions,
+    linear_predictions,
+    predictions,
+)
+from validphys.core import FKTableSpec
+from validphys.coredata import FKTableData
+from validphys.fkparser import (
+    fktable_cache_key,
+    load_fktable,
+    load_fktable_with_cuts,
+    load_fktables_parallel,
+    open_fkpath,
+)
 from validphys.loader import FallbackLoader as Loader
+from validphys.n3fit_data_utils import (
+    FittableDataSet,
+    fktable_store_file,
+    validphys_group_extractor,
+    write_fktable_store,
+)
 from validphys.results import PositivityResult, ThPredictionsResult
 from validphys.tests.conftest import HESSIAN_PDF, PDF, POSITIVITIES, THEORYID, THEORYID_NEW
 
@@ -30,6 +49,138 @@ def test_basic_loading():
     assert res.ndata == 1
 
 
+@pytest.mark.parametrize("theoryid", [THEORYID, THEORYID_NEW])
+def test_fktable_cache(tmp_path, theoryid):
+    """Check that the FKTables read from the binary cache are equal to the parsed ones"""
+    l = Loader()
+    for dinput in ({"name": "ATLASTTBARTOT", "cfac": ("QCD",)}, {"name": "H1HERAF2B"}):
+        ds = l.check_dataset(**dinput, theoryid=theoryid)
+        for fk in ds.fkspecs:
+            reference = load_fktable(FKTableSpec(fk.fkpath, fk.cfactors, fk.metadata))
+            cached_spec = FKTableSpec(fk.fkpath, fk.cfactors, fk.metadata, tmp_path)
+            # The first call writes the cache, the second one reads it
+            written = load_fktable.__wrapped__(cached_spec)
+            assert (tmp_path / fktable_cache_key(cached_spec)).exists()
+            read = load_fktable.__wrapped__(cached_spec)
+            for table in (written, read):
+                pd.testing.assert_frame_equal(table.sigma, reference.sigma)
+                assert_allclose(table.get_np_fktable(), reference.get_np_fktable())
+                assert table.ndata == reference.ndata
+                assert table.protected == reference.protected
+
+
+@pytest.mark.parametrize("theoryid", [THEORYID, THEORYID_NEW])
+def test_fktable_cache_with_cuts(tmp_path, theoryid):
+    """Check that reading only the rows within the cuts from the cache is equivalent
+    to applying the cuts to the full table"""
+    l = Loader()
+    ds = l.check_dataset("H1HERAF2B", theoryid=theoryid)
+    fk = ds.fkspecs[0]
+    reference = load_fktable(fk).with_cuts(ds.cuts)
+    cached_spec = FKTableSpec(fk.fkpath, fk.cfactors, fk.metadata, tmp_path)
+    # Populate the cache
+    load_fktable.__wrapped__(cached_spec)
+    table = load_fktable_with_cuts(cached_spec, ds.cuts)
+    pd.testing.assert_frame_equal(table.sigma, reference.sigma)
+    assert table.ndata == reference.ndata == len(ds.cuts.load())
+
+
+def test_legacy_fast_kernel():
+    """Compare the parsing of the FastKernel section of legacy tables with pandas"""
+    l = Loader()
+    for setname in ("ATLASTTBARTOT", "H1HERAF2B"):
+        fk = l.check_fktable(setname=setname, theoryID=THEORYID, cfac=())
+        table = load_fktable(fk)
+        with open_fkpath(fk.fkpath) as f:
+            for line in f:
+                if line[1:].startswith(b"FastKernel"):
+                    break
+            nindex = 3 if table.hadronic else 2
+            reference = pd.read_csv(f, sep=r"\s+", header=None, index_col=tuple(range(nindex)))
+        reference.columns = reference.columns - nindex
+        reference.index.names = table.sigma.index.names
+        reference = reference.loc[:, table.metadata["FlavourMap"].ravel()]
+        pd.testing.assert_frame_equal(table.sigma, reference, check_dtype=False)
+
+
+def test_parallel_loading():
+    """Check that the tables loaded in parallel are the same as the ones loaded sequentially"""
+    l = Loader()
+    names = ["ATLASTTBARTOT", "H1HERAF2B", "D0ZRAP", "CMSWCHARMTOT"]
+    datasets = [l.check_dataset(name, theoryid=THEORYID_NEW) for name in names]
+    parallel = load_fktables_parallel(datasets, max_workers=4)
+    assert len(parallel) == len(datasets)
+    for ds, fktables in zip(datasets, parallel):
+        assert len(fktables) == len(ds.fkspecs)
+        for fk, table in zip(ds.fkspecs, fktables):
+            serial = load_fktable(fk).with_cuts(ds.cuts)
+            pd.testing.assert_frame_equal(table.sigma, serial.sigma)
+
+
+def test_fktable_store(tmp_path):
+    """Check that the tensors memory-mapped from the fktable store are equal to the
+    ones computed from the tables"""
+    l = Loader()
+    names = ["ATLASTTBARTOT", "H1HERAF2B"]
+    datasets = [l.check_dataset(name, theoryid=THEORYID_NEW) for name in names]
+    write_fktable_store(tmp_path, datasets)
+    stored = validphys_group_extractor(datasets, [], store_path=tmp_path)
+    computed = validphys_group_extractor(datasets, [])
+    for st, cp in zip(stored, computed):
+        for stored_fk, computed_fk in zip(st.fktables(), cp.fktables()):
+            assert isinstance(stored_fk, np.memmap)
+            assert stored_fk.dtype == np.float32 and stored_fk.flags.c_contiguous
+            assert_allclose(stored_fk, computed_fk, rtol=1e-6)
+    # An entry written for different contents (e.g. another theory) is not used
+    # even if its shape matches
+    np.save(fktable_store_file(tmp_path, "ATLASTTBARTOT", 0, "key"), np.array("stale"))
+    fktables = validphys_group_extractor(datasets[:1], [], store_path=tmp_path)[0].fktables()
+    assert not isinstance(fktables[0], np.memmap)
+    # A missing entry falls back to computing the table
+    for path in tmp_path.glob("H1HERAF2B_*.npy"):
+        path.unlink()
+    for fk in validphys_group_extractor(datasets[1:], [], store_path=tmp_path)[0].fktables():
+        assert not isinstance(fk, np.memmap)
+
+
+def test_masked_fktables():
+    """Check that the training and validation tensors are the masked full tensors"""
+    l = Loader()
+    ds = l.check_dataset("H1HERAF2B", theoryid=THEORYID_NEW)
+    fkdata = load_fktable(ds.fkspecs[0]).with_cuts(ds.cuts)
+    mask = np.random.default_rng(42).random(fkdata.ndata) > 0.25
+    fittable = validphys_group_extractor([ds], [mask])[0]
+    data_idx = fkdata.sigma.index.get_level_values(0).unique()
+    tr_fk = fkdata.with_cuts(data_idx[mask].values).get_np_fktable()
+    vl_fk = fkdata.with_cuts(data_idx[~mask].values).get_np_fktable()
+    np.testing.assert_array_equal(fittable.training_fktables()[0], tr_fk)
+    np.testing.assert_array_equal(fittable.validation_fktables()[0], vl_fk)
+
+
+def test_masked_protected_fktables():
+    """Check that the protected normalisation of a RATIO dataset is not masked"""
+    rng = np.random.default_rng(42)
+    xgrid = np.geomspace(1e-3, 0.9, 4)
+
+    def make_table(ndata, protected):
+        index = pd.MultiIndex.from_product([range(ndata), range(len(xgrid))], names=["data", "x"])
+        sigma = pd.DataFrame(rng.random((len(index), 3)), index=index, columns=[1, 2, 3])
+        return FKTableData(False, 1.65, ndata, xgrid, sigma, protected=protected)
+
+    numerator = make_table(5, False)
+    denominator = make_table(1, True)
+    mask = np.array([True, False, True, True, False])
+    fittable = FittableDataSet("RATIO_SET", [numerator, denominator], "RATIO", 0.75, mask)
+    for masked, mask_fk in [
+        (fittable.training_fktables(), mask),
+        (fittable.validation_fktables(), ~mask),
+    ]:
+        cut_numerator = numerator.with_cuts(np.arange(5)[mask_fk]).get_np_fktable()
+        assert [fk.shape[0] for fk in masked] == [mask_fk.sum(), 1]
+        np.testing.assert_array_equal(masked[0], cut_numerator)
+        np.testing.assert_array_equal(masked[1], denominator.get_np_fktable())
+
+
 def test_cuts():
     l = Loader()
     ds = l.check_dataset("ATLASTTBARTOT", theoryid=THEORYID, cfac=("QCD",))
@@ -48,6 +199,21 @@ def test_cuts():
     assert len(newtable.sigma.index.get_level_values(0).unique()) == len(ds.cuts.load())
 
 
+@pytest.mark.parametrize("theoryid", [THEORYID, THEORYID_NEW])
+def test_sparse_fktable(theoryid):
+    """Check that the sparse representation of the FKTables matches the dense one"""
+    l = Loader()
+    for setname in ("ATLASTTBARTOT", "H1HERAF2B"):
+        ds = l.check_dataset(setname, theoryid=theoryid)
+        table = load_fktable(ds.fkspecs[0])
+        for fk in (table, table.with_cuts(ds.cuts), table.without_empty_channels()):
+            dense = fk.get_np_fktable().reshape(fk.ndata, -1)
+            assert_allclose(fk.get_sparse_fktable().toarray(), dense)
+        active = table.without_empty_channels()
+        assert set(active.sigma.columns) <= set(table.sigma.columns)
+        assert (active.sigma != 0).any(axis=0).all()
+
+
 @pytest.mark.parametrize("pdf_name", [PDF, HESSIAN_PDF])
 def test_predictions(pdf_name):
     """Test that the ThPredictionsResult class do not break the raw predictions
@@ -111,6 +277,21 @@ def test_positivity(pdf_name):
         assert_allclose(cv_predictions, api_predictions.central_value, atol=1e-3)
 
 
+@pytest.mark.parametrize("central_only", [False, True])
+def test_batched_predictions(central_only):
+    """Test that the batched predictions are the same as the predictions computed
+    for each PDF and dataset separately"""
+    l = Loader()
+    pdfs = [l.check_pdf(PDF), l.check_pdf(HESSIAN_PDF)]
+    names = ["ATLASTTBARTOT", "H1HERAF2B", "D0ZRAP", "CMSWCHARMTOT"]
+    datasets = [l.check_dataset(name, theoryid=THEORYID_NEW) for name in names]
+    func = central_predictions if central_only else predictions
+    res = batched_predictions(datasets, pdfs, central_only=central_only)
+    for pdf, pdf_res in zip(pdfs, res):
+        for ds, ds_res in zip(datasets, pdf_res):
+            assert_allclose(ds_res.values, func(ds, pdf).values, rtol=1e-8)
+
+
 def test_extended_predictions():
     """Test the python predictions dataframe stasts with MC sets"""
     l = Loader()
@@ -111,3 +111,19 @@ def test_genrep_off(data_config, dataset_inputs, use_cuts):
 
     central_data = np.concatenate([d.central_values for d in ld_cds])
     np.testing.assert_allclose(not_replica, central_data)
+
+
+@pytest.mark.parametrize("sep_mult", [False, True])
+@pytest.mark.parametrize("dataset_inputs", [DATA, CORR_DATA])
+def test_make_replicas_batch(data_config, dataset_inputs, sep_mult):
+    """Check that generating all the replicas at once gives the same pseudodata
+    as generating them one by one with ``replica_mcseed``"""
+    config = dict(data_config)
+    config["dataset_inputs"] = dataset_inputs
+    config["use_cuts"] = "internal"
+    config["mcseed"] = SEED
+    config["separate_multiplicative"] = sep_mult
+    replicas = API.make_replicas(**config, nreplica=4)
+    assert len(replicas) == 4
+    for replica, batch_replica in enumerate(replicas, start=1):
+        np.testing.assert_allclose(API.make_replica(**config, replica=replica), batch_replica)
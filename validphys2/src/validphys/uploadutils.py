@@ -444,8 +444,11 @@ def check_input(path):
         return 'report'
     elif 'filter.yml' in files:
         # The product of a n3fit run, usually a fit but could be a hyperopt scan
-        # For that there should be a) tries.json files and b) no postfit
-        if "postfit" not in files and glob(path.as_posix() + "/nnfit/replica_*/tries.json"):
+        # For that there should be a) tries.json files (or trial logs) and b) no postfit
+        replicas_str = path.as_posix() + "/nnfit/replica_*"
+        if "postfit" not in files and (
+            glob(replicas_str + "/tries.json") or glob(replicas_str + "/tries.jsonl")
+        ):
             return 'hyperscan'
         return 'fit'
     elif list(filter(info_reg.match, files)) and list(filter(rep0_reg.match, files)):